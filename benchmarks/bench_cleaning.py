@@ -0,0 +1,333 @@
+"""Offline benchmarks of the ownership cleaning and serialization hot paths.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_cleaning                     # 1x and 10x market size
+    python -m benchmarks.bench_cleaning --scales 1,10,100
+    python -m benchmarks.bench_cleaning --save-baseline     # store the results as the new baseline
+    python -m benchmarks.bench_cleaning --source synthetic --symbols 2000 --subsidiaries 50
+
+Payloads are rebuilt in the GetCompanyProfilesDetail format from the recorded
+idx_company_profile_current.csv, or generated with --source synthetic (see
+benchmarks/synthetic.py), and replicated under suffixed symbols to reach the
+requested market size. Nothing is sent over the network: translations are
+prefilled and the ticker maps are built from the recorded company names.
+
+Baselines are machine specific, save one on the machine you compare on.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+from benchmarks.fixtures import ROOT_DIR, load_recorded_payloads
+from benchmarks.synthetic import generate_payloads
+from main import IdxProfileUpdater, all_columns, convert_df_to_records
+from shareholders_scraper import get_ticker_map, process_shareholders_payload
+
+BASELINE_PATH = os.path.join(ROOT_DIR, "benchmarks", "baselines.json")
+
+OWNERSHIP_COLUMNS = [
+    "shareholders",
+    "directors",
+    "commissioners",
+    "audit_committees",
+    "subsidiaries",
+]
+# Slowdowns below this many seconds are treated as noise
+MIN_REGRESSION_SECONDS = 0.05
+
+
+def scale_payloads(payloads: list, scale: int) -> list:
+    """Replicates the payloads under suffixed symbols, returns (symbol, raw json) pairs"""
+    scaled = []
+    for copy in range(scale):
+        for symbol, payload in payloads:
+            scaled_symbol = symbol if copy == 0 else f"{symbol}_{copy}"
+            scaled.append((scaled_symbol, json.dumps(payload)))
+    return scaled
+
+
+def measure(name: str, items: int, setup, func, repeat=3, memory=True) -> dict:
+    """Times func(setup()) and returns the best of `repeat` runs with the throughput.
+
+    setup() runs outside of the timing, it returns fresh inputs since most of
+    the benchmarked functions modify their input in place.
+    """
+    timings = []
+    for _ in range(repeat):
+        args = setup()
+        started = time.perf_counter()
+        func(args)
+        timings.append(time.perf_counter() - started)
+    seconds = min(timings)
+
+    peak_mb = None
+    if memory:
+        args = setup()
+        tracemalloc.start()
+        try:
+            func(args)
+            peak_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        finally:
+            tracemalloc.stop()
+
+    result = {
+        "items": items,
+        "seconds": seconds,
+        "items_per_second": items / seconds if seconds else None,
+        "peak_memory_mb": peak_mb,
+    }
+    print(
+        f"{name:<40} {items:>8} items {seconds:>9.3f}s "
+        f"{result['items_per_second'] or 0:>10.1f}/s "
+        + (f"{peak_mb:>9.1f} MB" if peak_mb is not None else ""),
+        file=sys.stderr,
+    )
+    return result
+
+
+def run_benchmarks(
+    payloads: list, companies: list, scales: list, repeat=3, memory=True, clean_workers=None
+) -> dict:
+    updater = IdxProfileUpdater()
+    cleaner = updater.ownershipcleaner
+    cleaner.set_ticker_maps(companies)
+    ticker_map_standardized, ticker_map_original = get_ticker_map(companies)
+
+    # No translation requests, every business activity is already "translated"
+    for _, payload in payloads:
+        for sub in payload["AnakPerusahaan"]:
+            if sub.get("BidangUsaha"):
+                activity = str(sub["BidangUsaha"]).strip()
+                updater._translation_cache[activity] = activity
+
+    results = {}
+    for scale in scales:
+        raw_payloads = scale_payloads(payloads, scale)
+        n_symbols = len(raw_payloads)
+
+        def parse_all(raw):
+            return [
+                updater._parse_idx_profile(f"{symbol}.JK", json.loads(content))
+                for symbol, content in raw
+            ]
+
+        results[f"parse_idx_profile@{scale}x"] = measure(
+            f"parse_idx_profile@{scale}x",
+            n_symbols,
+            lambda: raw_payloads,
+            parse_all,
+            repeat,
+            memory,
+        )
+
+        # The pipeline's parse stage: payload merged into the stored row dict
+        def update_all(fetched):
+            return [updater._update_profile_row(item) for item in fetched]
+
+        def fresh_fetched():
+            rows = []
+            for symbol, content in raw_payloads:
+                row = dict.fromkeys(all_columns)
+                row.update(symbol=f"{symbol}.JK", company_name=f"{symbol} Tbk", alias=[])
+                rows.append((row, json.loads(content)))
+            return rows
+
+        results[f"update_profile_row@{scale}x"] = measure(
+            f"update_profile_row@{scale}x",
+            n_symbols,
+            fresh_fetched,
+            update_all,
+            repeat,
+            memory,
+        )
+
+        profiles_json = json.dumps(parse_all(raw_payloads))
+
+        def fresh_profiles():
+            return pd.DataFrame(json.loads(profiles_json))
+
+        for col_name in OWNERSHIP_COLUMNS:
+            n_rows = sum(
+                len(profile[col_name] or [])
+                for profile in json.loads(profiles_json)
+            )
+            results[f"process_ownership_col[{col_name}]@{scale}x"] = measure(
+                f"process_ownership_col[{col_name}]@{scale}x",
+                n_rows,
+                fresh_profiles,
+                lambda df, col_name=col_name: cleaner.process_ownership_col(
+                    df, col_name
+                ),
+                repeat,
+                memory,
+            )
+
+        results[f"clean_ownership@{scale}x"] = measure(
+            f"clean_ownership@{scale}x",
+            n_symbols,
+            fresh_profiles,
+            lambda df: cleaner.clean_ownership(df, OWNERSHIP_COLUMNS),
+            repeat,
+            memory,
+        )
+
+        if clean_workers:
+            # Starts the worker processes outside of the measured runs
+            cleaner.clean_ownership(fresh_profiles(), OWNERSHIP_COLUMNS, workers=clean_workers)
+            results[f"clean_ownership[workers={clean_workers}]@{scale}x"] = measure(
+                f"clean_ownership[workers={clean_workers}]@{scale}x",
+                n_symbols,
+                fresh_profiles,
+                lambda df: cleaner.clean_ownership(
+                    df, OWNERSHIP_COLUMNS, workers=clean_workers
+                ),
+                repeat,
+                memory,
+            )
+
+        profile_df = fresh_profiles()
+        cleaned_df = cleaner.clean_ownership(profile_df, OWNERSHIP_COLUMNS)
+        profile_df = profile_df.drop(columns=OWNERSHIP_COLUMNS).merge(
+            cleaned_df, on="symbol", how="left"
+        )
+        cleaned_json = profile_df.to_json(orient="records")
+
+        results[f"convert_df_to_records@{scale}x"] = measure(
+            f"convert_df_to_records@{scale}x",
+            n_symbols,
+            lambda: pd.DataFrame(json.loads(cleaned_json)),
+            convert_df_to_records,
+            repeat,
+            memory,
+        )
+
+        management = {}
+        for symbol, payload in payloads:
+            management[symbol] = pd.concat(
+                [
+                    pd.DataFrame(payload["Komisaris"], columns=["Nama", "Jabatan"]),
+                    pd.DataFrame(payload["Direktur"], columns=["Nama", "Jabatan"]),
+                ]
+            ).rename(columns={"Nama": "name", "Jabatan": "position"})
+
+        with_shareholders = [
+            (symbol, content)
+            for symbol, content in raw_payloads
+            if json.loads(content)["PemegangSaham"]
+        ]
+
+        def process_all(decoded):
+            for symbol, data in decoded:
+                process_shareholders_payload(
+                    symbol,
+                    data,
+                    management[symbol.split("_")[0]],
+                    ticker_map_standardized,
+                    ticker_map_original,
+                )
+
+        results[f"process_shareholders_payload@{scale}x"] = measure(
+            f"process_shareholders_payload@{scale}x",
+            len(with_shareholders),
+            lambda: [(s, json.loads(c)) for s, c in with_shareholders],
+            process_all,
+            repeat,
+            memory,
+        )
+    cleaner.close()
+    return results
+
+
+def compare_to_baseline(results: dict, baseline: dict, tolerance: float) -> list:
+    """Returns the benchmarks that got slower or use more memory than the baseline allows"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        slowdown = result["seconds"] - base["seconds"]
+        if (
+            result["seconds"] > base["seconds"] * (1 + tolerance)
+            and slowdown > MIN_REGRESSION_SECONDS
+        ):
+            regressions.append(
+                f"{name}: {base['seconds']:.3f}s -> {result['seconds']:.3f}s"
+            )
+        if (
+            result.get("peak_memory_mb") is not None
+            and base.get("peak_memory_mb") is not None
+            and result["peak_memory_mb"] > base["peak_memory_mb"] * (1 + tolerance)
+        ):
+            regressions.append(
+                f"{name}: {base['peak_memory_mb']:.1f} MB -> {result['peak_memory_mb']:.1f} MB"
+            )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", default="1,10", help="Comma separated market size multipliers, e.g. 1,10,100.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark, the fastest one is kept.")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="Skip the tracemalloc run measuring peak memory.")
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N recorded symbols.")
+    parser.add_argument("--source", choices=["recorded", "synthetic"], default="recorded", help="Recorded csv payloads or generated ones.")
+    parser.add_argument("--symbols", type=int, default=950, help="Number of synthetic companies.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic payloads.")
+    parser.add_argument("--shareholders", type=int, default=8, help="Average shareholders per synthetic company.")
+    parser.add_argument("--subsidiaries", type=int, default=5, help="Average subsidiaries per synthetic company.")
+    parser.add_argument("--clean-workers", dest="clean_workers", type=int, default=None, help="Also benchmark clean_ownership on this many processes.")
+    parser.add_argument("--output", default=None, help="Also write the results as JSON to this path.")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline file to compare against.")
+    parser.add_argument("--save-baseline", dest="save_baseline", action="store_true", help="Store the results as the baseline instead of comparing.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown before a benchmark counts as a regression.")
+    args = parser.parse_args()
+
+    if args.source == "synthetic":
+        payloads, companies = generate_payloads(
+            args.symbols, args.seed, shareholders=args.shareholders, subsidiaries=args.subsidiaries
+        )
+        # Results of different synthetic sizes must not be compared to each other
+        prefix = f"synthetic[{args.symbols},{args.seed},{args.shareholders},{args.subsidiaries}]:"
+    else:
+        payloads, companies = load_recorded_payloads()
+        prefix = ""
+    if args.limit:
+        payloads = payloads[: args.limit]
+        prefix = f"{prefix}limit[{args.limit}]:"
+    scales = [int(scale) for scale in args.scales.split(",")]
+
+    results = run_benchmarks(
+        payloads, companies, scales, args.repeat, args.memory, args.clean_workers
+    )
+    results = {f"{prefix}{name}": result for name, result in results.items()}
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as baseline_file:
+                baseline = json.load(baseline_file)
+        baseline.update(results)
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(baseline, baseline_file, indent=2)
+        print(f"Baseline saved to {args.baseline}", file=sys.stderr)
+
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            regressions = compare_to_baseline(results, json.load(baseline_file), args.tolerance)
+        if regressions:
+            print("Regressions against the baseline:", file=sys.stderr)
+            for regression in regressions:
+                print(f"  {regression}", file=sys.stderr)
+            sys.exit(1)
+        print("No regression against the baseline", file=sys.stderr)
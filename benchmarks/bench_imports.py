@@ -0,0 +1,130 @@
+"""Start-up time of the entry points, each imported in a fresh interpreter.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_imports
+    python -m benchmarks.bench_imports --modules update_delisting --repeat 10
+    python -m benchmarks.bench_imports --budget update_delisting=0.5
+
+Every module is imported with `python -X importtime` in a temporary working
+directory (the entry points write their log files to the working directory),
+the fastest of --repeat runs is kept. The slowest top-level imports are listed
+to show where the start-up time goes. Exits with 1 when a module fails to
+import or is over its budget.
+
+Only uses the standard library.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.fixtures import ROOT_DIR
+
+ENTRY_POINTS = ["update_delisting", "proxy_requester", "main", "shareholders_scraper"]
+# The daily delisting job must start in well under a second
+DEFAULT_BUDGETS = {"update_delisting": 1.0}
+TOP_IMPORTS = 8
+
+
+def parse_importtime(stderr: str) -> list:
+    """Returns the top-level imports of `-X importtime` output as (module, cumulative seconds), slowest first"""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented under the module importing them
+        if name.startswith("  ") or not cumulative.strip().isdigit():
+            continue
+        imports.append((name.strip(), int(cumulative) / 1e6))
+    return sorted(imports, key=lambda item: item[1], reverse=True)
+
+
+def measure_import(module: str, repeat=5, code=None) -> dict:
+    """Imports a module in fresh interpreters and keeps the fastest run.
+
+    Args:
+        module (str): module to import.
+        repeat (int, optional): number of interpreters started. Defaults to 5.
+        code (str, optional): code run instead of `import <module>`. Defaults to None.
+
+    Returns:
+        dict: wall seconds of the fastest run (interpreter start-up included), the slowest top-level imports of that run and the error of a failed import
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT_DIR, os.environ.get("PYTHONPATH")])))
+    best = None
+    with tempfile.TemporaryDirectory() as work_dir:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            completed = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", code or f"import {module}"],
+                cwd=work_dir,
+                env=env,
+                capture_output=True,
+                text=True,
+            )
+            seconds = time.perf_counter() - started
+            if completed.returncode != 0:
+                error = completed.stderr.strip().splitlines()
+                return {"seconds": None, "top_imports": [], "error": error[-1] if error else "failed"}
+            if best is None or seconds < best["seconds"]:
+                best = {
+                    "seconds": round(seconds, 4),
+                    "top_imports": parse_importtime(completed.stderr)[:TOP_IMPORTS],
+                    "error": None,
+                }
+    return best
+
+
+def parse_budgets(values: list) -> dict:
+    budgets = dict(DEFAULT_BUDGETS)
+    for value in values or []:
+        module, seconds = value.split("=")
+        budgets[module] = float(seconds)
+    return budgets
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modules", default=",".join(ENTRY_POINTS), help="Comma separated modules to import.")
+    parser.add_argument("--repeat", type=int, default=5, help="Interpreters started per module, the fastest one is kept.")
+    parser.add_argument("--budget", action="append", help="MODULE=SECONDS start-up budget, may be repeated (default: update_delisting=1.0).")
+    parser.add_argument("--output", default=None, help="Also write the results as JSON to this path.")
+    args = parser.parse_args()
+    budgets = parse_budgets(args.budget)
+
+    results = {"<interpreter>": measure_import(None, args.repeat, code="pass")}
+    for module in args.modules.split(","):
+        results[module] = measure_import(module, args.repeat)
+
+    failures = []
+    for module, result in results.items():
+        if result["error"]:
+            print(f"{module:<24} failed: {result['error']}", file=sys.stderr)
+            failures.append(f"{module}: import failed")
+            continue
+        budget = budgets.get(module)
+        print(
+            f"{module:<24} {result['seconds']:>7.3f}s"
+            + (f"  (budget {budget:.2f}s)" if budget else ""),
+            file=sys.stderr,
+        )
+        for name, seconds in result["top_imports"]:
+            print(f"    {name:<30} {seconds:>7.3f}s", file=sys.stderr)
+        if budget and result["seconds"] > budget:
+            failures.append(f"{module}: {result['seconds']:.3f}s > {budget:.2f}s")
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if failures:
+        print("Start-up failures:", file=sys.stderr)
+        for line in failures:
+            print(f"  {line}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,172 @@
+"""IDX payloads and idx_company_profile rows rebuilt from the recorded csv.
+
+Only uses the standard library so the stand-in server runs without the
+scraper dependencies.
+"""
+
+import ast
+import csv
+import os
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RECORDED_CSV = os.path.join(ROOT_DIR, "idx_company_profile_current.csv")
+
+LIST_COLUMNS = [
+    "shareholders",
+    "directors",
+    "commissioners",
+    "audit_committees",
+    "subsidiaries",
+]
+INT_COLUMNS = ["sub_sector_id", "yf_currency", "wsj_format", "current_source"]
+
+STATUS_TO_IDX = {
+    "Operating": "Beroperasi",
+    "Not Yet Operating": "Belum Beroperasi",
+    "Non-Operating": "Tidak Beroperasi",
+    "Development Stage": "Tahap Pengembangan",
+    "Pre-Operating": "Pra-Operasi",
+}
+UNIT_TO_IDX = {"Millions": "Jutaan", "Thousands": "Ribuan", "Units": "Satuan", "Full": "Penuh"}
+
+
+def _literal(value) -> list:
+    """Parses a python-repr list stored in the recorded csv, [] when empty"""
+    if not isinstance(value, str) or not value.strip():
+        return []
+    parsed = ast.literal_eval(value)
+    return parsed if isinstance(parsed, list) else []
+
+
+def read_recorded_rows(path=RECORDED_CSV) -> list:
+    """Reads the recorded idx_company_profile csv as typed table rows.
+
+    Args:
+        path (str, optional): recorded idx_company_profile csv. Defaults to RECORDED_CSV.
+
+    Returns:
+        list: one dict per company, empty cells as None and ownership columns as lists
+    """
+    rows = []
+    with open(path, newline="") as csv_file:
+        for raw in csv.DictReader(csv_file):
+            row = {key: (value if value != "" else None) for key, value in raw.items()}
+            for col in LIST_COLUMNS:
+                row[col] = _literal(raw.get(col)) or None
+            row["alias"] = _literal(raw.get("alias"))
+            for col in INT_COLUMNS:
+                if row.get(col) is not None:
+                    row[col] = int(float(row[col]))
+            if row.get("nologo") is not None:
+                row["nologo"] = row["nologo"] == "True"
+            rows.append(row)
+    return rows
+
+
+def to_idx_payload(row: dict) -> dict:
+    """Converts an idx_company_profile row back to a GetCompanyProfilesDetail payload"""
+
+    def text(key):
+        return "" if row.get(key) is None else str(row[key])
+
+    profile = {
+        "KodeEmiten": row["symbol"].removesuffix(".JK"),
+        "NamaEmiten": text("company_name"),
+        "Alamat": text("address"),
+        "BAE": text("register"),
+        "Industri": text("industry"),
+        "SubIndustri": text("sub_industry"),
+        "Email": text("email"),
+        "Fax": text("fax"),
+        "PapanPencatatan": text("listing_board"),
+        "TanggalPencatatan": text("listing_date"),
+        "Telepon": text("phone"),
+        "Website": text("website"),
+        "NPWP": text("NPWP"),
+    }
+    shareholders = [
+        {
+            "Nama": holder.get("name"),
+            "Kategori": holder.get("type"),
+            "Jumlah": holder.get("share_amount") or 0,
+            # Recorded as a fraction, IDX answers in percent
+            "Persentase": round((holder.get("share_percentage") or 0) * 100, 8),
+            "Pengendali": False,
+        }
+        for holder in row.get("shareholders") or []
+    ]
+    directors = [
+        {
+            "Nama": director.get("name"),
+            "Jabatan": director.get("position"),
+            "Afiliasi": bool(director.get("affiliation")),
+        }
+        for director in row.get("directors") or []
+    ]
+    commissioners = [
+        {
+            "Nama": commissioner.get("name"),
+            "Jabatan": commissioner.get("position"),
+            "Independen": bool(commissioner.get("independent")),
+        }
+        for commissioner in row.get("commissioners") or []
+    ]
+    audit_committees = [
+        {"Nama": member.get("name"), "Jabatan": member.get("position")}
+        for member in row.get("audit_committees") or []
+    ]
+    subsidiaries = [
+        {
+            "Nama": sub.get("name"),
+            "BidangUsaha": sub.get("business_activity"),
+            "JumlahAset": sub.get("total_assets"),
+            "Lokasi": sub.get("location"),
+            "MataUang": sub.get("currency"),
+            "Persentase": sub.get("percentage"),
+            "Satuan": UNIT_TO_IDX.get(sub.get("unit"), "Penuh"),
+            "StatusOperasi": STATUS_TO_IDX.get(sub.get("operation_status"), "Beroperasi"),
+            "TahunKomersil": sub.get("commercial_year") or "0",
+        }
+        for sub in row.get("subsidiaries") or []
+    ]
+    return {
+        "ResultCount": 1,
+        "Profiles": [profile],
+        "PemegangSaham": shareholders,
+        "Direktur": directors,
+        "Komisaris": commissioners,
+        "KomiteAudit": audit_committees,
+        "AnakPerusahaan": subsidiaries,
+    }
+
+
+def empty_idx_payload() -> dict:
+    """GetCompanyProfilesDetail answer for an unknown symbol"""
+    return {
+        "ResultCount": 0,
+        "Profiles": [],
+        "PemegangSaham": [],
+        "Direktur": [],
+        "Komisaris": [],
+        "KomiteAudit": [],
+        "AnakPerusahaan": [],
+    }
+
+
+def load_recorded_payloads(path=RECORDED_CSV) -> tuple:
+    """Loads the recorded profiles as raw IDX payloads.
+
+    Args:
+        path (str, optional): recorded idx_company_profile csv. Defaults to RECORDED_CSV.
+
+    Returns:
+        tuple: list of (symbol without .JK, payload dict) and the list of {"symbol", "company_name"} used for the ticker maps
+    """
+    rows = read_recorded_rows(path)
+    payloads = [(row["symbol"].removesuffix(".JK"), to_idx_payload(row)) for row in rows]
+    companies = [
+        {"symbol": row["symbol"], "company_name": row["company_name"]}
+        for row in rows
+        if row.get("company_name")
+    ]
+    return payloads, companies
@@ -0,0 +1,406 @@
+"""Local stand-in for the IDX endpoints and the Supabase REST tables we use.
+
+Serves GetSecuritiesStock, GetCompanyProfilesDetail and GetIssuedHistory plus a
+small PostgREST subset (select, eq/neq/lt/lte/gt/gte/is/in filters, insert,
+upsert, update, delete) for idx_company_profile, idx_active_company_profile,
+idx_ipo_details and the normalized ownership tables, all from the recorded
+fixtures and kept in memory.
+Latency, server errors, 429s and empty profiles can be injected on the IDX
+routes to load test the scrapers without touching idx.co.id or production.
+
+    python -m benchmarks.stand_in_server --port 8765 --latency 0.2 --throttle-rate 0.05
+
+    export IDX_BASE_URL=http://127.0.0.1:8765 SUPABASE_URL=http://127.0.0.1:8765
+    export SUPABASE_KEY=stand.in.key proxy= IDX_RATE_LIMITER_PATH=/tmp/stand_in_limiter.db
+    export IDX_RATE_CALLS=50 IDX_RATE_PERIOD=1 IDX_MAX_RATE=100
+    python main.py --all_symbols True
+
+GET /_stats returns the request counters of the server.
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.fixtures import empty_idx_payload, read_recorded_rows, to_idx_payload
+from benchmarks.synthetic import generate_payloads
+from ownership_tables import OWNERSHIP_TABLES
+
+
+class StandInState:
+    def __init__(
+        self,
+        rows: list,
+        latency=0.0,
+        jitter=0.0,
+        error_rate=0.0,
+        throttle_rate=0.0,
+        empty_profile_rate=0.0,
+        rate_limit=None,
+        db_latency=0.0,
+        delisted=None,
+        seed=None,
+        payloads=None,
+    ):
+        """Fixtures, fault settings and counters shared by the request handlers.
+
+        Args:
+            rows (list): idx_company_profile rows, see fixtures.read_recorded_rows.
+            latency (float, optional): added latency of every IDX response in seconds. Defaults to 0.
+            jitter (float, optional): uniform random extra latency in seconds. Defaults to 0.
+            error_rate (float, optional): share of IDX requests answered with a 500. Defaults to 0.
+            throttle_rate (float, optional): share of IDX requests answered with a 429. Defaults to 0.
+            empty_profile_rate (float, optional): share of profile requests answered with empty Profiles. Defaults to 0.
+            rate_limit (tuple, optional): (calls, period) above which IDX requests get a 429. Defaults to None.
+            db_latency (float, optional): added latency of every REST response in seconds. Defaults to 0.
+            delisted (dict, optional): symbol without .JK to delisting date served by GetIssuedHistory.
+            seed (int, optional): seed of the fault injection.
+            payloads (list, optional): (symbol, payload) pairs served instead of the ones rebuilt from rows.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.empty_profile_rate = empty_profile_rate
+        self.rate_limit = rate_limit
+        self.db_latency = db_latency
+        self.delisted = delisted or {}
+
+        self.tables = {
+            "idx_company_profile": {row["symbol"]: row for row in rows},
+            "idx_ipo_details": {},
+        }
+        # Normalized ownership tables (ownership_tables.sql), keyed by (symbol, entry)
+        for table in OWNERSHIP_TABLES.values():
+            self.tables[table] = {}
+        if payloads is not None:
+            self.profiles = {symbol.upper(): payload for symbol, payload in payloads}
+        else:
+            self.profiles = {
+                row["symbol"].removesuffix(".JK").upper(): to_idx_payload(row) for row in rows
+            }
+        self.active_codes = [
+            row["symbol"].removesuffix(".JK").upper()
+            for row in rows
+            if row.get("delisting_date") is None
+        ]
+        self.counters = {}
+        self._random = random.Random(seed)
+        self._window = []
+        self._lock = threading.Lock()
+
+    def count(self, counter: str):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + 1
+
+    def draw(self) -> float:
+        with self._lock:
+            return self._random.random()
+
+    def over_rate_limit(self) -> bool:
+        """Sliding window check of the configured IDX rate limit"""
+        if not self.rate_limit:
+            return False
+        calls, period = self.rate_limit
+        now = time.monotonic()
+        with self._lock:
+            self._window = [t for t in self._window if now - t < period]
+            if len(self._window) >= calls:
+                return True
+            self._window.append(now)
+            return False
+
+
+def _parse_filter(expression: str):
+    """Splits a PostgREST filter like eq.BBCA.JK into a predicate"""
+    op, _, value = expression.partition(".")
+    if op == "is":
+        expected = {"null": None, "true": True, "false": False}.get(value, value)
+        return lambda v: v is expected
+    if op == "in":
+        values = {v.strip('"') for v in value.strip("()").split(",")}
+        return lambda v: v is not None and str(v) in values
+    if op == "eq":
+        return lambda v: v is not None and str(v) == value
+    if op == "neq":
+        return lambda v: v is None or str(v) != value
+    comparisons = {
+        "lt": lambda a, b: a < b,
+        "lte": lambda a, b: a <= b,
+        "gt": lambda a, b: a > b,
+        "gte": lambda a, b: a >= b,
+    }
+    if op in comparisons:
+        compare = comparisons[op]
+        return lambda v: v is not None and compare(str(v), value)
+    raise ValueError(f"Unsupported filter {expression}")
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    state: StandInState = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body, headers=None):
+        content = json.dumps(body, default=str).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length)) if length else None
+
+    # IDX
+
+    def _idx_fault(self) -> bool:
+        """Applies the latency and fault injection, returns True if a fault was sent"""
+        state = self.state
+        delay = state.latency + (state.jitter * state.draw() if state.jitter else 0)
+        if delay:
+            time.sleep(delay)
+        if state.over_rate_limit():
+            state.count("idx_rate_limited")
+            self._send_json(429, {"message": "Too Many Requests"}, {"Retry-After": "1"})
+            return True
+        draw = state.draw()
+        if draw < state.error_rate:
+            state.count("idx_injected_errors")
+            self._send_json(500, {"message": "Internal Server Error"})
+            return True
+        if draw < state.error_rate + state.throttle_rate:
+            state.count("idx_injected_throttles")
+            self._send_json(429, {"message": "Too Many Requests"}, {"Retry-After": "1"})
+            return True
+        return False
+
+    def _securities_stock(self, query):
+        data = [
+            {"Code": code, "Name": self.state.profiles[code]["Profiles"][0]["NamaEmiten"]}
+            for code in self.state.active_codes
+            if code not in self.state.delisted
+        ]
+        self._send_json(200, {"draw": 0, "recordsTotal": len(data), "recordsFiltered": len(data), "data": data})
+
+    def _company_profile(self, query):
+        code = query.get("KodeEmiten", [""])[0].upper()
+        payload = self.state.profiles.get(code)
+        if payload is None:
+            self._send_json(200, empty_idx_payload())
+        elif self.state.draw() < self.state.empty_profile_rate:
+            self.state.count("idx_injected_empty_profiles")
+            self._send_json(200, {**payload, "Profiles": []})
+        else:
+            self._send_json(200, payload)
+
+    def _issued_history(self, query):
+        data = [
+            {"KodeEmiten": code, "TanggalPencatatan": f"{delisting_date}T00:00:00"}
+            for code, delisting_date in self.state.delisted.items()
+        ]
+        self._send_json(200, {"recordsTotal": len(data), "data": data})
+
+    # Supabase REST
+
+    def _table_rows(self, table: str):
+        if table == "idx_active_company_profile":
+            # The view exposes commissioners under the misspelled column name
+            return [
+                {**row, "comissioners": row.get("commissioners")}
+                for row in self.state.tables["idx_company_profile"].values()
+                if row.get("delisting_date") is None
+            ]
+        if table not in self.state.tables:
+            return None
+        return list(self.state.tables[table].values())
+
+    def _filters(self, query):
+        return {
+            column: _parse_filter(values[0])
+            for column, values in query.items()
+            if column not in ("select", "on_conflict", "order", "limit", "offset", "columns")
+        }
+
+    def _matching(self, rows, filters):
+        return [
+            row for row in rows if all(check(row.get(col)) for col, check in filters.items())
+        ]
+
+    def _rest(self, method: str, table: str, query):
+        if self.state.db_latency:
+            time.sleep(self.state.db_latency)
+        self.state.count(f"rest_{method.lower()}_{table}")
+        rows = self._table_rows(table)
+        if rows is None:
+            self._send_json(404, {"message": f"relation {table} does not exist"})
+            return
+        filters = self._filters(query)
+
+        if method == "GET":
+            matched = self._matching(rows, filters)
+            select = query.get("select", ["*"])[0]
+            if select != "*":
+                columns = [column.strip() for column in select.split(",")]
+                matched = [{column: row.get(column) for column in columns} for row in matched]
+            self._send_json(200, matched)
+            return
+
+        if table == "idx_active_company_profile":
+            self._send_json(405, {"message": "cannot write to a view"})
+            return
+        stored = self.state.tables[table]
+        body = self._read_body()
+
+        with self.state._lock:
+            if method == "POST":
+                key_columns = query.get("on_conflict", ["symbol"])[0].split(",")
+                records = body if isinstance(body, list) else [body]
+                merge = "merge-duplicates" in (self.headers.get("Prefer") or "")
+                for record in records:
+                    key = tuple(record.get(column) for column in key_columns)
+                    key = key[0] if len(key) == 1 else key
+                    if merge and key in stored:
+                        stored[key].update(record)
+                    else:
+                        stored[key] = dict(record)
+                changed = records
+            elif method == "DELETE":
+                changed = []
+                for key, row in list(stored.items()):
+                    if all(check(row.get(col)) for col, check in filters.items()):
+                        changed.append(stored.pop(key))
+            else:
+                changed = self._matching(rows, filters)
+                for row in changed:
+                    row.update(body)
+        if "return=representation" in (self.headers.get("Prefer") or ""):
+            self._send_json(201 if method == "POST" else 200, changed)
+        else:
+            self.send_response(201 if method == "POST" else 204)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    def _route(self, method: str):
+        url = urlparse(self.path)
+        query = parse_qs(url.query, keep_blank_values=True)
+        try:
+            if url.path == "/_stats":
+                self._send_json(200, self.state.counters)
+            elif url.path.startswith("/rest/v1/"):
+                self._rest(method, url.path[len("/rest/v1/"):], query)
+            elif url.path.startswith("/primary/") and method == "GET":
+                routes = {
+                    "/primary/StockData/GetSecuritiesStock": self._securities_stock,
+                    "/primary/ListedCompany/GetCompanyProfilesDetail": self._company_profile,
+                    "/primary/ListingActivity/GetIssuedHistory": self._issued_history,
+                }
+                handler = routes.get(url.path)
+                if handler is None:
+                    self._send_json(404, {"message": "Not Found"})
+                    return
+                self.state.count(f"idx_{url.path.rsplit('/', 1)[-1]}")
+                if not self._idx_fault():
+                    handler(query)
+            else:
+                self._send_json(404, {"message": "Not Found"})
+        except (ValueError, KeyError) as e:
+            self._send_json(400, {"message": str(e)})
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def do_PATCH(self):
+        self._route("PATCH")
+
+    def do_DELETE(self):
+        self._route("DELETE")
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients closing keep-alive connections are expected under load
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+
+def create_server(state: StandInState, host="127.0.0.1", port=8765) -> ThreadingHTTPServer:
+    """Creates the stand-in server, call serve_forever() (e.g. in a thread) to start it"""
+    handler = type("BoundStandInHandler", (StandInHandler,), {"state": state})
+    server = StandInServer((host, port), handler)
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Added latency of IDX responses in seconds.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform random extra IDX latency in seconds.")
+    parser.add_argument("--error-rate", dest="error_rate", type=float, default=0.0, help="Share of IDX requests answered with a 500.")
+    parser.add_argument("--throttle-rate", dest="throttle_rate", type=float, default=0.0, help="Share of IDX requests answered with a 429.")
+    parser.add_argument("--empty-profile-rate", dest="empty_profile_rate", type=float, default=0.0, help="Share of profile requests answered with empty Profiles.")
+    parser.add_argument("--rate-limit", dest="rate_limit", default=None, help="IDX rate limit as CALLS/SECONDS (e.g. 2/4), requests above it get a 429.")
+    parser.add_argument("--db-latency", dest="db_latency", type=float, default=0.0, help="Added latency of REST responses in seconds.")
+    parser.add_argument("--delisted", default="", help="Comma separated symbols GetIssuedHistory reports as delisted today.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the fault injection and of the synthetic payloads.")
+    parser.add_argument("--synthetic", type=int, default=None, help="Serve this many generated companies instead of the recorded ones.")
+    parser.add_argument("--subsidiaries", type=int, default=5, help="Average subsidiaries per generated company.")
+    args = parser.parse_args()
+
+    rate_limit = None
+    if args.rate_limit:
+        calls, period = args.rate_limit.split("/")
+        rate_limit = (int(calls), float(period))
+    today = date.today().isoformat()
+    delisted = {
+        symbol.strip().removesuffix(".JK").upper(): today
+        for symbol in args.delisted.split(",")
+        if symbol.strip()
+    }
+
+    rows, payloads = read_recorded_rows(), None
+    if args.synthetic:
+        payloads, companies = generate_payloads(
+            args.synthetic, args.seed or 0, subsidiaries=args.subsidiaries
+        )
+        rows = [{**company, "delisting_date": None} for company in companies]
+
+    state = StandInState(
+        rows,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        empty_profile_rate=args.empty_profile_rate,
+        rate_limit=rate_limit,
+        db_latency=args.db_latency,
+        delisted=delisted,
+        seed=args.seed,
+        payloads=payloads,
+    )
+    server = create_server(state, args.host, args.port)
+    print(f"Serving {len(state.profiles)} profiles on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,262 @@
+"""Synthetic GetCompanyProfilesDetail payloads for scale testing.
+
+The payloads reproduce what makes the real ones hard to clean: Indonesian
+shareholder labels in mixed case, missing amounts or percentages, duplicated
+holders, listed companies holding shares of each other, people sitting on both
+boards and holding shares, and subsidiary assets written in ID (1.234.567,89)
+or EN (1,234,567.89) number formats. The same seed always gives the same
+payloads.
+
+    python -m benchmarks.synthetic --symbols 5000 --subsidiaries 40 --seed 1 --output payloads.json
+"""
+
+import argparse
+import json
+import random
+
+from benchmarks.fixtures import empty_idx_payload
+
+FIRST_NAMES = [
+    "Agus", "Budi", "Citra", "Dewi", "Eko", "Fajar", "Gita", "Hendra", "Indah", "Joko",
+    "Kartika", "Lestari", "Made", "Nur", "Putri", "Rudy", "Sari", "Teguh", "Wahyu", "Yusuf",
+]
+LAST_NAMES = [
+    "Setiawan", "Santoso", "Wijaya", "Halim", "Susanto", "Gunawan", "Hartono", "Tanoto",
+    "Saragih", "Siregar", "Nasution", "Pratama", "Kusuma", "Salim", "Widjaja", "Lubis",
+]
+TITLES = ["", "", "", ", S.E.", ", S.H.", ", M.M.", ", Se., Ak.", ", MBA"]
+COMPANY_WORDS = [
+    "Abadi", "Mitra", "Sentosa", "Jaya", "Makmur", "Nusantara", "Sejahtera", "Utama",
+    "Global", "Karya", "Persada", "Indah", "Mandiri", "Sinar", "Buana", "Prima",
+]
+COMPANY_KINDS = [
+    "Energi", "Properti", "Logistik", "Pangan", "Tambang", "Finansial", "Media", "Kimia",
+]
+PUBLIC_LABELS = [
+    "Masyarakat", "MASYARAKAT", "Masyarakat Warkat", "Masyarakat Non Warkat", "Publik",
+    "PUBLIK", "Masyarakat Lainnya", "Masyarakat (Masing-Masing)", "Masyarakat Dibawah 5 %",
+]
+SPECIAL_HOLDERS = [
+    "Saham Treasury", "Negara Republik Indonesia", "Pengendali Saham", "Kejaksaan Agung",
+    "AFILIASI PENGENDALI", "Pihak Afiliasi ",
+]
+HOLDER_TYPES = ["Lebih dari 5%", "Kurang dari 5%", "Saham Pengendali", "Saham Non Pengendali"]
+DIRECTOR_POSITIONS = ["Presiden Direktur", "Direktur", "Wakil Presiden Direktur", "Direktur Independen"]
+COMMISSIONER_POSITIONS = ["Presiden Komisaris", "Komisaris", "Komisaris Independen", "Wakil Presiden Komisaris"]
+BUSINESS_ACTIVITIES = [
+    "Perdagangan Besar", "Jasa Konsultasi", "Pertambangan Batubara", "Perkebunan Kelapa Sawit",
+    "Pengembangan Properti", "Jasa Keuangan", "Distribusi Makanan dan Minuman", "Transportasi Laut",
+    "Investasi", "Industri Kimia",
+]
+LOCATIONS = ["Jakarta", "Surabaya", "Bandung", "Medan", "Singapura", "Batam", "Makassar", "Balikpapan"]
+OPERATION_STATUSES = [
+    "Beroperasi", "AKTIF", "ya", "Sudah Beroperasi", "Belum Beroperasi", "Tidak Beroperasi",
+    "Tahap Pengembangan", "Pra-Operasi",
+]
+UNITS = ["Jutaan", "Ribuan", "Penuh", "Satuan", "Millions", "Thousands"]
+
+# 26^4 four letter codes, the multiplier is coprime with it so every index maps to a distinct code
+_CODE_SPACE = 26**4
+_CODE_STEP = 7919
+
+
+def symbol_code(index: int) -> str:
+    """Returns a distinct four letter IDX code for every index below 26^4"""
+    value = (index * _CODE_STEP) % _CODE_SPACE
+    letters = []
+    for _ in range(4):
+        value, remainder = divmod(value, 26)
+        letters.append(chr(ord("A") + remainder))
+    return "".join(reversed(letters))
+
+
+def _person(rng: random.Random) -> str:
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}{rng.choice(TITLES)}"
+
+
+def _company_name(rng: random.Random) -> str:
+    words = rng.sample(COMPANY_WORDS, 2)
+    return f"PT {words[0]} {rng.choice(COMPANY_KINDS)} {words[1]} Tbk"
+
+
+def _count(rng: random.Random, mean: int) -> int:
+    return rng.randint(max(1, mean // 2), max(1, mean * 3 // 2))
+
+
+def _format_number(rng: random.Random, value: float):
+    """Writes a number the way IDX does: raw, ID formatted, EN formatted or ID thousands only"""
+    style = rng.random()
+    if style < 0.4:
+        return round(value, 2)
+    en = f"{value:,.2f}"
+    if style < 0.65:
+        return en.replace(",", "_").replace(".", ",").replace("_", ".")
+    if style < 0.9:
+        return en
+    return f"{int(value):,}".replace(",", ".")
+
+
+def _shareholders(rng, directors, commissioners, listed_names, mean):
+    holders = []
+    for _ in range(_count(rng, mean)):
+        kind = rng.random()
+        if kind < 0.2 and listed_names:
+            name = rng.choice(listed_names)
+        elif kind < 0.35 and (directors or commissioners):
+            # Board members often hold shares too
+            name = rng.choice(directors + commissioners)["Nama"]
+        elif kind < 0.45:
+            name = rng.choice(SPECIAL_HOLDERS)
+        elif kind < 0.75:
+            name = _person(rng)
+        else:
+            name = f"PT {rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_WORDS)}"
+        holders.append(
+            {"Nama": name, "Kategori": rng.choice(HOLDER_TYPES), "Pengendali": rng.random() < 0.1}
+        )
+    holders.append({"Nama": rng.choice(PUBLIC_LABELS), "Kategori": "Masyarakat Warkat", "Pengendali": False})
+
+    total_shares = rng.randint(10**8, 10**11)
+    weights = [rng.paretovariate(1.2) for _ in holders]
+    weight_sum = sum(weights)
+    for holder, weight in zip(holders, weights):
+        percentage = 100 * weight / weight_sum
+        holder["Jumlah"] = float(round(total_shares * percentage / 100))
+        holder["Persentase"] = round(percentage, 6)
+        missing = rng.random()
+        if missing < 0.05:
+            holder["Jumlah"] = 0.0
+        elif missing < 0.1:
+            holder["Persentase"] = 0.0
+
+    # Duplicated rows, as IDX sometimes lists a holder twice
+    for holder in list(holders):
+        if rng.random() < 0.05:
+            holders.append(dict(holder))
+    rng.shuffle(holders)
+    return holders
+
+
+def _subsidiaries(rng, listed_names, mean):
+    count = _count(rng, mean)
+    if rng.random() < 0.02:
+        # A few conglomerates with very long subsidiary lists
+        count *= 20
+    subsidiaries = []
+    for _ in range(count):
+        if listed_names and rng.random() < 0.05:
+            name = rng.choice(listed_names)
+        else:
+            name = f"PT {rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_KINDS)}"
+        percentage = round(rng.uniform(0.5, 99.99), 2)
+        subsidiaries.append(
+            {
+                "Nama": name,
+                "BidangUsaha": rng.choice(BUSINESS_ACTIVITIES),
+                "JumlahAset": _format_number(rng, rng.uniform(1, 10**7)),
+                "Lokasi": rng.choice(LOCATIONS),
+                "MataUang": rng.choice(["IDR", "IDR", "IDR", "USD"]),
+                "Persentase": str(percentage).replace(".", ",") if rng.random() < 0.3 else percentage,
+                "Satuan": rng.choice(UNITS),
+                "StatusOperasi": rng.choice(OPERATION_STATUSES),
+                "TahunKomersil": rng.choice(["0", str(rng.randint(1970, 2024))]),
+            }
+        )
+    return subsidiaries
+
+
+def generate_payloads(
+    n_symbols=950, seed=0, shareholders=8, subsidiaries=5, directors=5, commissioners=4
+) -> tuple:
+    """Generates synthetic GetCompanyProfilesDetail payloads.
+
+    Args:
+        n_symbols (int, optional): number of companies. Defaults to 950.
+        seed (int, optional): random seed, the same seed gives the same payloads. Defaults to 0.
+        shareholders (int, optional): average number of shareholders per company. Defaults to 8.
+        subsidiaries (int, optional): average number of subsidiaries per company. Defaults to 5.
+        directors (int, optional): average number of directors per company. Defaults to 5.
+        commissioners (int, optional): average number of commissioners per company. Defaults to 4.
+
+    Returns:
+        tuple: list of (symbol without .JK, payload dict) and the list of {"symbol", "company_name"} used for the ticker maps
+    """
+    if n_symbols > _CODE_SPACE:
+        raise ValueError(f"At most {_CODE_SPACE} symbols can be generated")
+    rng = random.Random(seed)
+    codes = [symbol_code(index) for index in range(n_symbols)]
+    names = [_company_name(rng) for _ in codes]
+    companies = [
+        {"symbol": f"{code}.JK", "company_name": name} for code, name in zip(codes, names)
+    ]
+
+    payloads = []
+    for code, name in zip(codes, names):
+        board = [_person(rng) for _ in range(_count(rng, directors + commissioners))]
+        director_rows = [
+            {"Nama": person, "Jabatan": rng.choice(DIRECTOR_POSITIONS), "Afiliasi": rng.random() < 0.2}
+            for person in board[: _count(rng, directors)]
+        ]
+        # Some people sit on both boards
+        commissioner_people = board[len(director_rows):] or board[-1:]
+        if director_rows and rng.random() < 0.3:
+            commissioner_people.append(rng.choice(director_rows)["Nama"])
+        commissioner_rows = [
+            {"Nama": person, "Jabatan": rng.choice(COMMISSIONER_POSITIONS), "Independen": rng.random() < 0.3}
+            for person in commissioner_people
+        ]
+        payload = empty_idx_payload()
+        payload.update(
+            {
+                "ResultCount": 1,
+                "Profiles": [
+                    {
+                        "KodeEmiten": code,
+                        "NamaEmiten": name,
+                        "Alamat": f"Jl. {rng.choice(LAST_NAMES)} No.{rng.randint(1, 200)}, {rng.choice(LOCATIONS)}",
+                        "BAE": f"PT {rng.choice(COMPANY_WORDS)} Registra",
+                        "Industri": rng.choice(COMPANY_KINDS),
+                        "SubIndustri": rng.choice(BUSINESS_ACTIVITIES),
+                        "Email": f"corsec@{code.lower()}.co.id",
+                        "Fax": rng.choice(["-", "", f"(021) {rng.randint(1000000, 9999999)}"]),
+                        "PapanPencatatan": rng.choice(["Main", "Development", "Acceleration"]),
+                        "TanggalPencatatan": f"{rng.randint(1977, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                        "Telepon": f"(021) {rng.randint(1000000, 9999999)}",
+                        "Website": f"www.{code.lower()}.co.id",
+                        "NPWP": f"{rng.randint(10, 99)}.{rng.randint(100, 999)}.{rng.randint(100, 999)}.{rng.randint(0, 9)}-{rng.randint(100, 999)}.000",
+                    }
+                ],
+                "PemegangSaham": _shareholders(
+                    rng, director_rows, commissioner_rows, names, shareholders
+                ),
+                "Direktur": director_rows,
+                "Komisaris": commissioner_rows,
+                "KomiteAudit": [
+                    {"Nama": person, "Jabatan": "Anggota Komite Audit"}
+                    for person in [_person(rng) for _ in range(3)]
+                ],
+                "AnakPerusahaan": _subsidiaries(rng, names, subsidiaries),
+            }
+        )
+        payloads.append((code, payload))
+    return payloads, companies
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--symbols", type=int, default=950, help="Number of companies.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--shareholders", type=int, default=8, help="Average shareholders per company.")
+    parser.add_argument("--subsidiaries", type=int, default=5, help="Average subsidiaries per company.")
+    parser.add_argument("--output", default=None, help="Write {symbol: payload} as JSON to this path instead of stdout.")
+    args = parser.parse_args()
+
+    payloads, _ = generate_payloads(
+        args.symbols, args.seed, shareholders=args.shareholders, subsidiaries=args.subsidiaries
+    )
+    content = json.dumps({symbol: payload for symbol, payload in payloads})
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(content)
+    else:
+        print(content)
@@ -0,0 +1,123 @@
+import logging
+import threading
+import time
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+ENDPOINT_FAMILIES = [
+    "GetCompanyProfilesDetail",
+    "GetSecuritiesStock",
+    "GetIssuedHistory",
+]
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request while the endpoint's circuit is open"""
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold=5, reset_timeout=15.0, max_reset_timeout=120.0):
+        """Circuit breaker for one IDX endpoint family.
+
+        After `failure_threshold` consecutive failures the circuit opens and requests
+        fail immediately, without paying the rate-limit wait. Once `reset_timeout`
+        has passed a single half-open probe is let through: a success closes the
+        circuit, a failure opens it again with a doubled timeout.
+
+        Args:
+            name (str): endpoint family name, used in logs.
+            failure_threshold (int, optional): consecutive failures that trip the circuit. Defaults to 5.
+            reset_timeout (float, optional): seconds before the first half-open probe. Defaults to 15.
+            max_reset_timeout (float, optional): upper bound of the doubled timeout. Defaults to 120.
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+
+        self.state = CLOSED
+        self.failures = 0
+        self.trips = 0
+        self._timeout = reset_timeout
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """True if a request may be sent now. In half-open state only one probe is allowed."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self._timeout:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def before_request(self):
+        """Raises CircuitOpenError if the request should not be sent"""
+        if not self.allow_request():
+            raise CircuitOpenError(
+                f"Circuit for {self.name} is open, retry in {self.retry_after():.0f}s"
+            )
+
+    def retry_after(self) -> float:
+        """Seconds until the next half-open probe, 0 when closed"""
+        with self._lock:
+            if self.state == CLOSED:
+                return 0.0
+            return max(0.0, self._opened_at + self._timeout - time.monotonic())
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logging.info(f"Circuit for {self.name} closed")
+            self.state = CLOSED
+            self.failures = 0
+            self._timeout = self.reset_timeout
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN:
+                # Failed probe, wait longer before the next one
+                self._timeout = min(self.max_reset_timeout, self._timeout * 2)
+                self._open()
+            elif self.state == CLOSED and self.failures >= self.failure_threshold:
+                self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self.trips += 1
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+        logging.warning(
+            f"Circuit for {self.name} opened after {self.failures} consecutive failures, probing in {self._timeout:.0f}s"
+        )
+
+
+_breakers = {}
+# The fetch and hedge threads look up breakers at the same time
+_breakers_lock = threading.Lock()
+
+
+def endpoint_family(url: str) -> str:
+    """Returns the endpoint family of an IDX url, or the url path for other endpoints"""
+    for family in ENDPOINT_FAMILIES:
+        if family in url:
+            return family
+    return url.split("?")[0]
+
+
+def get_breaker(url: str) -> CircuitBreaker:
+    """Returns the process-wide circuit breaker of the url's endpoint family"""
+    family = endpoint_family(url)
+    with _breakers_lock:
+        if family not in _breakers:
+            _breakers[family] = CircuitBreaker(family)
+        return _breakers[family]
@@ -1,29 +1,31 @@
 import numpy as np
 import pandas as pd
-import yfinance as yf
-from bs4 import BeautifulSoup
-from dotenv import load_dotenv
-from pyrate_limiter import Duration, Limiter, RequestRate
-from ratelimit import limits
-from requests import Session
-from requests_ratelimiter import LimiterMixin, MemoryQueueBucket
-from supabase import create_client
-import ssl
-import urllib.request
 import os
+import threading
 import time
 import json
-import yfinance as yf
-import translators as ts
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import argparse
-from fuzzywuzzy import fuzz
 import logging
 import re
 from datetime import date
-from fuzzywuzzy import process
+from proxy_pool import IDX_BASE_URL
+from proxy_requester import ProxyRequester
+from rate_limiter import IDX_CALLS, IDX_PERIOD
+from run_report import get_report, start_report
+from securities_snapshot import get_securities_snapshot
+from structured_logging import log_event, setup_logging
 
-# from imp import reload
-from importlib import reload
+LOGGER = logging.getLogger(__name__)
+
+ownership_columns = [
+    "shareholders",
+    "directors",
+    "commissioners",
+    "audit_committees",
+    "subsidiaries",
+]
 
 all_columns = [
     "symbol",
@@ -54,6 +56,42 @@ all_columns = [
     "subsidiaries",
 ]
 
+# Compact dtypes of idx_company_profile, applied when the table is loaded:
+# low-cardinality text as categoricals, small ids and flags as nullable ints
+profile_dtypes = {
+    "listing_board": "category",
+    "industry": "category",
+    "sub_industry": "category",
+    "register": "category",
+    "sub_sector_id": "Int16",
+    "yf_currency": "Int8",
+    "wsj_format": "Int8",
+    "current_source": "Int8",
+    "nologo": "boolean",
+}
+# Columns of the exploded ownership frames with few distinct values
+ownership_categorical_columns = [
+    "position",
+    "type",
+    "currency",
+    "operation_status",
+    "location",
+    "business_activity",
+]
+# Free text, stored as Arrow strings when pyarrow is installed
+profile_text_columns = [
+    "company_name",
+    "address",
+    "email",
+    "phone",
+    "fax",
+    "NPWP",
+    "website",
+    "listing_date",
+    "delisting_date",
+    "updated_on",
+]
+
 sub_sector_id_map = {
     "Transportation Infrastructure": 28,
     "Food & Beverage": 2,
@@ -92,10 +130,8 @@ sub_sector_id_map = {
 
 
 def initiate_logging(LOG_FILENAME):
-    reload(logging)
-
-    formatLOG = "%(asctime)s - %(levelname)s: %(message)s"
-    logging.basicConfig(filename=LOG_FILENAME, level=logging.INFO, format=formatLOG)
+    # Leveled, json by default and written by a background thread, see structured_logging.py
+    setup_logging(LOG_FILENAME)
     logging.info("Program started")
 
 
@@ -138,57 +174,92 @@ def normalize_company_format(company_name: str) -> str:
     return company_clean.strip()
 
 
-class ProxyRequester:
-    def __init__(self, proxy=None):
-        """Initializes the ProxyRequester class with the provided proxy
+def _text_dtype():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return None
+    return "string[pyarrow]"
 
-        Args:
-            proxy (str, optional): the proxy to be used. Defaults to None. Example: 'brd-customer-xxx-zone-xxx:xxx@brd.superproxy.io:xxx'
-        """
-        # Set up SSL context to unverified
-        ssl._create_default_https_context = ssl._create_unverified_context
-        self.user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-
-        if proxy:
-            proxy_support = urllib.request.ProxyHandler({"http": proxy, "https": proxy})
-            opener = urllib.request.build_opener(proxy_support)
-            urllib.request.install_opener(opener)
-        else:
-            # Install an opener without proxy support
-            opener = urllib.request.build_opener()
-            urllib.request.install_opener(opener)
 
-    def fetch_url(self, url):
-        # Use the installed opener to fetch the URL
+def compact_profile_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Casts the profile columns to the compact dtypes of profile_dtypes in place
+
+    A column whose values don't fit its declared dtype keeps its dtype.
+
+    Args:
+        df (pd.DataFrame): idx_company_profile rows
+
+    Returns:
+        pd.DataFrame: the same dataframe
+    """
+    dtypes = dict(profile_dtypes)
+    text_dtype = _text_dtype()
+    if text_dtype:
+        dtypes.update({col: text_dtype for col in profile_text_columns})
+
+    for col, dtype in dtypes.items():
+        if col not in df.columns:
+            continue
         try:
-            print(f"Fetching: {url}")
-            req = urllib.request.Request(
-                url,
-                headers={
-                    "User-Agent": self.user_agent,
-                    "Referer": "https://www.idx.co.id/en-us/listed-companies/company-profiles",
-                    "Accept": "application/json, text/plain, */*",
-                    "Accept-Language": "en-US,en;q=0.9",
-                    "Connection": "keep-alive",
-                },
-            )
-            with urllib.request.urlopen(req) as response:
-                content = response.read().decode()
-                print(f"Success! Response length: {len(content)}")
-                return content
-        except Exception as e:
-            print(f"Error fetching URL {url}: {e}")
-            return False
+            df[col] = df[col].astype(dtype)
+        except (TypeError, ValueError) as e:
+            logging.warning(f"Keeping {col} as {df[col].dtype}, not {dtype}: {e}")
+    return df
 
 
-class LimiterSession(LimiterMixin, Session):
-    def __init__(self):
-        super().__init__(
-            limiter=Limiter(
-                RequestRate(2, Duration.SECOND * 5)
-            ),  # max 2 requests per 5 seconds
-            bucket_class=MemoryQueueBucket,
-        )
+def cast_int(num):
+    if pd.notna(num):
+        return round(num)
+    else:
+        return None
+
+
+def convert_df_to_records(df, int_cols=[]):
+    """Converts the profile dataframe to records ready to be upserted
+
+    Args:
+        df (pd.DataFrame): profile rows
+        int_cols (list, optional): columns to cast to int. Defaults to [].
+
+    Returns:
+        list: list of row dicts
+    """
+    temp_df = df.copy()
+    for cols in temp_df.columns:
+        if temp_df[cols].dtype == "datetime64[ns]":
+            temp_df[cols] = temp_df[cols].astype(str)
+    # Compact dtypes (categoricals, nullable ints, Arrow strings) back to plain
+    # python values, NaN and pd.NA to None
+    temp_df = temp_df.astype(object).where(temp_df.notna(), None)
+    records = temp_df.to_dict("records")
+
+    for record in records:
+        for k in int_cols:
+            if k in record:
+                record[k] = cast_int(record[k])
+
+        if "shareholders" in record and record["shareholders"] is not None:
+            final_shareholders = []
+            for shareholder in record["shareholders"]:
+                if "ticker" in shareholder:
+                    shareholder["symbol"] = shareholder.pop("ticker")
+
+                if "symbol" in shareholder and shareholder.get("symbol") is None:
+                    del shareholder["symbol"]
+
+                share_percentage = shareholder.get("share_percentage")
+                if share_percentage is not None:
+                    share_percentage_str = str(share_percentage)
+                    if "e" in share_percentage_str or "E" in share_percentage_str:
+                        shareholder["share_percentage"] = (
+                            f"{share_percentage:.8f}".rstrip("0")
+                        )
+
+                final_shareholders.append(shareholder)
+
+            record["shareholders"] = final_shareholders
+    return records
 
 
 class OwnershipCleaner:
@@ -199,6 +270,9 @@ class OwnershipCleaner:
             shareholders_df (pd.DataFrame): the dataframe containing the current shareholders data
         """
         self._ticker_maps_cache = None
+        self._pool = None
+        self._pool_key = None
+        self._pool_lock = threading.Lock()
 
     def _convert_json_col_to_df(self, df, col_name):
         """Converts a json column in a dataframe to a new dataframe
@@ -229,6 +303,16 @@ class OwnershipCleaner:
         temp_df = temp_df.dropna(axis=1, how="all")
         return temp_df
 
+    def _compact_ownership_frame(self, df):
+        """Stores the columns repeating a few values over the exploded rows as categoricals"""
+        for col in df.columns.intersection(ownership_categorical_columns):
+            try:
+                df[col] = df[col].astype("category")
+            except TypeError:
+                # Unhashable values (e.g. nested dicts), keep the column as is
+                pass
+        return df
+
     def _standardize_name_for_matching(self, name: str) -> str:
         if not isinstance(name, str):
             return ""
@@ -249,7 +333,17 @@ class OwnershipCleaner:
             .execute()
             .data
         )
+        return self.set_ticker_maps(company_lists)
+
+    def set_ticker_maps(self, company_lists: list) -> dict | dict:
+        """Builds the ticker maps from a list of {"symbol", "company_name"} dicts, without querying the DB
 
+        Args:
+            company_lists (list): list of companies with their symbol and name
+
+        Returns:
+            dict | dict: standardized name to symbol map and original name to symbol map
+        """
         standardized_name_map = {}
         reverse_ticker_map = {}
 
@@ -264,6 +358,12 @@ class OwnershipCleaner:
         self._ticker_maps_cache = (standardized_name_map, reverse_ticker_map)
         return self._ticker_maps_cache
 
+    def _fuzzy_extract_one(self, name, choices):
+        from fuzzywuzzy import process
+
+        with get_report().stage("fuzzy_ticker_matching"):
+            return process.extractOne(name, choices)
+
     def _process_management_col_to_df(self, df, col_name):
         """Processes the management column (directors, commissioners, or audit_committees) in the dataframe to a new dataframe
 
@@ -316,7 +416,7 @@ class OwnershipCleaner:
         )
         temp_df = temp_df.drop_duplicates(subset=["symbol", "name", "position"])
 
-        return temp_df
+        return self._compact_ownership_frame(temp_df)
 
     def _process_shareholder_col_to_df(self, df, col_name, supabase_client):
         """Processes the shareholder column in the dataframe to a new dataframe
@@ -333,14 +433,14 @@ class OwnershipCleaner:
             try:
                 return round(float(x.replace("%", "")) / 100, 8)
             except Exception as e:
-                print(f"Error: {e}. Value is {x}")
+                log_event(LOGGER, logging.DEBUG, "share_value_unparsable", value=x, error=e)
                 return None
 
         def convert_share_amount(x):
             try:
                 return float(x.replace(",", ""))
             except Exception as e:
-                print(f"Error: {e}. Value is {x}")
+                log_event(LOGGER, logging.DEBUG, "share_value_unparsable", value=x, error=e)
                 return None
 
         shareholders_df = self._convert_json_col_to_df(df, col_name)
@@ -522,7 +622,7 @@ class OwnershipCleaner:
         )
 
         # Symbol identification for shareholders
-        if supabase_client:
+        if supabase_client or self._ticker_maps_cache:
             standardized_map, reverse_map = self._get_ticker_maps(supabase_client)
             company_name_choices = list(reverse_map.keys())
 
@@ -535,18 +635,32 @@ class OwnershipCleaner:
                     shareholder_name
                 )
                 found_ticker = standardized_map.get(cleaned_shareholder_key)
-                print(
-                    f"Matching {shareholder_name} with cleaned key {cleaned_shareholder_key} to ticker {found_ticker}"
+                get_report().increment(
+                    "ticker_map_hits" if found_ticker else "ticker_map_misses"
+                )
+                log_event(
+                    LOGGER,
+                    logging.DEBUG,
+                    "ticker_match",
+                    name=shareholder_name,
+                    key=cleaned_shareholder_key,
+                    ticker=found_ticker,
                 )
 
                 if found_ticker:
                     merged_df.loc[index, "ticker"] = found_ticker
 
                 if not found_ticker and "tbk" in shareholder_name.lower():
-                    best_match = process.extractOne(
+                    best_match = self._fuzzy_extract_one(
                         shareholder_name, company_name_choices
                     )
-                    print(f"best match fuzzy: {best_match}")
+                    log_event(
+                        LOGGER,
+                        logging.DEBUG,
+                        "ticker_fuzzy_match",
+                        name=shareholder_name,
+                        best_match=best_match,
+                    )
                     if best_match and best_match[1] >= 90:
                         matched_name = best_match[0]
                         found_ticker = reverse_map[matched_name]
@@ -583,7 +697,7 @@ class OwnershipCleaner:
         )
         merged_df = pd.concat([merged_df, old_shareholders_df], ignore_index=True)
 
-        return merged_df
+        return self._compact_ownership_frame(merged_df)
 
     def _process_subsidiary_col_to_df(self, df, col_name, supabase_client):
         """Processes the subsidiary column in the dataframe to a new dataframe
@@ -602,7 +716,7 @@ class OwnershipCleaner:
 
         subs_df["ticker"] = None
 
-        if supabase_client:
+        if supabase_client or self._ticker_maps_cache:
             standardized_map, reverse_map = self._get_ticker_maps(supabase_client)
             company_name_choices = list(reverse_map.keys())
 
@@ -613,10 +727,13 @@ class OwnershipCleaner:
 
                 cleaned_sub_key = self._standardize_name_for_matching(sub_name)
                 found_ticker = standardized_map.get(cleaned_sub_key)
+                get_report().increment(
+                    "ticker_map_hits" if found_ticker else "ticker_map_misses"
+                )
 
                 if not found_ticker:
                     # User requested fuzzy search
-                    best_match = process.extractOne(sub_name, company_name_choices)
+                    best_match = self._fuzzy_extract_one(sub_name, company_name_choices)
                     if best_match and best_match[1] >= 90:
                         found_ticker = reverse_map[best_match[0]]
 
@@ -624,7 +741,7 @@ class OwnershipCleaner:
                     subs_df.loc[index, "ticker"] = found_ticker
 
                 if not found_ticker and "tbk" in sub_name.lower():
-                    best_match = process.extractOne(sub_name, company_name_choices)
+                    best_match = self._fuzzy_extract_one(sub_name, company_name_choices)
                     if best_match and best_match[1] >= 90:
                         matched_name = best_match[0]
                         found_ticker = reverse_map[matched_name]
@@ -673,10 +790,10 @@ class OwnershipCleaner:
         if "unit" in subs_df.columns:
             subs_df = subs_df.drop(columns=["unit"])
 
-        return subs_df
+        return self._compact_ownership_frame(subs_df)
 
     def process_ownership_col(
-        self, df: pd.DataFrame, col_name: str, supabase_client=None
+        self, df: pd.DataFrame, col_name: str, supabase_client=None, long_frames=None
     ) -> pd.DataFrame:
         """
         Process the ownership column (directors, commissioners, audit_committees or shareholders) in a dataframe to a json format
@@ -685,42 +802,207 @@ class OwnershipCleaner:
             df (pd.DataFrame): dataframe to be processed
             col_name (str): column name to be processed
             supabase_client (Client, optional): Supabase client object for database interactions. Defaults to None.
+            long_frames (dict, optional): when given, the cleaned long-format frame (one row per entry) is appended to long_frames[col_name]. Defaults to None.
         Returns:
             pd.DataFrame: processed dataframe containing the ownership column in json format
         """
-        if col_name in [
-            "directors",
-            "commissioners",
-            "audit_committees",
-            "subsidiaries",
-        ]:
-            if col_name == "subsidiaries":
-                temp_df = self._process_subsidiary_col_to_df(
-                    df, col_name, supabase_client
+        with get_report().stage(f"clean_{col_name}"):
+            if not self._has_entries(df, col_name):
+                # Small partitions and micro-batches often have no entry at all in a column
+                return pd.DataFrame(columns=["symbol", col_name])
+
+            if col_name in [
+                "directors",
+                "commissioners",
+                "audit_committees",
+                "subsidiaries",
+            ]:
+                if col_name == "subsidiaries":
+                    temp_df = self._process_subsidiary_col_to_df(
+                        df, col_name, supabase_client
+                    )
+                else:
+                    temp_df = self._process_management_col_to_df(df, col_name)
+            elif col_name == "shareholders":
+                temp_df = self._process_shareholder_col_to_df(df, col_name, supabase_client)
+
+            if long_frames is not None:
+                long_frames.setdefault(col_name, []).append(temp_df)
+
+            temp_df = temp_df.replace(np.nan, None)
+            json_df = (
+                temp_df.groupby("symbol")
+                .apply(
+                    lambda x: x.rename(
+                        columns={"ticker": "symbol"}, errors="ignore"
+                    ).to_json(orient="records"),
+                    include_groups=False,
                 )
+                .reset_index(name=col_name)
+            )
+            json_df[col_name] = json_df.apply(lambda x: json.loads(x[col_name]), axis=1)
+
+            return json_df
+
+    def _has_entries(self, df, col_name) -> bool:
+        """Whether at least one row holds a non-empty list (or json list) in the column"""
+        if col_name not in df.columns:
+            return False
+        for value in df[col_name].dropna():
+            if isinstance(value, str):
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    return True
+            if value:
+                return True
+        return False
+
+    def clean_ownership(
+        self, df, columns, supabase_client=None, workers=1, long_frames=None
+    ) -> pd.DataFrame:
+        """Cleans several ownership columns and merges them into one dataframe
+
+        Args:
+            df (pd.DataFrame): dataframe containing symbol and the raw ownership columns
+            columns (list): ownership columns to clean
+            supabase_client (Client, optional): Supabase client object used for ticker matching. Defaults to None.
+            workers (int, optional): clean partitions of symbols in this many processes. Defaults to 1 (in this process).
+            long_frames (dict, optional): collects the long-format frame of every column, see process_ownership_col. Defaults to None.
+
+        Returns:
+            pd.DataFrame: one row per symbol with the cleaned ownership columns, sorted by symbol
+        """
+        if df.empty:
+            return pd.DataFrame(columns=["symbol"])
+        if workers > 1 and df["symbol"].nunique() > 1:
+            return self._clean_ownership_parallel(
+                df, columns, supabase_client, workers, long_frames
+            )
+        profile_df = df.copy()
+        merged_updated_df = None
+
+        for col_name in columns:
+            temp_df = self.process_ownership_col(
+                profile_df, col_name, supabase_client, long_frames
+            )
+            if merged_updated_df is None:
+                merged_updated_df = temp_df.copy()
             else:
-                temp_df = self._process_management_col_to_df(df, col_name)
-        elif col_name == "shareholders":
-            temp_df = self._process_shareholder_col_to_df(df, col_name, supabase_client)
-
-        temp_df = temp_df.replace(np.nan, None)
-        json_df = (
-            temp_df.groupby("symbol")
-            .apply(
-                lambda x: x.rename(
-                    columns={"ticker": "symbol"}, errors="ignore"
-                ).to_json(orient="records"),
-                include_groups=False,
+                merged_updated_df = pd.merge(
+                    merged_updated_df, temp_df, on="symbol", how="outer"
+                )
+        if merged_updated_df is None:
+            return pd.DataFrame(columns=["symbol"])
+        return merged_updated_df
+
+    def _get_pool(self, workers: int, supabase_client=None) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if supabase_client and not self._ticker_maps_cache:
+                # Fetched once here, the workers get the maps through their initializer
+                self._get_ticker_maps(supabase_client)
+            # The workers hold the maps they were started with
+            key = (workers, id(self._ticker_maps_cache))
+            if self._pool is None or self._pool_key != key:
+                if self._pool is not None:
+                    self._pool.shutdown()
+                # Spawned rather than forked: the pipeline threads may hold locks
+                # (logging, run report) at fork time, which would deadlock the child
+                self._pool = ProcessPoolExecutor(
+                    workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_cleaning_worker,
+                    initargs=(self._ticker_maps_cache,),
+                )
+                self._pool_key = key
+            return self._pool
+
+    def _clean_ownership_parallel(
+        self, df, columns, supabase_client, workers, long_frames=None
+    ):
+        """Cleans partitions of symbols in worker processes and merges them in symbol order.
+
+        Symbols are dealt round-robin over `workers` partitions. All rows of a
+        symbol land in the same partition, every column processor
+        only looks at rows of one symbol at a time, so the merged output is the
+        same as the one of a single process run.
+        """
+        pool = self._get_pool(workers, supabase_client)
+
+        symbols = sorted(df["symbol"].unique())
+        n_partitions = min(workers, len(symbols))
+        partitions = [
+            df[df["symbol"].isin(symbols[i::n_partitions])] for i in range(n_partitions)
+        ]
+        results = list(
+            pool.map(
+                _clean_ownership_partition,
+                partitions,
+                [columns] * n_partitions,
+                [long_frames is not None] * n_partitions,
             )
-            .reset_index(name=col_name)
         )
-        json_df[col_name] = json_df.apply(lambda x: json.loads(x[col_name]), axis=1)
 
-        return json_df
+        cleaned = []
+        for cleaned_df, report, partition_frames in results:
+            get_report().merge(report)
+            if long_frames is not None:
+                for col_name, frames in partition_frames.items():
+                    long_frames.setdefault(col_name, []).extend(frames)
+            if not cleaned_df.empty:
+                cleaned.append(cleaned_df)
+        if not cleaned:
+            return pd.DataFrame(columns=["symbol"] + list(columns))
+        merged = pd.concat(cleaned, ignore_index=True)
+        return (
+            merged.reindex(columns=["symbol"] + list(columns))
+            .sort_values("symbol", kind="stable")
+            .reset_index(drop=True)
+        )
+
+    def close(self):
+        """Shuts down the cleaning worker processes, if any"""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+                self._pool_key = None
+
+
+# Cleaner of a cleaning worker process, built once per process by _init_cleaning_worker
+_worker_cleaner = None
+
+
+def _init_cleaning_worker(ticker_maps):
+    global _worker_cleaner
+    _worker_cleaner = OwnershipCleaner()
+    _worker_cleaner._ticker_maps_cache = ticker_maps
+
+
+def _clean_ownership_partition(df, columns, keep_long_frames=False):
+    # A fresh report per task, the parent merges the counters of every partition once
+    report = start_report("ownership_cleaning_worker")
+    long_frames = {} if keep_long_frames else None
+    cleaned_df = _worker_cleaner.clean_ownership(df, columns, long_frames=long_frames)
+    return cleaned_df, report.to_dict(), long_frames
 
 
 class IdxProfileUpdater:
-    def __init__(self, company_profile_csv_path=None, supabase_client=None, proxy=None):
+    def __init__(
+        self,
+        company_profile_csv_path=None,
+        supabase_client=None,
+        proxy=None,
+        hedge=False,
+        stream_upsert=False,
+        clean_workers=1,
+        refresh_snapshot=False,
+        ownership_tables_dir=None,
+        ownership_tables_db=False,
+        ownership_graph_path=None,
+        person_index_path=None,
+        ownership_history_path=None,
+    ):
         """
         Class to update idx_company_profile table in supabase database.
 
@@ -728,6 +1010,15 @@ class IdxProfileUpdater:
             company_profile_csv_path (str, optional): Path to the CSV file containing company profile data.
             supabase_client (Client, optional): Supabase client object for database interactions.
             proxy (str, optional): Proxy settings for web requests.
+            hedge (bool, optional): Hedge IDX requests running past the p95 latency.
+            stream_upsert (bool, optional): Upsert each cleaned batch while the run goes on, so partial progress is kept.
+            clean_workers (int, optional): Number of processes cleaning the ownership columns. Defaults to 1 (in this process).
+            refresh_snapshot (bool, optional): Download the active securities even if the persisted snapshot is fresh.
+            ownership_tables_dir (str, optional): Also write the cleaned ownership as normalized Parquet tables to this directory.
+            ownership_tables_db (bool, optional): Also replace the cleaned companies' rows in the normalized ownership DB tables.
+            ownership_graph_path (str, optional): Update the cross-holding graph persisted at this path with the modified companies.
+            person_index_path (str, optional): Update the person index persisted at this path with the modified companies.
+            ownership_history_path (str, optional): Append the ownership changes of the modified companies to the history at this path.
         """
 
         if company_profile_csv_path and supabase_client:
@@ -747,32 +1038,63 @@ class IdxProfileUpdater:
             )
             self.supabase_client = supabase_client
             self.current_data = pd.DataFrame(response.data, columns=all_columns)
-            if not self.current_data.empty:
-                self.current_data = self.current_data.drop_duplicates(
-                    subset="symbol", keep="last"
-                )
 
         else:
             self.supabase_client = None
             self.current_data = pd.DataFrame(columns=all_columns)
 
+        # Indexed by symbol for the whole run, updates are merged in place
+        self.current_data = compact_profile_dtypes(
+            self.current_data.drop_duplicates(subset="symbol", keep="last").set_index(
+                "symbol"
+            )
+        )
+
         self.new_data = None
         self.updated_rows = None
         self.modified_symbols = set()
+        self.failed_symbols = set()
+        self.upserted_symbols = set()
+        # Rows as loaded, kept for the pre-update snapshot written by upsert_to_db
+        self._original_rows = []
+        self._original_symbols = set()
+        self._appended_symbols = set()
+        self.stream_upsert = stream_upsert
+        self._uncleaned_saved = False
+        self._uncleaned_lock = threading.Lock()
+        self.clean_workers = clean_workers
+        self.refresh_snapshot = refresh_snapshot
+        self.securities_snapshot = None
+        self.ownership_tables_dir = ownership_tables_dir
+        self.ownership_tables_db = ownership_tables_db
+        # The long-format frames built while cleaning are only kept when a table is written
+        self.ownership_tables = None
+        if ownership_tables_dir or ownership_tables_db:
+            from ownership_tables import OwnershipTables, check_parquet_engine
+
+            if ownership_tables_dir:
+                # Fails before any request instead of after a run that writes nothing
+                check_parquet_engine()
+            self.ownership_tables = OwnershipTables()
+        self.ownership_graph_path = ownership_graph_path
+        self.ownership_graph = None
+        self.person_index_path = person_index_path
+        self.person_index = None
+        self.ownership_history_path = ownership_history_path
+        self._bypass_symbols = None
         self.ownershipcleaner = OwnershipCleaner()
-        self._session = LimiterSession()
-        self._requester = ProxyRequester(proxy)
+        self._requester = ProxyRequester(proxy, hedge=hedge)
         self._translation_cache = {}
 
     def _retrieve_active_symbols(self):
-        url = "https://www.idx.co.id/primary/StockData/GetSecuritiesStock?start=0&length=9999&code=&sector=&board=&language=en-us"
-        response = self._requester.fetch_url(url)
-        if response == False:
-            raise Exception("Error retrieving active symbols from IDX json.")
-
-        data = json.loads(response)["data"]
-        active_symbols = {index["Code"] + ".JK": index["Name"] for index in data}
-        print(len(active_symbols), "active symbols")
+        # Shared with the other jobs, downloaded at most once per snapshot TTL
+        self.securities_snapshot = get_securities_snapshot(
+            self._requester, refresh=self.refresh_snapshot
+        )
+        active_symbols = self.securities_snapshot.securities
+        logging.info(
+            f"{len(active_symbols)} active symbols, snapshot from {self.securities_snapshot.age() / 3600:.1f}h ago"
+        )
 
         return active_symbols
 
@@ -794,24 +1116,42 @@ class IdxProfileUpdater:
 
         return new_symbols
 
-    @limits(calls=2, period=4)
-    def _retrieve_idx_profile(self, yf_symbol):
+    def _fetch_idx_profile(self, yf_symbol) -> dict:
+        """Fetches and decodes the GetCompanyProfilesDetail payload of a symbol"""
         symbol = (yf_symbol.split(".")[0]).lower()
-        url = f"https://www.idx.co.id/primary/ListedCompany/GetCompanyProfilesDetail?KodeEmiten={symbol}&language=en-us"
+        url = f"{IDX_BASE_URL}/primary/ListedCompany/GetCompanyProfilesDetail?KodeEmiten={symbol}&language=en-us"
         response = self._requester.fetch_url(url)
         if response == False:
             raise Exception(f"Failed to fetch profile for {yf_symbol} from IDX.")
 
         data = json.loads(response)
+        if not data.get("Profiles"):
+            # An empty profile is how IDX sometimes answers when it throttles us.
+            # Reported here, in the thread that made the request.
+            self._requester.report_throttled("empty Profiles")
+        return data
+
+    def _retrieve_idx_profile(self, yf_symbol):
+        return self._parse_idx_profile(yf_symbol, self._fetch_idx_profile(yf_symbol))
+
+    def _parse_idx_profile(self, yf_symbol, data):
+        """Converts a GetCompanyProfilesDetail payload to a profile dict with the table's column names
+
+        Args:
+            yf_symbol (str): symbol with the .JK suffix
+            data (dict): decoded GetCompanyProfilesDetail response
 
+        Returns:
+            dict: profile data of the symbol
+        """
         profile_dict = {"symbol": yf_symbol}
 
         if data.get("Profiles") and len(data["Profiles"]) > 0:
             profiles = data["Profiles"][0]
         else:
             profiles = {}
-            print(
-                f"WARNING: Profile data empty for {yf_symbol}. Using available details."
+            logging.warning(
+                f"Profile data empty for {yf_symbol}. Using available details."
             )
 
         key_renaming = {
@@ -927,12 +1267,13 @@ class IdxProfileUpdater:
         profile_dict["shareholders"] = shareholders
 
         subsidiaries_raw = data.get("AnakPerusahaan", [])
-        if subsidiaries_raw:
-            print(
-                f"DEBUG: Found {len(subsidiaries_raw)} entries in AnakPerusahaan for {yf_symbol}"
-            )
-        else:
-            print(f"DEBUG: No AnakPerusahaan found for {yf_symbol}")
+        log_event(
+            LOGGER,
+            logging.DEBUG,
+            "subsidiaries_found",
+            symbol=yf_symbol,
+            count=len(subsidiaries_raw),
+        )
 
         subsidiaries = []
         for sub in subsidiaries_raw:
@@ -951,30 +1292,37 @@ class IdxProfileUpdater:
                 elif new_key == "business_activity" and value:
                     val_str = str(value).strip()
                     if val_str in self._translation_cache:
+                        get_report().increment("translation_cache_hits")
                         new_value = self._translation_cache[val_str]
                     else:
+                        get_report().increment("translation_cache_misses")
+                        # Slow to import, only loaded once a translation is needed
+                        import translators as ts
+
                         # Retry logic for translation
                         max_retries = 3
                         for attempt in range(max_retries):
                             try:
                                 # Use translate_text from translators library
-                                new_value = ts.translate_text(
-                                    val_str,
-                                    from_language="id",
-                                    to_language="en",
-                                    translator="google",
-                                )
+                                with get_report().stage("translate"):
+                                    new_value = ts.translate_text(
+                                        val_str,
+                                        from_language="id",
+                                        to_language="en",
+                                        translator="google",
+                                    )
                                 self._translation_cache[val_str] = new_value
                                 break
                             except Exception as e:
                                 if attempt < max_retries - 1:
                                     wait_time = (attempt + 1) * 2  # 2s, 4s
-                                    print(
+                                    get_report().increment("translation_retries")
+                                    logging.warning(
                                         f"Translation failed for '{val_str}', retrying in {wait_time}s... ({e})"
                                     )
                                     time.sleep(wait_time)
                                 else:
-                                    print(
+                                    logging.error(
                                         f"Translation failed after {max_retries} attempts for '{val_str}': {e}"
                                     )
                                     new_value = val_str  # Fallback to original
@@ -991,103 +1339,225 @@ class IdxProfileUpdater:
         profile_dict["delisting_date"] = None
         return profile_dict
 
-    def update_company_profile_data(
-        self, update_new_symbols_only=True, target_symbols=None, limit=None
-    ):
-        """Update company profile data.
-
-        Args:
-            update_new_symbols_only (bool, optional): Whether to update only rows with new symbols or all rows. Defaults to True.
-            limit (int, optional): Limit the number of symbols to update.
-        """
+    def _fetch_profile_row(self, row):
+        """Pipeline fetch stage: returns (row, payload), None if the fetch failed"""
+        try:
+            with get_report().stage("retrieve_idx_profile"):
+                data = self._fetch_idx_profile(row["symbol"])
+        except Exception as e:
+            logging.error(f"Failed to update profile for {row['symbol']}: {e}")
+            get_report().increment("profile_fetch_failures")
+            self.failed_symbols.add(row["symbol"])
+            return None
+        return row, data
 
-        def update_profile_for_row(row):
-            temp_row = row.copy()
-            use_selenium = False
-            try:
-                profile_dict = self._retrieve_idx_profile(row["symbol"])
-                for key in profile_dict.keys():
-                    temp_row[key] = profile_dict[key]
-                print("new data", profile_dict)
-            except Exception as e:
-                print(f"Failed to update profile for {row['symbol']}: {e}")
-                return row  # Return original row if update fails
-            time.sleep(3)
-
-            # replace '-','0','' with None
-            replace_cols = [
-                "address",
-                "email",
-                "phone",
-                "fax",
-                "NPWP",
-                "website",
-                "register",
-            ]
-            temp_row[replace_cols] = temp_row[replace_cols].replace(
-                ["-", "0", ""], [None, None, None]
+    def _update_profile_row(self, fetched):
+        """Pipeline parse stage: parses (and translates) the payload into a copy of the row dict"""
+        row, data = fetched
+        temp_row = dict(row)
+        try:
+            with get_report().stage("parse_idx_profile"):
+                profile_dict = self._parse_idx_profile(row["symbol"], data)
+            temp_row.update(profile_dict)
+            log_event(
+                LOGGER, logging.DEBUG, "profile_parsed", symbol=row["symbol"], profile=profile_dict
             )
+        except Exception as e:
+            logging.error(f"Failed to update profile for {row['symbol']}: {e}")
+            get_report().increment("profile_fetch_failures")
+            self.failed_symbols.add(row["symbol"])
+            return None
 
-            temp_row["updated_on"] = pd.Timestamp.now(tz="GMT").strftime(
-                "%Y-%m-%d %H:%M:%S"
-            )
+        # replace '-','0','' with None
+        replace_cols = [
+            "address",
+            "email",
+            "phone",
+            "fax",
+            "NPWP",
+            "website",
+            "register",
+        ]
+        for col in replace_cols:
+            value = temp_row.get(col)
+            if isinstance(value, str) and value in ("-", "0", ""):
+                temp_row[col] = None
 
-            if (
-                not pd.isna(row["company_name"])
-                and temp_row["company_name"] != row["company_name"]
-            ):
-                print("isna")
-                print(f"Company name updated for {temp_row['symbol']}.")
-                print(f"Old name: {row['company_name']}")
-                temp_row["alias"] = row["alias"].append(row["company_name"])
+        temp_row["updated_on"] = pd.Timestamp.now(tz="GMT").strftime(
+            "%Y-%m-%d %H:%M:%S"
+        )
 
-            if pd.isna(row["company_name"]):
-                temp_row["alias"] = []
+        if (
+            not pd.isna(row["company_name"])
+            and temp_row["company_name"] != row["company_name"]
+        ):
+            logging.info(
+                f"Company name updated for {temp_row['symbol']}, old name: {row['company_name']}"
+            )
+            # A new list, the stored row keeps its aliases until the merge
+            aliases = row.get("alias")
+            aliases = list(aliases) if isinstance(aliases, list) else []
+            temp_row["alias"] = aliases + [row["company_name"]]
 
-            return temp_row
+        if pd.isna(row["company_name"]):
+            temp_row["alias"] = []
 
-        ### Management & Shareholders Cleaning
-        def clean_ownership(df, columns):
-            profile_df = df.copy()
-            merged_updated_df = pd.DataFrame()
+        return temp_row
 
-            for col_name in columns:
-                temp_df = self.ownershipcleaner.process_ownership_col(
-                    profile_df, col_name, self.supabase_client
+    def _clean_profile_batch(self, rows):
+        """Pipeline clean stage: cleans the ownership columns of a micro-batch of rows, None if the cleaning failed"""
+        batch = pd.DataFrame(rows)
+        long_frames = {} if self.ownership_tables is not None else None
+        try:
+            with get_report().stage("clean_ownership"):
+                cleaned_rows = self.ownershipcleaner.clean_ownership(
+                    batch,
+                    ownership_columns,
+                    self.supabase_client,
+                    workers=self.clean_workers,
+                    long_frames=long_frames,
                 )
-                if merged_updated_df.empty:
-                    merged_updated_df = temp_df.copy()
-                else:
-                    merged_updated_df = pd.merge(
-                        merged_updated_df, temp_df, on="symbol", how="outer"
+        except Exception as e:
+            logging.error(f"Failed to clean ownership columns: {e}")
+            # Map existing json columns to string for the uncleaned CSV if needed
+            # but we keep them as-is for the main saving logic
+            existing_cols = [c for c in ownership_columns if c in batch.columns]
+            if existing_cols:
+                # We save a copy with dumped strings for the uncleaned log
+                temp_rows = batch[["symbol"] + existing_cols].copy()
+                temp_rows[existing_cols] = temp_rows[existing_cols].map(
+                    lambda x: json.dumps(x) if isinstance(x, (list, dict)) else x
+                )
+                with self._uncleaned_lock:
+                    temp_rows.to_csv(
+                        "ownership_data_uncleaned.csv",
+                        index=False,
+                        mode="a" if self._uncleaned_saved else "w",
+                        header=not self._uncleaned_saved,
                     )
-            return merged_updated_df
+                    self._uncleaned_saved = True
+            # The raw ownership json must not reach the DB, the symbols keep their
+            # current data and are picked up again by the next run
+            get_report().increment("clean_batch_failures")
+            self.failed_symbols.update(batch["symbol"])
+            return None
+        else:
+            # Successfully cleaned
+            if long_frames is not None:
+                self.ownership_tables.add(long_frames, batch["symbol"])
+            batch.set_index("symbol", inplace=True)
+            cleaned_rows_indexed = cleaned_rows.set_index("symbol")
+            batch.update(cleaned_rows_indexed)
+            batch.reset_index(inplace=True)
+        return batch
+
+    def _upsert_profile_batch(self, batch):
+        """Pipeline upsert stage: writes a cleaned micro-batch right away when streaming is on
+
+        The batch is merged into current_data first and the merged rows are
+        upserted, so a field the batch left empty keeps its stored value, exactly
+        like the rows upserted at the end of the run.
+        """
+        if self.stream_upsert and self.supabase_client and not batch.empty:
+            # Single upsert thread, merging again at the end of the run is a no-op
+            self._merge_updated_rows(batch)
+            try:
+                self._upsert_rows(self.current_data.loc[batch["symbol"]].reset_index())
+            except Exception as e:
+                # upsert_to_db retries the rows at the end of the run
+                logging.error(f"Streaming upsert of {len(batch)} rows failed: {e}")
+                get_report().increment("db_stream_upsert_failures")
+            else:
+                self.upserted_symbols.update(batch["symbol"])
+        return batch
+
+    def _get_bypass_symbols(self) -> set:
+        """Symbols excluded from the name-change detection, read once per updater"""
+        if self._bypass_symbols is None:
+            with open("bypass-symbols.json") as bypass_file:
+                self._bypass_symbols = set(json.load(bypass_file).get("symbols", []))
+        return self._bypass_symbols
+
+    def _detect_company_name_changes(
+        self, company_profile_data, active_company, bypass_symbols=frozenset()
+    ) -> list:
+        """Finds the symbols whose stored name no longer matches the IDX securities list
+
+        A stored name counts as changed when fuzz.ratio between its first 30
+        characters and the IDX name (both lowercased) is 70 or less. Equal names
+        score 100, so only the rows whose names differ are scored.
+
+        Args:
+            company_profile_data (pd.DataFrame): symbol-indexed profile rows with company_name
+            active_company (dict): IDX securities as {symbol: name}
+            bypass_symbols (set, optional): symbols never reported. Defaults to none.
+
+        Returns:
+            list: symbols with a changed name, in the order of company_profile_data
+        """
+        from fuzzywuzzy import fuzz
+
+        with get_report().stage("detect_name_changes"):
+            names = company_profile_data["company_name"]
+            idx_names = names.index.to_series(index=names.index).map(active_company)
+            # Rows without a stored name or absent from the IDX list can't be compared
+            comparable = (
+                ~names.index.isin(bypass_symbols)
+                & names.map(lambda name: isinstance(name, str))
+                & idx_names.map(lambda name: isinstance(name, str))
+            )
+            stored = names[comparable].str[:30].str.lower()
+            current = idx_names[comparable].str.lower()
+
+            differ = stored != current
+            get_report().increment("name_change_fuzzy_scores", int(differ.sum()))
+            symbols = stored.index[differ].tolist()
+            scores = [
+                fuzz.ratio(stored_name, current_name)
+                for stored_name, current_name in zip(stored[differ], current[differ])
+            ]
+            return [symbol for symbol, score in zip(symbols, scores) if score <= 70]
+
+    def update_company_profile_data(
+        self,
+        update_new_symbols_only=True,
+        target_symbols=None,
+        limit=None,
+        batch_size=25,
+        fetch_workers=1,
+    ):
+        """Update company profile data.
+
+        Profiles go through a pipeline of fetch, parse/translate, cleaning (in
+        micro-batches of `batch_size` symbols) and, with stream_upsert, upsert
+        stages connected by bounded queues, so the stages overlap.
 
+        Args:
+            update_new_symbols_only (bool, optional): Whether to update only rows with new symbols or all rows. Defaults to True.
+            limit (int, optional): Limit the number of symbols to update.
+            batch_size (int, optional): Number of symbols cleaned and upserted together. Defaults to 25.
+            fetch_workers (int, optional): Number of threads fetching IDX profiles, the rate limiter still applies. Defaults to 1.
+        """
+
+        self._requester.set_concurrency(fetch_workers)
         retrieved_active_company = {}
         retrieved_active_symbols = []
         try:
             retrieved_active_company = self._retrieve_active_symbols()
             retrieved_active_symbols = [symbol for symbol in retrieved_active_company]
-            print(f"Retrieved {len(retrieved_active_symbols)} active symbols")
-
-            # SAFEGUARD: Prevent mass delisting if API fails or returns suspiciously low symbols
-            if len(retrieved_active_symbols) < 800:
-                raise Exception(
-                    f"Suspicously low number of active symbols retrieved ({len(retrieved_active_symbols)}). IDX might be blocking us or API changed. Aborting delisting check to prevent data corruption."
-                )
+            logging.info(f"Retrieved {len(retrieved_active_symbols)} active symbols")
+            # A snapshot with suspiciously few symbols raises instead of being used,
+            # which prevents a mass delisting when the API fails
 
         except Exception as e:
-            print(f"Error fetching active symbols: {e}")
+            logging.error(f"Error fetching active symbols: {e}")
             return
 
-        company_profile_data = self.current_data.copy()
-        # Ensure no duplicates at the start
-        company_profile_data = company_profile_data.drop_duplicates(
-            subset="symbol", keep="last"
-        )
-        table_active_symbols = company_profile_data.query("delisting_date.isnull()")[
-            "symbol"
-        ].unique()
+        # Symbol-indexed and updated in place, only the affected rows are touched
+        company_profile_data = self.current_data
+        table_active_symbols = company_profile_data.index[
+            company_profile_data["delisting_date"].isna()
+        ]
         new_ipo_symbols = self._retrieve_new_ipo_symbols(self.supabase_client)
 
         updated_inactive_symbols = list(
@@ -1098,143 +1568,312 @@ class IdxProfileUpdater:
             (set(new_ipo_symbols) | set(retrieved_active_symbols))
             - set(table_active_symbols)
         )
-
-        updated_inactive_filter = company_profile_data.query(
-            "symbol in @updated_inactive_symbols"
-        ).index
-        company_profile_data.loc[updated_inactive_filter, "delisting_date"] = (
-            pd.Timestamp.now().strftime("%Y-%m-%d")
-        )
+        # Delisted symbols can come back, they are updated rather than appended
+        missing_symbols = set(updated_new_symbols)
+        if target_symbols:
+            missing_symbols |= set(target_symbols)
+        missing_symbols -= set(company_profile_data.index)
+
+        if updated_inactive_symbols:
+            self._merge_updated_rows(
+                pd.DataFrame(
+                    {
+                        "symbol": updated_inactive_symbols,
+                        "delisting_date": pd.Timestamp.now().strftime("%Y-%m-%d"),
+                    }
+                )
+            )
         self.modified_symbols.update(updated_inactive_symbols)
 
-        company_profile_data = pd.concat(
-            [company_profile_data, pd.DataFrame({"symbol": updated_new_symbols})],
-            ignore_index=True,
-        )
-
-        if target_symbols:
-            missing_target_symbols = list(
-                set(target_symbols) - set(company_profile_data["symbol"])
+        if missing_symbols:
+            # Appending reallocates the table, done once for every new symbol
+            company_profile_data = pd.concat(
+                [
+                    company_profile_data,
+                    # Same dtypes, so the categoricals survive the concat
+                    pd.DataFrame(
+                        index=pd.Index(sorted(missing_symbols), name="symbol"),
+                        columns=company_profile_data.columns,
+                    ).astype(company_profile_data.dtypes.to_dict()),
+                ]
             )
-            if missing_target_symbols:
-                company_profile_data = pd.concat(
-                    [
-                        company_profile_data,
-                        pd.DataFrame({"symbol": missing_target_symbols}),
-                    ],
-                    ignore_index=True,
-                )
+            self.current_data = company_profile_data
+            self._appended_symbols.update(missing_symbols)
 
         if update_new_symbols_only:
             if not target_symbols:
                 target_symbols = updated_new_symbols
 
-            updated_company_name_symbols = []
-
-            with open("bypass-symbols.json") as bypass_file:
-                bypass_symbols = json.load(bypass_file).get("symbols", [])
-            for _, row in company_profile_data.iterrows():
-                if row["symbol"] in bypass_symbols:
-                    continue
-                try:
-                    similarity = fuzz.ratio(
-                        row["company_name"][0:30].lower(),
-                        retrieved_active_company[row["symbol"]].lower(),
-                    )
-                    if similarity <= 70:
-                        updated_company_name_symbols.append(row["symbol"])
-                except Exception as e:
-                    pass
-
-            print("Possible updated company name: ", updated_company_name_symbols)
-
-            updated_new_filter = company_profile_data.query(
-                "symbol in @updated_new_symbols and symbol in @target_symbols"
-            ).index
+            bypass_symbols = self._get_bypass_symbols()
+            updated_company_name_symbols = self._detect_company_name_changes(
+                company_profile_data, retrieved_active_company, bypass_symbols
+            )
 
-            updated_new_filter = updated_new_filter.union(
-                company_profile_data.query(
-                    "symbol in @updated_company_name_symbols and symbol in @target_symbols"
-                ).index
+            # IDX renamed these since the previous snapshot
+            renamed_symbols = (
+                set(self.securities_snapshot.diff["renamed"]) - bypass_symbols
+            )
+            updated_company_name_symbols = sorted(
+                set(updated_company_name_symbols) | renamed_symbols
             )
 
-            rows_to_update = company_profile_data.loc[updated_new_filter].copy()
+            logging.info(f"Possible updated company name: {updated_company_name_symbols}")
+
+            symbols_to_update = (
+                set(updated_new_symbols) | set(updated_company_name_symbols)
+            ) & set(target_symbols)
 
         else:
             if target_symbols:
-                active_filter = company_profile_data.query(
-                    "symbol in @target_symbols"
-                ).index
+                symbols_to_update = set(target_symbols)
             else:
-                active_filter = company_profile_data.query(
-                    "symbol in @retrieved_active_symbols"
-                ).index
-            rows_to_update = company_profile_data.loc[active_filter].copy()
+                symbols_to_update = set(retrieved_active_symbols)
+
+        # Keeps the table order, like the previous query-based filters
+        rows_to_update = company_profile_data[
+            company_profile_data.index.isin(symbols_to_update)
+        ].reset_index()
 
         if limit:
             rows_to_update = rows_to_update.head(limit)
 
         if rows_to_update.empty:
-            print("No rows to update.")
+            logging.info("No rows to update.")
+            # Newly delisted symbols still have to be written
+            self._publish_updates()
             return
 
         self.modified_symbols.update(rows_to_update["symbol"].tolist())
-        rows_to_update = rows_to_update.apply(update_profile_for_row, axis=1)
 
-        self._rows_to_update_temp = rows_to_update.copy()
+        from pipeline import Pipeline, Stage
+
+        # The next profiles are fetched while the previous ones are parsed,
+        # translated, cleaned and upserted
+        pipeline = Pipeline(
+            [
+                Stage("fetch", self._fetch_profile_row, workers=fetch_workers),
+                Stage("parse", self._update_profile_row),
+                # Several batches in flight keep every cleaning process busy
+                Stage(
+                    "clean",
+                    self._clean_profile_batch,
+                    workers=max(1, self.clean_workers),
+                    batch_size=batch_size,
+                    # Profiles arrive at the IDX rate limit, a partial batch is
+                    # only flushed after missing about two of them
+                    batch_timeout=max(2.0, 2 * IDX_PERIOD / IDX_CALLS),
+                ),
+                Stage("upsert", self._upsert_profile_batch),
+            ],
+            maxsize=2 * batch_size,
+        )
+        # Plain dicts, one per symbol, built lazily: no Series per row
+        columns = list(rows_to_update.columns)
+        rows = (
+            dict(zip(columns, values))
+            for values in rows_to_update.itertuples(index=False, name=None)
+        )
+        try:
+            batches = pipeline.run(rows)
+        finally:
+            self.ownershipcleaner.close()
+        if batches:
+            rows_to_update = pd.concat(batches, ignore_index=True)
+        else:
+            rows_to_update = rows_to_update.iloc[0:0]
+
+        # Symbols whose fetch or cleaning failed (e.g. circuit open during an IDX
+        # outage) keep their current data and are not marked as modified, so the
+        # next run picks them up again
+        if self.failed_symbols:
+            logging.warning(
+                f"Failed to update {len(self.failed_symbols)} profiles, left for the next run: {sorted(self.failed_symbols)}"
+            )
+            rows_to_update = rows_to_update[
+                ~rows_to_update["symbol"].isin(self.failed_symbols)
+            ]
+            self.modified_symbols -= self.failed_symbols
+
+        self._merge_updated_rows(rows_to_update)
+        self._publish_updates()
 
-        columns_to_clean = [
-            "shareholders",
-            "directors",
-            "commissioners",
-            "audit_committees",
-            "subsidiaries",
-        ]
+    def update_ownership_outputs(self):
+        """Writes the optional ownership outputs of the modified companies, run after upsert_to_db
 
-        # Columns to drop for DB upsert if cleaning fails (only those that are uncleaned)
-        # but we KEEP subsidiaries for the CSV output
-        cols_to_drop_for_db = [
-            c
-            for c in columns_to_clean
-            if c in rows_to_update.columns and c != "subsidiaries"
+        Each output is independent: an error is logged and counted in the run
+        report as <output>_failures, the other outputs are still written and the
+        profiles are already upserted.
+        """
+        outputs = [
+            ("ownership_tables", self.ownership_tables_dir, self._write_ownership_tables),
+            ("ownership_graph", self.ownership_graph_path, self._update_ownership_graph),
+            ("person_index", self.person_index_path, self._update_person_index),
+            ("ownership_history", self.ownership_history_path, self._record_ownership_history),
         ]
+        for name, enabled, write in outputs:
+            if not enabled:
+                continue
+            try:
+                write()
+            except Exception as e:
+                logging.error(f"Failed to update the {name}: {e}")
+                get_report().increment(f"{name}_failures")
 
-        try:
-            cleaned_rows = clean_ownership(rows_to_update, columns_to_clean)
-        except Exception as e:
-            print(f"Failed to clean ownership columns: {e}")
-            # Map existing json columns to string for the uncleaned CSV if needed
-            # but we keep them as-is for the main saving logic
-            existing_cols = [c for c in columns_to_clean if c in rows_to_update.columns]
-            if existing_cols:
-                # We save a copy with dumped strings for the uncleaned log
-                temp_rows = rows_to_update[["symbol"] + existing_cols].copy()
-                temp_rows[existing_cols] = temp_rows[existing_cols].map(
-                    lambda x: json.dumps(x) if isinstance(x, (list, dict)) else x
+    def _write_ownership_tables(self):
+        """Writes the normalized ownership of the modified companies as Parquet"""
+        paths = self.ownership_tables.write_parquet(
+            self.ownership_tables_dir, self.modified_symbols
+        )
+        logging.info(f"Ownership tables written to {paths}")
+
+    def _update_ownership_graph(self):
+        """Updates the persisted cross-holding graph with the links of the modified companies"""
+        from ownership_graph import (
+            OwnershipGraph,
+            edges_from_profiles,
+            load_graph,
+            save_graph,
+        )
+
+        with get_report().stage("ownership_graph"):
+            graph = load_graph(self.ownership_graph_path)
+            if graph is None:
+                # First run: every company of the table, cleaned before or now
+                graph = OwnershipGraph(
+                    edges_from_profiles(self.current_data.reset_index())
                 )
-                temp_rows.to_csv("ownership_data_uncleaned.csv", index=False)
-        else:
-            # Successfully cleaned
-            rows_to_update.set_index("symbol", inplace=True)
-            cleaned_rows_indexed = cleaned_rows.set_index("symbol")
-            rows_to_update.update(cleaned_rows_indexed)
-            rows_to_update.reset_index(inplace=True)
+            else:
+                symbols = self.current_data.index.intersection(
+                    list(self.modified_symbols)
+                )
+                graph.update(
+                    self.current_data.loc[symbols].reset_index(), symbols=symbols
+                )
+            save_graph(graph, self.ownership_graph_path)
+        self.ownership_graph = graph
+        logging.info(f"Ownership graph updated: {graph.stats()}")
+
+    def _update_person_index(self):
+        """Updates the persisted person index with the roles of the modified companies"""
+        from person_index import PersonIndex, load_index, roles_from_profiles, save_index
+
+        with get_report().stage("person_index"):
+            index = load_index(self.person_index_path)
+            if index is None:
+                # First run: every company of the table, cleaned before or now
+                index = PersonIndex(roles_from_profiles(self.current_data.reset_index()))
+            else:
+                symbols = self.current_data.index.intersection(
+                    list(self.modified_symbols)
+                )
+                index.update(
+                    self.current_data.loc[symbols].reset_index(), symbols=symbols
+                )
+            save_index(index, self.person_index_path)
+        self.person_index = index
+        logging.info(f"Person index updated: {index.stats()}")
 
-        # Update company_profile_data safely
-        company_profile_data = company_profile_data.set_index("symbol")
-        rows_to_update_indexed = rows_to_update.set_index("symbol")
-        # Ensure object columns are handled correctly to avoid float64 warnings
-        # and make sure new columns like 'subsidiaries' are added if not present
-        for col in rows_to_update_indexed.columns:
-            if col not in company_profile_data.columns:
-                company_profile_data[col] = None
-            company_profile_data[col] = company_profile_data[col].astype(object)
+    def _record_ownership_history(self):
+        """Appends the ownership columns of the modified companies that changed since their last version"""
+        from ownership_history import OwnershipHistory
 
-        company_profile_data.update(rows_to_update_indexed)
-        company_profile_data = company_profile_data.reset_index()
+        symbols = self.current_data.index.intersection(list(self.modified_symbols))
+        profiles = (
+            self.current_data.loc[symbols, ownership_columns]
+            .reset_index()
+            .to_dict("records")
+        )
+        with get_report().stage("ownership_history"):
+            written = OwnershipHistory(self.ownership_history_path).record(profiles)
+        logging.info(
+            f"Ownership history: {written} new versions for {len(profiles)} companies"
+        )
+
+    def _ensure_object_columns(self, columns):
+        """Adds missing columns and casts the others to object once, so lists and strings can be stored"""
+        for col in columns:
+            if col not in self.current_data.columns:
+                self.current_data[col] = None
+            if self.current_data[col].dtype != object:
+                self.current_data[col] = self.current_data[col].astype(object)
+
+    def _prepare_columns(self, updated):
+        """Makes the current_data columns able to hold the updated values, keeping compact dtypes where possible
 
-        self.new_data = company_profile_data
-        self.updated_rows = self.new_data.query("symbol in @self.modified_symbols")
+        New values become new categories of categorical columns. Other typed
+        columns keep their dtype when the values fit it and fall back to object otherwise.
+
+        Args:
+            updated (pd.DataFrame): symbol-indexed updated rows
+        """
+        for col in updated.columns:
+            if col not in self.current_data.columns:
+                self.current_data[col] = None
+            dtype = self.current_data[col].dtype
+            if dtype == object:
+                continue
+            values = updated[col].dropna()
+            if isinstance(dtype, pd.CategoricalDtype):
+                try:
+                    new_categories = pd.Index(values.unique()).difference(
+                        dtype.categories
+                    )
+                    if len(new_categories):
+                        self.current_data[col] = self.current_data[
+                            col
+                        ].cat.add_categories(new_categories)
+                    continue
+                except TypeError:
+                    pass
+            else:
+                try:
+                    values.astype(dtype)
+                    continue
+                except (TypeError, ValueError):
+                    pass
+            self._ensure_object_columns([col])
+
+    def _merge_updated_rows(self, rows_to_update):
+        """Merges the updated rows into current_data in place, like DataFrame.update on the affected rows only
+
+        Non-null values of rows_to_update overwrite the stored ones, nulls keep
+        the stored value. Only the updated rows and columns are read and written.
+
+        Args:
+            rows_to_update (pd.DataFrame): updated rows with a symbol column, whose symbols are in current_data
+        """
+        if rows_to_update.empty:
+            return
+        updated = rows_to_update.set_index("symbol")
+        first_merged = updated.index.difference(
+            list(self._original_symbols | self._appended_symbols)
+        ).unique()
+        if len(first_merged):
+            self._original_rows.append(self.current_data.loc[first_merged].copy())
+            self._original_symbols.update(first_merged)
+        self._prepare_columns(updated)
+
+        affected = self.current_data.loc[updated.index, updated.columns]
+        affected = affected.mask(updated.notna(), updated)
+        for col in affected.columns:
+            self.current_data.loc[affected.index, col] = affected[col]
+
+    def _pre_update_data(self):
+        """current_data as it was loaded: merged rows restored, appended symbols left out"""
+        data = self.current_data.drop(index=list(self._appended_symbols))
+        if self._original_rows:
+            original = pd.concat(self._original_rows)
+            for col in original.columns:
+                # Categories only grow during the run, the stored values still fit
+                data.loc[original.index, col] = original[col].astype(data[col].dtype)
+        return data
+
+    def _publish_updates(self):
+        """Exposes the merged table and the modified rows to save_update_to_csv and upsert_to_db"""
+        self.new_data = self.current_data
+        self.updated_rows = self.current_data[
+            self.current_data.index.isin(self.modified_symbols)
+        ].reset_index()
 
     def save_update_to_csv(self, updated_rows_only=True):
         """Generate CSV file containing updated data.
@@ -1259,14 +1898,14 @@ class IdxProfileUpdater:
 
         if updated_rows_only:
             if self.updated_rows is None:
-                print("No rows are updated. Your data is already up to date.")
+                logging.info("No rows are updated. Your data is already up to date.")
                 return
             else:
                 df = self.updated_rows.copy()
                 filename = f"idx_company_profile_updated_rows_{date_now}.csv"
 
         else:
-            df = self.new_data.copy()
+            df = self.new_data.reset_index()
             filename = f"idx_company_profile_all_rows_{date_now}.csv"
 
         # Apply JSON dump to all list/dict columns, ignoring nulls
@@ -1278,6 +1917,29 @@ class IdxProfileUpdater:
 
         df.to_csv(filename, index=False)
 
+    def _upsert_rows(self, df):
+        """Upserts profile rows to the idx_company_profile table"""
+        df = df.copy()
+        logging.info(
+            f"Upserting {df['symbol'].values} rows to idx_company_profile table."
+        )
+        df[["yf_currency", "wsj_format", "current_source"]] = (
+            df[["yf_currency", "wsj_format", "current_source"]]
+            .fillna(-1)
+            .infer_objects(copy=False)
+        )
+        df["nologo"] = df["nologo"].fillna(True).infer_objects(copy=False)
+        records = convert_df_to_records(
+            df,
+            int_cols=["sub_sector_id", "yf_currency", "wsj_format", "current_source"],
+        )
+
+        with get_report().stage("db_upsert"):
+            self.supabase_client.table("idx_company_profile").upsert(
+                records, returning="minimal", on_conflict="symbol"
+            ).execute()
+        get_report().increment("db_rows_upserted", len(records))
+
     def upsert_to_db(self, save_current_data=True, supabase_client=None):
         """Upsert updated data to idx_company_profile table in Supabase DB."""
         if not self.supabase_client:
@@ -1287,105 +1949,61 @@ class IdxProfileUpdater:
             raise Exception("Can only upsert to DB if Supabase client is provided.")
 
         if self.new_data is None:
-            print(
+            logging.warning(
                 "No updated data available. Please run update_company_profile_data() first if you haven't."
             )
             return
 
-        def cast_int(num):
-            if pd.notna(num):
-                return round(num)
-            else:
-                return None
-
-        def convert_df_to_records(df, int_cols=[]):
-            temp_df = df.copy()
-            for cols in temp_df.columns:
-                if temp_df[cols].dtype == "datetime64[ns]":
-                    temp_df[cols] = temp_df[cols].astype(str)
-            temp_df = temp_df.replace({np.nan: None})
-            records = temp_df.to_dict("records")
-
-            for record in records:
-                for k, v in record.items():
-                    if k in int_cols:
-                        record[k] = cast_int(v)
-
-                    if "shareholders" in record and record["shareholders"] is not None:
-                        final_shareholders = []
-                        for shareholder in record["shareholders"]:
-                            if "ticker" in shareholder:
-                                shareholder["symbol"] = shareholder.pop("ticker")
-
-                            if (
-                                "symbol" in shareholder
-                                and shareholder.get("symbol") is None
-                            ):
-                                del shareholder["symbol"]
-
-                            if (
-                                "share_percentage" in shareholder
-                                and shareholder["share_percentage"] is not None
-                            ):
-                                share_percentage = shareholder.get("share_percentage")
-                                if share_percentage is not None:
-                                    share_percentage_str = str(share_percentage)
-                                    if (
-                                        "e" in share_percentage_str
-                                        or "E" in share_percentage_str
-                                    ):
-                                        shareholder["share_percentage"] = (
-                                            f"{share_percentage:.8f}".rstrip("0")
-                                        )
-
-                            final_shareholders.append(shareholder)
-
-                record["shareholders"] = final_shareholders
-            return records
-
         df = self.updated_rows.copy()
+        if self.upserted_symbols:
+            df = df[~df["symbol"].isin(self.upserted_symbols)]
+            logging.info(
+                f"{len(self.upserted_symbols)} rows were upserted while updating, {len(df)} rows left"
+            )
 
-        # Print specifically symbol, delisting_date, and subsidiaries for verification
-        print("\n" + "=" * 80)
-        print("PREVIEW: DATA TO BE UPSERTED TO SUPABASE")
-        print("=" * 80)
-        for _, row in df.iterrows():
-            print(f"SYMBOL: {row.get('symbol')}")
-            print(f"DELISTING DATE: {row.get('delisting_date')}")
-            subs = row.get("subsidiaries")
-            print("SUBSIDIARIES:")
-            if isinstance(subs, (list, dict)):
-                print(json.dumps(subs, indent=2))
-            else:
-                print(subs)
-            print("-" * 40)
-        print("=" * 80 + "\n")
-        logging.info(
-            f"Upserting {df['symbol'].values} rows to idx_company_profile table."
-        )
-        df[["yf_currency", "wsj_format", "current_source"]] = (
-            df[["yf_currency", "wsj_format", "current_source"]]
-            .fillna(-1)
-            .infer_objects(copy=False)
-        )
-        df["nologo"] = df["nologo"].fillna(True).infer_objects(copy=False)
-        records = convert_df_to_records(
-            df,
-            int_cols=["sub_sector_id", "yf_currency", "wsj_format", "current_source"],
-        )
-        # print(f"Check records: {records}")
+        if not df.empty:
+            # Symbol, delisting_date and subsidiaries for verification, with IDX_LOG_LEVEL=DEBUG
+            if LOGGER.isEnabledFor(logging.DEBUG):
+                for symbol, delisting_date, subsidiaries in zip(
+                    df["symbol"], df["delisting_date"], df["subsidiaries"]
+                ):
+                    log_event(
+                        LOGGER,
+                        logging.DEBUG,
+                        "upsert_preview",
+                        symbol=symbol,
+                        delisting_date=delisting_date,
+                        subsidiaries=subsidiaries,
+                    )
+            self._upsert_rows(df)
 
-        self.supabase_client.table("idx_company_profile").upsert(
-            records, returning="minimal", on_conflict="symbol"
-        ).execute()
+        if self.ownership_tables_db:
+            try:
+                self.ownership_tables.upsert_to_db(
+                    self.supabase_client, self.modified_symbols
+                )
+            except Exception as e:
+                # The profiles are written, the tables are replaced again by the next run
+                logging.error(f"Upsert of the ownership tables failed: {e}")
+                get_report().increment("db_ownership_tables_failures")
 
         if save_current_data:
-            self.current_data.to_csv("idx_company_profile_current.csv", index=False)
+            # The table as it was before this run, like the updater always saved it
+            self._pre_update_data().reset_index().to_csv(
+                "idx_company_profile_current.csv", index=False
+            )
 
 
 if __name__ == "__main__":
+    # Only the default paths of the optional outputs, their modules are imported when used
+    from ownership_graph import DEFAULT_GRAPH_PATH
+    from ownership_history import DEFAULT_HISTORY_PATH
+    from ownership_tables import DEFAULT_TABLES_DIR
+    from person_index import DEFAULT_INDEX_PATH
+
     LOG_FILENAME = "scrapper.log"
     initiate_logging(LOG_FILENAME)
+    report = start_report("profile_updater")
 
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -1408,7 +2026,111 @@ if __name__ == "__main__":
         default=None,
         help="Target specific symbols (comma-separated).",
     )
+    parser.add_argument(
+        "--hedge",
+        dest="hedge",
+        action="store_true",
+        help="Send a duplicate IDX request through another proxy when a request runs past the rolling p95 latency.",
+    )
+    parser.add_argument(
+        "--report",
+        dest="report",
+        type=str,
+        default="run_report.json",
+        help="Path of the JSON run report (stage timings, request counts, cache hit rates).",
+    )
+    parser.add_argument(
+        "--prometheus",
+        dest="prometheus",
+        type=str,
+        default=None,
+        help="Also write the run report as a Prometheus textfile to this path.",
+    )
+    parser.add_argument(
+        "--batch-size",
+        dest="batch_size",
+        type=int,
+        default=25,
+        help="Number of symbols cleaned and upserted together.",
+    )
+    parser.add_argument(
+        "--fetch-workers",
+        dest="fetch_workers",
+        type=int,
+        default=1,
+        help="Number of threads fetching IDX profiles, the rate limit is shared by all of them.",
+    )
+    parser.add_argument(
+        "--clean-workers",
+        dest="clean_workers",
+        type=int,
+        default=1,
+        help="Number of processes cleaning the ownership columns, symbols are partitioned across them.",
+    )
+    parser.add_argument(
+        "--refresh-snapshot",
+        dest="refresh_snapshot",
+        action="store_true",
+        help="Download the active securities even if today's snapshot (data/securities_snapshot.json) is still fresh.",
+    )
+    parser.add_argument(
+        "--ownership-tables",
+        dest="ownership_tables_dir",
+        nargs="?",
+        const=DEFAULT_TABLES_DIR,
+        default=None,
+        help="Also write the cleaned ownership as normalized Parquet tables partitioned by table and date to this directory (default: data/ownership).",
+    )
+    parser.add_argument(
+        "--ownership-db",
+        dest="ownership_tables_db",
+        action="store_true",
+        help="Also replace the cleaned companies' rows in the normalized ownership tables of the DB (see ownership_tables.sql).",
+    )
+    parser.add_argument(
+        "--ownership-graph",
+        dest="ownership_graph_path",
+        nargs="?",
+        const=DEFAULT_GRAPH_PATH,
+        default=None,
+        help="Update the cross-holding graph of the listed companies at this path (default: data/ownership_graph.npz), query it with ownership_graph.py.",
+    )
+    parser.add_argument(
+        "--person-index",
+        dest="person_index_path",
+        nargs="?",
+        const=DEFAULT_INDEX_PATH,
+        default=None,
+        help="Update the index of directors, commissioners and shareholders across companies at this path (default: data/person_index.json), query it with person_index.py.",
+    )
+    parser.add_argument(
+        "--ownership-history",
+        dest="ownership_history_path",
+        nargs="?",
+        const=DEFAULT_HISTORY_PATH,
+        default=None,
+        help="Append the ownership changes of the modified companies to the history at this path (default: data/ownership_history.db), query it with ownership_history.py.",
+    )
+    parser.add_argument(
+        "--stream-upsert",
+        dest="stream_upsert",
+        action="store_true",
+        help="Upsert each cleaned batch right away instead of everything at the end of the run, so an interrupted run keeps its progress.",
+    )
+    parser.add_argument(
+        "--profile",
+        dest="profile",
+        nargs="?",
+        const="profiles",
+        default=None,
+        help="Profile every stage (cProfile + tracemalloc) and write the profiles to a run directory in this directory (default: profiles).",
+    )
     args = parser.parse_args()
+    if args.profile:
+        report.enable_profiling(args.profile)
+
+    from dotenv import load_dotenv
+    from supabase import create_client
 
     load_dotenv()
     url, key = os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY")
@@ -1419,6 +2141,15 @@ if __name__ == "__main__":
         # company_profile_csv_path="company_profile.csv",
         supabase_client=supabase_client,
         proxy=proxy,
+        hedge=args.hedge,
+        stream_upsert=args.stream_upsert,
+        clean_workers=args.clean_workers,
+        refresh_snapshot=args.refresh_snapshot,
+        ownership_tables_dir=args.ownership_tables_dir,
+        ownership_tables_db=args.ownership_tables_db,
+        ownership_graph_path=args.ownership_graph_path,
+        person_index_path=args.person_index_path,
+        ownership_history_path=args.ownership_history_path,
     )
     target_symbols = None
     if args.symbols:
@@ -1426,20 +2157,42 @@ if __name__ == "__main__":
 
     if args.all_symbols:
         logging.info("Starting idx_profile_updater with all symbols")
-        updater.update_company_profile_data(
-            update_new_symbols_only=False,
-            limit=args.limit,
-            target_symbols=target_symbols,
-        )
+        with report.stage("update_company_profile_data"):
+            updater.update_company_profile_data(
+                update_new_symbols_only=False,
+                limit=args.limit,
+                target_symbols=target_symbols,
+                batch_size=args.batch_size,
+                fetch_workers=args.fetch_workers,
+            )
     else:
         logging.info(
             "Starting idx_profile_updater with new symbols and deactivated symbols"
         )
-        updater.update_company_profile_data(
-            update_new_symbols_only=True,
-            limit=args.limit,
-            target_symbols=target_symbols,
-        )
+        with report.stage("update_company_profile_data"):
+            updater.update_company_profile_data(
+                update_new_symbols_only=True,
+                limit=args.limit,
+                target_symbols=target_symbols,
+                batch_size=args.batch_size,
+                fetch_workers=args.fetch_workers,
+            )
 
-    updater.upsert_to_db()
+    with report.stage("upsert_to_db"):
+        updater.upsert_to_db()
+    # Only once the profiles are written, a failing output can't hold them back
+    updater.update_ownership_outputs()
+
+    for endpoint_metrics in updater._requester.pool.metrics():
+        report.set_gauges(endpoint_metrics, prefix=f"{endpoint_metrics['endpoint']}_")
+    report.set_gauges(updater._requester.hedge_stats)
+    report.set_gauge("modified_symbols", len(updater.modified_symbols))
+    report.write_json(args.report)
+    if args.prometheus:
+        report.write_prometheus(args.prometheus)
+    logging.info(f"IDX proxy pool: {updater._requester.pool.metrics()}")
+    if args.hedge:
+        logging.info(f"IDX hedging: {updater._requester.hedge_stats}")
+    if report.profiler:
+        logging.info(f"Profiles written to {report.profiler.write()}")
     logging.info("idx_profile_updater finished")
@@ -0,0 +1,346 @@
+"""Cross-holding graph of the listed companies.
+
+OwnershipCleaner resolves shareholders and subsidiaries to tickers. Those links
+become edges owner -> owned weighted by the owned fraction:
+
+- a shareholder of company C with a ticker T is the edge T -> C (share_percentage),
+- a subsidiary of company C with a ticker T is the edge C -> T (percentage / 100).
+
+The edges are kept as two CSR adjacency indexes (holdings by owner, owners by
+owned company) so traversals only touch numpy slices. Groups and cycles are
+computed once per build.
+
+    python ownership_graph.py BBCA.JK
+    python ownership_graph.py --cycles
+"""
+
+import argparse
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+
+DEFAULT_GRAPH_PATH = os.getenv(
+    "IDX_OWNERSHIP_GRAPH_PATH", os.path.join(os.getcwd(), "data", "ownership_graph.npz")
+)
+# Holdings below this fraction don't tie two companies into one group
+GROUP_MIN_SHARE = 0.2
+# Chains whose effective share falls below this fraction are not followed further
+ULTIMATE_MIN_SHARE = 0.01
+
+EDGE_COLUMNS = ["source", "owner", "owned", "share"]
+
+
+def _entries(value) -> list:
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return []
+    return value if isinstance(value, list) else []
+
+
+def _fraction(value, scale=1.0):
+    try:
+        share = float(value) / scale
+    except (TypeError, ValueError):
+        return None
+    return share if 0 < share <= 1 else None
+
+
+def edges_from_profiles(profiles: pd.DataFrame) -> pd.DataFrame:
+    """Extracts the ticker links of the cleaned shareholders and subsidiaries columns.
+
+    Args:
+        profiles (pd.DataFrame): symbol, shareholders and subsidiaries columns of idx_company_profile (lists or json strings)
+
+    Returns:
+        pd.DataFrame: source (company whose profile holds the link), owner, owned and share (fraction) columns
+    """
+    edges = []
+    for symbol, shareholders, subsidiaries in zip(
+        profiles["symbol"],
+        profiles.get("shareholders", pd.Series(None, index=profiles.index)),
+        profiles.get("subsidiaries", pd.Series(None, index=profiles.index)),
+    ):
+        for holder in _entries(shareholders):
+            ticker = isinstance(holder, dict) and holder.get("symbol")
+            share = _fraction(holder.get("share_percentage")) if ticker else None
+            if ticker and ticker != symbol and share:
+                edges.append((symbol, ticker, symbol, share))
+        for subsidiary in _entries(subsidiaries):
+            ticker = isinstance(subsidiary, dict) and subsidiary.get("symbol")
+            share = _fraction(subsidiary.get("percentage"), 100) if ticker else None
+            if ticker and ticker != symbol and share:
+                edges.append((symbol, symbol, ticker, share))
+    return pd.DataFrame(edges, columns=EDGE_COLUMNS)
+
+
+def _csr(rows: np.ndarray, cols: np.ndarray, weights: np.ndarray, n_nodes: int):
+    order = np.lexsort((cols, rows))
+    indptr = np.zeros(n_nodes + 1, dtype=np.int32)
+    np.cumsum(np.bincount(rows, minlength=n_nodes), out=indptr[1:])
+    return indptr, cols[order].astype(np.int32), weights[order]
+
+
+class OwnershipGraph:
+    def __init__(self, edges: pd.DataFrame = None, group_min_share=GROUP_MIN_SHARE):
+        """Ownership edges between listed companies, indexed for traversal.
+
+        Args:
+            edges (pd.DataFrame, optional): edges_from_profiles output. Defaults to None (empty graph).
+            group_min_share (float, optional): minimum holding linking two companies into a group. Defaults to 0.2.
+        """
+        self.edges = (
+            edges if edges is not None else pd.DataFrame(columns=EDGE_COLUMNS)
+        ).reset_index(drop=True)
+        self.group_min_share = group_min_share
+        self._build()
+
+    def _build(self):
+        # A link listed by both companies (shareholder of one, subsidiary of the other) is one edge
+        links = (
+            self.edges.groupby(["owner", "owned"], sort=False)["share"]
+            .max()
+            .reset_index()
+        )
+        self.nodes = sorted(set(links["owner"]) | set(links["owned"]))
+        self.index = {symbol: i for i, symbol in enumerate(self.nodes)}
+        n_nodes = len(self.nodes)
+        owners = links["owner"].map(self.index).to_numpy(dtype=np.int32)
+        owned = links["owned"].map(self.index).to_numpy(dtype=np.int32)
+        shares = links["share"].to_numpy(dtype=np.float64)
+
+        self._holdings = _csr(owners, owned, shares, n_nodes)
+        self._owners = _csr(owned, owners, shares, n_nodes)
+        self._group_labels = self._label_groups(owners, owned, shares, n_nodes)
+        self._cycles = self._find_cycles(n_nodes)
+
+    def _label_groups(self, owners, owned, shares, n_nodes) -> np.ndarray:
+        parent = np.arange(n_nodes)
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        strong = shares >= self.group_min_share
+        for a, b in zip(owners[strong], owned[strong]):
+            root_a, root_b = find(a), find(b)
+            if root_a != root_b:
+                parent[max(root_a, root_b)] = min(root_a, root_b)
+        return np.array([find(i) for i in range(n_nodes)], dtype=np.int32)
+
+    def _find_cycles(self, n_nodes) -> list:
+        """Strongly connected components of more than one company (iterative Tarjan)"""
+        indptr, indices, _ = self._holdings
+        order = np.full(n_nodes, -1, dtype=np.int32)
+        low = np.zeros(n_nodes, dtype=np.int32)
+        on_stack = np.zeros(n_nodes, dtype=bool)
+        stack, cycles, counter = [], [], 0
+
+        for root in range(n_nodes):
+            if order[root] != -1:
+                continue
+            work = [(root, indptr[root])]
+            order[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = True
+            while work:
+                node, edge = work[-1]
+                if edge < indptr[node + 1]:
+                    work[-1] = (node, edge + 1)
+                    child = indices[edge]
+                    if order[child] == -1:
+                        order[child] = low[child] = counter
+                        counter += 1
+                        stack.append(child)
+                        on_stack[child] = True
+                        work.append((child, indptr[child]))
+                    elif on_stack[child]:
+                        low[node] = min(low[node], order[child])
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == order[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        component.append(self.nodes[member])
+                        if member == node:
+                            break
+                    if len(component) > 1:
+                        cycles.append(sorted(component))
+        return sorted(cycles)
+
+    def update(self, profiles: pd.DataFrame, symbols=None):
+        """Replaces the edges listed by the given companies, then rebuilds the whole graph
+
+        Only the edge list is updated per company. The CSR indexes, groups and
+        cycles are rebuilt from every edge, like a new OwnershipGraph: a few
+        thousand edges take milliseconds, far less than keeping union-find and
+        Tarjan state consistent under edge removals.
+
+        Args:
+            profiles (pd.DataFrame): current profiles of the changed companies, see edges_from_profiles
+            symbols (iterable, optional): changed companies, their edges are dropped even when
+                they have none left. Defaults to None (the symbols of `profiles`).
+        """
+        symbols = set(profiles["symbol"] if symbols is None else symbols)
+        kept = self.edges[~self.edges["source"].isin(symbols)]
+        changed = edges_from_profiles(profiles[profiles["symbol"].isin(symbols)])
+        self.edges = pd.concat(
+            [frame for frame in (kept, changed) if not frame.empty]
+            or [pd.DataFrame(columns=EDGE_COLUMNS)],
+            ignore_index=True,
+        )
+        self._build()
+
+    def _neighbours(self, csr, symbol) -> dict:
+        i = self.index.get(symbol)
+        if i is None:
+            return {}
+        indptr, indices, weights = csr
+        start, end = indptr[i], indptr[i + 1]
+        return {
+            self.nodes[j]: float(share)
+            for j, share in zip(indices[start:end], weights[start:end])
+        }
+
+    def holdings(self, symbol) -> dict:
+        """Listed companies held directly by `symbol`, as {symbol: fraction}"""
+        return self._neighbours(self._holdings, symbol)
+
+    def owners(self, symbol) -> dict:
+        """Listed companies holding `symbol` directly, as {symbol: fraction}"""
+        return self._neighbours(self._owners, symbol)
+
+    def ultimate_owners(self, symbol, min_share=ULTIMATE_MIN_SHARE) -> dict:
+        """Listed companies at the top of the ownership chains of `symbol`.
+
+        Effective shares multiply along a chain and add up over several chains
+        ending at the same owner. A chain stops at a company without listed
+        owners, before closing a cycle or when its share falls below `min_share`.
+
+        Args:
+            symbol (str): company symbol with .JK suffix
+            min_share (float, optional): smallest effective share followed. Defaults to 0.01.
+
+        Returns:
+            dict: {symbol: effective fraction}, largest first
+        """
+        start = self.index.get(symbol)
+        if start is None:
+            return {}
+        indptr, indices, weights = self._owners
+        totals = {}
+        work = [(start, 1.0, frozenset([start]))]
+        while work:
+            node, share, path = work.pop()
+            followed = False
+            for edge in range(indptr[node], indptr[node + 1]):
+                owner, effective = indices[edge], share * weights[edge]
+                if owner in path or effective < min_share:
+                    continue
+                followed = True
+                work.append((owner, effective, path | {owner}))
+            if not followed and node != start:
+                totals[node] = totals.get(node, 0.0) + share
+        return {
+            self.nodes[node]: round(float(share), 8)
+            for node, share in sorted(totals.items(), key=lambda item: -item[1])
+        }
+
+    def group(self, symbol) -> list:
+        """Companies tied to `symbol` by holdings of at least group_min_share, itself included"""
+        i = self.index.get(symbol)
+        if i is None:
+            return [symbol]
+        members = np.flatnonzero(self._group_labels == self._group_labels[i])
+        return [self.nodes[j] for j in members]
+
+    def groups(self) -> list:
+        """Every group of more than one company, largest first"""
+        labels, counts = np.unique(self._group_labels, return_counts=True)
+        groups = [
+            [self.nodes[j] for j in np.flatnonzero(self._group_labels == label)]
+            for label, count in zip(labels, counts)
+            if count > 1
+        ]
+        return sorted(groups, key=lambda group: (-len(group), group))
+
+    def cycles(self) -> list:
+        """Cross-holding cycles, as sorted lists of the companies holding each other"""
+        return [list(cycle) for cycle in self._cycles]
+
+    def stats(self) -> dict:
+        return {
+            "companies": len(self.nodes),
+            "edges": int(len(self._holdings[1])),
+            "groups": len(self.groups()),
+            "cycles": len(self._cycles),
+        }
+
+
+def save_graph(graph: OwnershipGraph, path=DEFAULT_GRAPH_PATH):
+    """Writes the edges atomically, the indexes are rebuilt when loading"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as temp_file:
+            np.savez_compressed(
+                temp_file,
+                source=graph.edges["source"].to_numpy(dtype=str),
+                owner=graph.edges["owner"].to_numpy(dtype=str),
+                owned=graph.edges["owned"].to_numpy(dtype=str),
+                share=graph.edges["share"].to_numpy(dtype=np.float64),
+            )
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def load_graph(path=DEFAULT_GRAPH_PATH):
+    """Returns the persisted graph, or None when there is none or it can't be read"""
+    try:
+        with np.load(path) as data:
+            edges = pd.DataFrame({column: data[column] for column in EDGE_COLUMNS})
+    except (OSError, ValueError, KeyError):
+        return None
+    return OwnershipGraph(edges)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the ownership graph written by main.py --ownership-graph.")
+    parser.add_argument("symbols", nargs="*", help="Companies to describe (with .JK suffix).")
+    parser.add_argument("--path", default=DEFAULT_GRAPH_PATH, help="Graph file (default: data/ownership_graph.npz).")
+    parser.add_argument("--groups", action="store_true", help="List the groups of more than one company.")
+    parser.add_argument("--cycles", action="store_true", help="List the cross-holding cycles.")
+    args = parser.parse_args()
+
+    graph = load_graph(args.path)
+    if graph is None:
+        raise SystemExit(f"No ownership graph at {args.path}")
+    output = {"stats": graph.stats()}
+    for symbol in args.symbols:
+        output[symbol] = {
+            "owners": graph.owners(symbol),
+            "holdings": graph.holdings(symbol),
+            "ultimate_owners": graph.ultimate_owners(symbol),
+            "group": graph.group(symbol),
+        }
+    if args.groups:
+        output["groups"] = graph.groups()
+    if args.cycles:
+        output["cycles"] = graph.cycles()
+    print(json.dumps(output, indent=2))
@@ -0,0 +1,346 @@
+import argparse
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+from datetime import datetime, timezone
+
+from run_report import get_report
+
+
+DEFAULT_HISTORY_PATH = os.getenv(
+    "IDX_OWNERSHIP_HISTORY_PATH", os.path.join(os.getcwd(), "data", "ownership_history.db")
+)
+# shareholders_scraper.py cleans the holders its own way, by default it keeps its
+# own history instead of interleaving its versions with main.py's
+SCRAPER_HISTORY_PATH = os.getenv(
+    "IDX_SCRAPER_OWNERSHIP_HISTORY_PATH",
+    os.path.join(os.getcwd(), "data", "shareholders_history.db"),
+)
+# A full snapshot every this many versions bounds the deltas replayed by a lookup
+SNAPSHOT_INTERVAL = 20
+
+SNAPSHOT = "snapshot"
+DELTA = "delta"
+
+# Fields identifying an entry of each ownership column, the others are its values.
+# The writers derive a shareholder's type differently, the holding is its name.
+ENTRY_KEYS = {
+    "shareholders": ("name",),
+    "directors": ("name", "position"),
+    "commissioners": ("name", "position"),
+    "audit_committees": ("name", "position"),
+    "subsidiaries": ("name",),
+}
+NUMERIC_FIELDS = {"share_amount", "share_percentage", "total_assets", "percentage"}
+# main.py rounds fractions to 8 digits, shareholders_scraper.py to 5
+NUMERIC_DIGITS = 5
+# Recorded fields of the columns whose writers add fields of their own (e.g. the
+# resolved ticker), None records every field
+ENTRY_FIELDS = {
+    "shareholders": ("name", "share_amount", "share_percentage"),
+}
+
+
+def _timestamp(value) -> float:
+    """Accepts unix time, datetime or ISO 8601 strings"""
+    if value is None:
+        return time.time()
+    if isinstance(value, str):
+        # fromisoformat only reads "Z" from Python 3.11
+        if value.endswith(("Z", "z")):
+            value = value[:-1] + "+00:00"
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return float(value)
+
+
+def _normalize_entry(column: str, entry: dict) -> dict:
+    # Amounts come back from the DB as strings or floats and each writer rounds
+    # them its own way, "0.4", 0.4 and 0.40000001 are the same holding
+    fields = ENTRY_FIELDS.get(column)
+    normalized = {}
+    for field, value in entry.items():
+        if fields is not None and field not in fields:
+            continue
+        if field in NUMERIC_FIELDS:
+            try:
+                value = round(float(value), NUMERIC_DIGITS)
+            except (TypeError, ValueError):
+                pass
+        normalized[field] = value
+    return normalized
+
+
+def _entries_by_key(column: str, entries) -> dict:
+    if isinstance(entries, str):
+        try:
+            entries = json.loads(entries)
+        except ValueError:
+            entries = None
+    keys = ENTRY_KEYS[column]
+    by_key = {}
+    for entry in entries if isinstance(entries, list) else []:
+        if isinstance(entry, dict):
+            entry = _normalize_entry(column, entry)
+            by_key[json.dumps([entry.get(key) for key in keys])] = entry
+    return by_key
+
+
+def diff_entries(old: dict, new: dict) -> dict:
+    """Compares two {entry key: entry} maps of one ownership column.
+
+    Args:
+        old (dict): entries of the previous version
+        new (dict): current entries
+
+    Returns:
+        dict: "added" entries, "removed" keys and "changed" as {key: {field: [old, new]}}, empty lists and dict when equal
+    """
+    changed = {}
+    for key in sorted(set(old) & set(new)):
+        fields = {
+            field: [old[key].get(field), new[key].get(field)]
+            for field in sorted(set(old[key]) | set(new[key]))
+            if old[key].get(field) != new[key].get(field)
+        }
+        if fields:
+            changed[key] = fields
+    return {
+        "added": [new[key] for key in sorted(set(new) - set(old))],
+        "removed": sorted(set(old) - set(new)),
+        "changed": changed,
+    }
+
+
+def apply_delta(entries: dict, delta: dict, column: str) -> dict:
+    """Returns the {entry key: entry} map after the delta"""
+    entries = {key: dict(entry) for key, entry in entries.items()}
+    for key in delta["removed"]:
+        entries.pop(key, None)
+    for key, fields in delta["changed"].items():
+        for field, (_, value) in fields.items():
+            entries[key][field] = value
+    entries.update(_entries_by_key(column, delta["added"]))
+    return entries
+
+
+class OwnershipHistory:
+    def __init__(self, path=DEFAULT_HISTORY_PATH, snapshot_interval=SNAPSHOT_INTERVAL):
+        """Append-only history of the ownership columns stored in a SQLite file.
+
+        Every version of a (symbol, column) is either a full snapshot or a delta
+        against the previous version. A run that finds the same entries as the
+        last version writes nothing, so the file grows with the real changes only.
+        A snapshot is written every `snapshot_interval` versions, so a lookup
+        replays a bounded number of deltas.
+
+        Args:
+            path (str, optional): path of the SQLite file. Defaults to data/ownership_history.db (IDX_OWNERSHIP_HISTORY_PATH).
+            snapshot_interval (int, optional): versions between two full snapshots. Defaults to 20.
+        """
+        self.path = path
+        self.snapshot_interval = snapshot_interval
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with closing(self._connect()) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ownership_versions (
+                    symbol TEXT NOT NULL,
+                    ownership_column TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    recorded_at REAL NOT NULL,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    PRIMARY KEY (symbol, ownership_column, version)
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_ownership_versions_time ON ownership_versions (ownership_column, recorded_at)"
+            )
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _versions(self, conn, symbol, column, until=None, before_version=None) -> list:
+        """Rows from the last snapshot up to `until` (inclusive) and below `before_version`, oldest first"""
+        until = float("inf") if until is None else until
+        before_version = float("inf") if before_version is None else before_version
+        snapshot_version = conn.execute(
+            """
+            SELECT MAX(version) FROM ownership_versions
+            WHERE symbol = ? AND ownership_column = ? AND kind = ? AND recorded_at <= ? AND version < ?
+            """,
+            (symbol, column, SNAPSHOT, until, before_version),
+        ).fetchone()[0]
+        if snapshot_version is None:
+            return []
+        return conn.execute(
+            """
+            SELECT version, recorded_at, kind, payload FROM ownership_versions
+            WHERE symbol = ? AND ownership_column = ? AND version >= ? AND recorded_at <= ? AND version < ?
+            ORDER BY version
+            """,
+            (symbol, column, snapshot_version, until, before_version),
+        ).fetchall()
+
+    def _replay(self, rows, column) -> dict:
+        entries = {}
+        for row in rows:
+            payload = json.loads(row["payload"])
+            if row["kind"] == SNAPSHOT:
+                entries = _entries_by_key(column, payload)
+            else:
+                entries = apply_delta(entries, payload, column)
+        return entries
+
+    def record(self, profiles, columns=tuple(ENTRY_KEYS), recorded_at=None) -> int:
+        """Appends a version for every (symbol, column) whose entries changed.
+
+        Args:
+            profiles (iterable): dicts with a symbol and the cleaned ownership columns (lists or json strings)
+            columns (tuple, optional): ownership columns to record. Defaults to all of ENTRY_KEYS.
+            recorded_at (optional): time of the versions. Defaults to now.
+
+        Returns:
+            int: number of versions written
+        """
+        recorded_at = _timestamp(recorded_at)
+        written = 0
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for profile in profiles:
+                for column in columns:
+                    if column not in profile:
+                        continue
+                    written += self._record_one(
+                        conn, profile["symbol"], column, profile[column], recorded_at
+                    )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        get_report().increment("ownership_history_versions", written)
+        return written
+
+    def _record_one(self, conn, symbol, column, entries, recorded_at) -> int:
+        current = _entries_by_key(column, entries)
+        rows = self._versions(conn, symbol, column)
+        if not rows:
+            if not current:
+                return 0
+            version, kind, payload = 0, SNAPSHOT, list(current.values())
+        else:
+            delta = diff_entries(self._replay(rows, column), current)
+            if not (delta["added"] or delta["removed"] or delta["changed"]):
+                return 0
+            version = rows[-1]["version"] + 1
+            if version - rows[0]["version"] >= self.snapshot_interval:
+                kind, payload = SNAPSHOT, list(current.values())
+            else:
+                kind, payload = DELTA, delta
+        conn.execute(
+            "INSERT INTO ownership_versions VALUES (?, ?, ?, ?, ?, ?)",
+            (symbol, column, version, recorded_at, kind, json.dumps(payload, sort_keys=True)),
+        )
+        return 1
+
+    def as_of(self, symbol, column="shareholders", when=None) -> list:
+        """Reconstructs the entries of a company at a point in time.
+
+        Args:
+            symbol (str): company symbol with .JK suffix
+            column (str, optional): ownership column. Defaults to "shareholders".
+            when (optional): unix time, datetime or ISO 8601 string. Defaults to now.
+
+        Returns:
+            list: the entries recorded last before `when`, empty before the first version
+        """
+        with closing(self._connect()) as conn:
+            rows = self._versions(conn, symbol, column, _timestamp(when))
+        return list(self._replay(rows, column).values())
+
+    def changes(self, column="shareholders", start=None, end=None, symbol=None) -> list:
+        """Changes recorded in a time range, oldest first.
+
+        Args:
+            column (str, optional): ownership column. Defaults to "shareholders".
+            start (optional): start of the range (inclusive). Defaults to the first version.
+            end (optional): end of the range (inclusive). Defaults to now.
+            symbol (str, optional): only this company. Defaults to None (every company).
+
+        Returns:
+            list: {"symbol", "version", "recorded_at", "added", "removed", "changed"} dicts; a
+                snapshot after the first version is diffed against the version before it
+        """
+        start = 0.0 if start is None else _timestamp(start)
+        end = _timestamp(end)
+        query = """
+            SELECT symbol, version, recorded_at, kind, payload FROM ownership_versions
+            WHERE ownership_column = ? AND recorded_at >= ? AND recorded_at <= ?
+        """
+        params = [column, start, end]
+        if symbol:
+            query += " AND symbol = ?"
+            params.append(symbol)
+        query += " ORDER BY recorded_at, symbol, version"
+
+        changes = []
+        with closing(self._connect()) as conn:
+            for row in conn.execute(query, params).fetchall():
+                payload = json.loads(row["payload"])
+                if row["kind"] == DELTA:
+                    delta = payload
+                else:
+                    previous = self._replay(
+                        self._versions(
+                            conn, row["symbol"], column, before_version=row["version"]
+                        ),
+                        column,
+                    )
+                    delta = diff_entries(previous, _entries_by_key(column, payload))
+                changes.append(
+                    {
+                        "symbol": row["symbol"],
+                        "version": row["version"],
+                        "recorded_at": datetime.fromtimestamp(
+                            row["recorded_at"], timezone.utc
+                        ).isoformat(),
+                        **delta,
+                    }
+                )
+        return changes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the ownership history.")
+    parser.add_argument("symbol", nargs="?", default=None, help="Company symbol with .JK suffix (default: every company for --since).")
+    parser.add_argument("--column", default="shareholders", choices=list(ENTRY_KEYS), help="Ownership column (default: shareholders).")
+    parser.add_argument("--as-of", dest="as_of", default=None, help="Print the entries of the symbol at this ISO 8601 time.")
+    parser.add_argument("--since", default=None, help="Print the changes recorded since this ISO 8601 time.")
+    parser.add_argument("--until", default=None, help="End of the --since range (default: now).")
+    parser.add_argument("--path", default=DEFAULT_HISTORY_PATH, help="History file (default: data/ownership_history.db).")
+    args = parser.parse_args()
+
+    history = OwnershipHistory(args.path)
+    if args.since:
+        output = history.changes(args.column, args.since, args.until, args.symbol)
+    elif args.symbol:
+        output = history.as_of(args.symbol, args.column, args.as_of)
+    else:
+        parser.error("give a symbol or --since")
+    print(json.dumps(output, indent=2))
@@ -0,0 +1,236 @@
+import importlib
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from run_report import get_report
+
+
+# Ownership column of idx_company_profile -> normalized table, one row per entry
+OWNERSHIP_TABLES = {
+    "shareholders": "idx_company_shareholders",
+    "directors": "idx_company_directors",
+    "commissioners": "idx_company_commissioners",
+    "audit_committees": "idx_company_audit_committees",
+    "subsidiaries": "idx_company_subsidiaries",
+}
+
+# Columns and dtypes of every table, the same in every run so partitions of
+# different days can be read as one dataset. symbol is the company, entry the
+# position of the row in the company's list and ticker the listed symbol of
+# the shareholder or subsidiary, if any.
+TABLE_DTYPES = {
+    "shareholders": {
+        "symbol": "string",
+        "entry": "int32",
+        "name": "string",
+        "type": "string",
+        "share_amount": "float64",
+        "share_percentage": "float64",
+        "ticker": "string",
+    },
+    "directors": {
+        "symbol": "string",
+        "entry": "int32",
+        "name": "string",
+        "position": "string",
+        "affiliated": "string",
+    },
+    "commissioners": {
+        "symbol": "string",
+        "entry": "int32",
+        "name": "string",
+        "position": "string",
+        "independent": "string",
+    },
+    "audit_committees": {
+        "symbol": "string",
+        "entry": "int32",
+        "name": "string",
+        "position": "string",
+    },
+    "subsidiaries": {
+        "symbol": "string",
+        "entry": "int32",
+        "name": "string",
+        "business_activity": "string",
+        "total_assets": "float64",
+        "location": "string",
+        "currency": "string",
+        "percentage": "float64",
+        "operation_status": "string",
+        "commercial_year": "string",
+        "ticker": "string",
+    },
+}
+
+DEFAULT_TABLES_DIR = os.getenv(
+    "IDX_OWNERSHIP_TABLES_DIR", os.path.join(os.getcwd(), "data", "ownership")
+)
+DB_BATCH_SIZE = 500
+
+
+def check_parquet_engine() -> str:
+    """Returns the Parquet engine pandas will use, raises ImportError when there is none"""
+    for engine in ("pyarrow", "fastparquet"):
+        try:
+            importlib.import_module(engine)
+        except ImportError:
+            continue
+        return engine
+    raise ImportError(
+        "Writing the ownership tables as Parquet needs pyarrow, install requirements.txt"
+    )
+
+
+def normalize_long_frame(col_name: str, frame: pd.DataFrame) -> pd.DataFrame:
+    """Casts a long-format frame of OwnershipCleaner to the columns and dtypes of its table.
+
+    Args:
+        col_name (str): ownership column the frame was cleaned from
+        frame (pd.DataFrame): one row per entry, in the order of the company's list
+
+    Returns:
+        pd.DataFrame: the table rows, sorted by symbol and entry
+    """
+    dtypes = TABLE_DTYPES[col_name]
+    frame = frame.reset_index(drop=True)
+    frame["entry"] = frame.groupby("symbol", sort=False).cumcount()
+    frame = frame.reindex(columns=list(dtypes))
+    # Categories differ between batches, plain strings keep one schema
+    frame = frame.astype(
+        {col: object for col, dtype in dtypes.items() if dtype == "string"}
+    ).astype(dtypes)
+    return frame.sort_values(["symbol", "entry"], kind="stable").reset_index(drop=True)
+
+
+class OwnershipTables:
+    def __init__(self):
+        """Collects the long-format ownership frames of a run and writes them as normalized tables.
+
+        The profile updater cleans ownership in micro-batches, possibly from
+        several threads, each batch adds its frames and symbols here.
+        """
+        self._frames = {}
+        self._symbols = set()
+        self._lock = threading.Lock()
+
+    @property
+    def symbols(self) -> set:
+        """Symbols whose ownership columns were cleaned"""
+        with self._lock:
+            return set(self._symbols)
+
+    def add(self, long_frames: dict, symbols):
+        """Adds the frames filled by OwnershipCleaner.clean_ownership for a batch of symbols
+
+        Args:
+            long_frames (dict): {ownership column: [long-format frames]}
+            symbols (iterable): every symbol of the batch, including those without any entry
+        """
+        with self._lock:
+            for col_name, frames in long_frames.items():
+                self._frames.setdefault(col_name, []).extend(
+                    frame for frame in frames if not frame.empty
+                )
+            self._symbols.update(symbols)
+
+    def tables(self, symbols=None) -> dict:
+        """Returns {ownership column: table rows} of the collected frames
+
+        Args:
+            symbols (set, optional): keep only these companies. Defaults to None (all collected ones).
+        """
+        with self._lock:
+            frames = {col_name: list(items) for col_name, items in self._frames.items()}
+
+        tables = {}
+        for col_name, dtypes in TABLE_DTYPES.items():
+            items = frames.get(col_name)
+            if items:
+                table = normalize_long_frame(col_name, pd.concat(items, ignore_index=True))
+            else:
+                table = pd.DataFrame(columns=list(dtypes)).astype(dtypes)
+            if symbols is not None:
+                table = table[table["symbol"].isin(symbols)].reset_index(drop=True)
+            tables[col_name] = table
+        return tables
+
+    def write_parquet(self, base_dir=DEFAULT_TABLES_DIR, symbols=None) -> list:
+        """Writes every table to <base_dir>/<table>/snapshot_date=<UTC date>/part-<time>-<pid>.parquet
+
+        A partition holds the companies cleaned by the runs of that day, a run
+        over all symbols writes a complete snapshot. Needs pyarrow.
+
+        Args:
+            base_dir (str, optional): root of the dataset. Defaults to data/ownership (IDX_OWNERSHIP_TABLES_DIR).
+            symbols (set, optional): companies to write. Defaults to None (all collected ones).
+
+        Returns:
+            list: paths of the written files
+        """
+        check_parquet_engine()
+        now = datetime.now(timezone.utc)
+        file_name = f"part-{now.strftime('%H%M%SZ')}-{os.getpid()}.parquet"
+        paths = []
+        with get_report().stage("write_ownership_tables"):
+            for col_name, table in self.tables(symbols).items():
+                directory = os.path.join(
+                    base_dir,
+                    OWNERSHIP_TABLES[col_name],
+                    f"snapshot_date={now.strftime('%Y-%m-%d')}",
+                )
+                os.makedirs(directory, exist_ok=True)
+                path = os.path.join(directory, file_name)
+                table.to_parquet(path, index=False)
+                paths.append(path)
+                get_report().increment("ownership_table_rows_written", len(table))
+        return paths
+
+    def upsert_to_db(self, supabase_client, symbols=None, batch_size=DB_BATCH_SIZE):
+        """Replaces the rows of the cleaned companies in the normalized DB tables
+
+        The current entries are upserted on (symbol, entry) first, then the rows
+        past the last entry of each company are deleted, so removed shareholders
+        or subsidiaries disappear and a retried run doesn't duplicate rows. A run
+        failing halfway leaves stale rows behind, never a company without rows.
+        See ownership_tables.sql for the DDL.
+
+        Args:
+            supabase_client (Client): Supabase client object for database interactions.
+            symbols (set, optional): companies to replace. Defaults to None (all collected ones).
+            batch_size (int, optional): rows or symbols per request. Defaults to 500.
+        """
+        symbols = sorted(self.symbols if symbols is None else self.symbols & set(symbols))
+        if not symbols:
+            return
+        report = get_report()
+        for col_name, table in self.tables(set(symbols)).items():
+            table_name = OWNERSHIP_TABLES[col_name]
+            with report.stage("db_upsert_ownership_tables"):
+                records = table.astype(object).where(table.notna(), None).to_dict("records")
+                for start in range(0, len(records), batch_size):
+                    supabase_client.table(table_name).upsert(
+                        records[start : start + batch_size],
+                        returning="minimal",
+                        on_conflict="symbol,entry",
+                    ).execute()
+                # Entries are numbered from 0, companies with as many entries
+                # share one delete of the entries past their count
+                counts = (
+                    table.groupby("symbol", observed=True).size()
+                    .reindex(symbols, fill_value=0)
+                )
+                for count, group in counts.groupby(counts):
+                    stale_symbols = list(group.index)
+                    for start in range(0, len(stale_symbols), batch_size):
+                        supabase_client.table(table_name).delete().in_(
+                            "symbol", stale_symbols[start : start + batch_size]
+                        ).gte("entry", int(count)).execute()
+            logging.info(
+                f"Replaced the {table_name} rows of {len(symbols)} companies with {len(records)} rows."
+            )
+            report.increment("ownership_table_rows_upserted", len(records))
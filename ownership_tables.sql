@@ -0,0 +1,63 @@
+-- Normalized ownership tables written by `python main.py --ownership-db`.
+-- One row per entry of the json columns of idx_company_profile, replaced per
+-- company on every run (see ownership_tables.py).
+
+create table if not exists idx_company_shareholders (
+    symbol text not null,
+    entry integer not null,
+    name text,
+    type text,
+    share_amount double precision,
+    share_percentage double precision,
+    ticker text,
+    primary key (symbol, entry)
+);
+create index if not exists idx_company_shareholders_name_idx on idx_company_shareholders (name);
+create index if not exists idx_company_shareholders_ticker_idx on idx_company_shareholders (ticker);
+create index if not exists idx_company_shareholders_share_percentage_idx on idx_company_shareholders (share_percentage);
+
+create table if not exists idx_company_directors (
+    symbol text not null,
+    entry integer not null,
+    name text,
+    position text,
+    affiliated text,
+    primary key (symbol, entry)
+);
+create index if not exists idx_company_directors_name_idx on idx_company_directors (name);
+
+create table if not exists idx_company_commissioners (
+    symbol text not null,
+    entry integer not null,
+    name text,
+    position text,
+    independent text,
+    primary key (symbol, entry)
+);
+create index if not exists idx_company_commissioners_name_idx on idx_company_commissioners (name);
+
+create table if not exists idx_company_audit_committees (
+    symbol text not null,
+    entry integer not null,
+    name text,
+    position text,
+    primary key (symbol, entry)
+);
+create index if not exists idx_company_audit_committees_name_idx on idx_company_audit_committees (name);
+
+create table if not exists idx_company_subsidiaries (
+    symbol text not null,
+    entry integer not null,
+    name text,
+    business_activity text,
+    total_assets double precision,
+    location text,
+    currency text,
+    percentage double precision,
+    operation_status text,
+    commercial_year text,
+    ticker text,
+    primary key (symbol, entry)
+);
+create index if not exists idx_company_subsidiaries_name_idx on idx_company_subsidiaries (name);
+create index if not exists idx_company_subsidiaries_ticker_idx on idx_company_subsidiaries (ticker);
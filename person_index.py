@@ -0,0 +1,318 @@
+"""Index of the people holding roles in the listed companies.
+
+Directors, commissioners, audit committee members and individual shareholders
+are grouped into persons across companies:
+
+- names are reduced to a key: lower case, without punctuation, academic or
+  religious titles and parenthesized aliases, tokens sorted,
+- an unseen key is compared with fuzz.token_sort_ratio to the known keys
+  with the same initials sharing one of its tokens (blocking), and joins the
+  best person above FUZZY_THRESHOLD, otherwise it starts a new person,
+- unseen keys are assigned most frequent first, so a person id is derived from
+  the usual spelling rather than a typo, and never changes: later variants of
+  the name point to it.
+
+Lookups by id or by name are dict accesses.
+
+    python person_index.py "Prajogo Pangestu"
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+import pandas as pd
+
+
+DEFAULT_INDEX_PATH = os.getenv(
+    "IDX_PERSON_INDEX_PATH", os.path.join(os.getcwd(), "data", "person_index.json")
+)
+FUZZY_THRESHOLD = 92
+
+TITLE_TOKENS = {
+    "dr", "drs", "dra", "ir", "h", "hj", "prof", "st", "se", "sh", "mh", "mm",
+    "msc", "ma", "mba", "ak", "ca", "cpa", "cma", "cfa", "cacp", "phd",
+    "sp", "spm", "kc", "an", "mr", "mrs", "ms", "bapak", "ibu", "tn", "ny",
+}
+# Shareholders with these tokens are companies or the public, not persons
+NON_PERSON_TOKENS = {
+    "pt", "tbk", "persero", "cv", "ltd", "limited", "inc", "corp", "corporation",
+    "co", "company", "bank", "pte", "llc", "plc", "gmbh", "bv", "holding",
+    "holdings", "fund", "reksa", "koperasi", "yayasan", "pensiun",
+    "asuransi", "sekuritas", "investment", "investama", "capital", "group",
+    "public", "masyarakat", "treasury", "government", "negara", "republik",
+}
+ROLE_FRAME_COLUMNS = ["symbol", "role", "position", "name", "key", "share_percentage"]
+ROLE_COLUMNS = {
+    "directors": "director",
+    "commissioners": "commissioner",
+    "audit_committees": "audit_committee",
+    "shareholders": "shareholder",
+}
+
+
+def person_name_key(name) -> str:
+    """Returns the matching key of a person's name, "" when the name isn't a person's
+
+    Args:
+        name (str): name as cleaned by OwnershipCleaner, e.g. "Dr. Dr. Waldensius Girsang, Spm"
+
+    Returns:
+        str: e.g. "girsang waldensius"
+    """
+    if not isinstance(name, str):
+        return ""
+    name = re.sub(r"\([^)]*\)", " ", name.lower())
+    tokens = re.sub(r"[^\w\s]", " ", name).split()
+    if not tokens or NON_PERSON_TOKENS.intersection(tokens):
+        return ""
+    # Initials and titles are spelled differently from one filing to the next
+    tokens = [
+        token
+        for token in tokens
+        if len(token) > 1 and token not in TITLE_TOKENS and not token.isdigit()
+    ]
+    return " ".join(sorted(tokens))
+
+
+def _entries(value) -> list:
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return []
+    return value if isinstance(value, list) else []
+
+
+def roles_from_profiles(profiles: pd.DataFrame) -> pd.DataFrame:
+    """Extracts the roles of persons from the cleaned ownership columns.
+
+    Args:
+        profiles (pd.DataFrame): symbol and ownership columns of idx_company_profile (lists or json strings)
+
+    Returns:
+        pd.DataFrame: symbol, role, position, name, key and share_percentage (shareholders) columns
+    """
+    roles = []
+    for col_name, role in ROLE_COLUMNS.items():
+        if col_name not in profiles.columns:
+            continue
+        for symbol, entries in zip(profiles["symbol"], profiles[col_name]):
+            for entry in _entries(entries):
+                # Shareholders resolved to a ticker are listed companies
+                if not isinstance(entry, dict) or (role == "shareholder" and entry.get("symbol")):
+                    continue
+                key = person_name_key(entry.get("name"))
+                if not key:
+                    continue
+                roles.append(
+                    {
+                        "symbol": symbol,
+                        "role": role,
+                        "position": entry.get("position") or entry.get("type"),
+                        "name": entry["name"].strip(),
+                        "key": key,
+                        "share_percentage": entry.get("share_percentage") if role == "shareholder" else None,
+                    }
+                )
+    return pd.DataFrame(roles, columns=ROLE_FRAME_COLUMNS)
+
+
+def _initials(key: str) -> str:
+    return "".join(sorted(token[0] for token in key.split()))
+
+
+def _person_id(key: str) -> str:
+    return "P" + hashlib.sha1(key.encode()).hexdigest()[:10]
+
+
+class PersonIndex:
+    def __init__(self, roles: pd.DataFrame = None, ids: dict = None, threshold=FUZZY_THRESHOLD):
+        """Persons and their roles across companies.
+
+        Args:
+            roles (pd.DataFrame, optional): roles_from_profiles output. Defaults to None (empty index).
+            ids (dict, optional): known {name key: person id}, kept as they are. Defaults to None.
+            threshold (int, optional): minimum fuzz.token_sort_ratio joining a new key to a known person. Defaults to 92.
+        """
+        self.roles = (
+            roles if roles is not None else pd.DataFrame(columns=ROLE_FRAME_COLUMNS)
+        ).reset_index(drop=True)
+        self.ids = dict(ids or {})
+        self.threshold = threshold
+        self._assign_ids(self.roles["key"].value_counts())
+        self._build()
+
+    def _assign_ids(self, key_counts):
+        """Gives an id to the keys without one
+
+        Args:
+            key_counts (pd.Series): number of roles of every key
+        """
+        from fuzzywuzzy import fuzz, utils
+
+        new_keys = [key for key in key_counts.index if key not in self.ids]
+        if not new_keys:
+            return
+        # Typos keep the initials ("nyoman sidia" and "nyoman widia" are two
+        # persons), so blocks are keyed by token and initials. Even a common
+        # token like "muhammad" only gathers the keys with the same initials.
+        blocks = {}
+        # token_sort_ratio processes both strings on every call, each key is
+        # processed once here and compared with the plain ratio
+        processed = {}
+
+        def process(key):
+            processed[key] = " ".join(sorted(utils.full_process(key, force_ascii=True).split()))
+            return processed[key]
+
+        def add_to_blocks(key):
+            process(key)
+            initials = _initials(key)
+            for token in set(key.split()):
+                blocks.setdefault((token, initials), []).append(key)
+
+        for key in self.ids:
+            add_to_blocks(key)
+
+        # Most roles first, so a typo seen once joins the usual spelling instead
+        # of naming the person. The key breaks ties: the same roles give the same
+        # ids whatever the order of the profiles.
+        new_keys.sort(key=lambda key: (-key_counts[key], key))
+        for key in new_keys:
+            initials = _initials(key)
+            text = process(key)
+            candidates = {
+                candidate
+                for token in set(key.split())
+                if len(token) > 2
+                for candidate in blocks.get((token, initials), [])
+            }
+            best, best_score = None, self.threshold - 1
+            for candidate in sorted(candidates):
+                # The ratio is at most 2 * shorter / total length, skip the
+                # lengths that can't reach the threshold before scoring
+                shorter, longer = sorted((len(text), len(processed[candidate])))
+                if 200 * shorter < (self.threshold - 0.5) * (shorter + longer):
+                    continue
+                score = fuzz.ratio(text, processed[candidate])
+                if score > best_score:
+                    best, best_score = candidate, score
+            self.ids[key] = self.ids[best] if best else _person_id(key)
+            add_to_blocks(key)
+
+    def _build(self):
+        self.roles["person_id"] = self.roles["key"].map(self.ids)
+        self.roles = self.roles.sort_values(
+            ["person_id", "symbol", "role"], kind="stable"
+        ).reset_index(drop=True)
+        self._roles_by_person = {}
+        for record in self.roles.to_dict("records"):
+            self._roles_by_person.setdefault(record["person_id"], []).append(record)
+        # The most frequent spelling names the person
+        self.names = {
+            person_id: max(
+                (record["name"] for record in records),
+                key=[record["name"] for record in records].count,
+            )
+            for person_id, records in self._roles_by_person.items()
+        }
+
+    def update(self, profiles: pd.DataFrame, symbols=None):
+        """Replaces the roles listed by the given companies, known keys keep their person id
+
+        Args:
+            profiles (pd.DataFrame): current profiles of the changed companies, see roles_from_profiles
+            symbols (iterable, optional): changed companies, their roles are dropped even when
+                they have none left. Defaults to None (the symbols of `profiles`).
+        """
+        symbols = set(profiles["symbol"] if symbols is None else symbols)
+        kept = self.roles[~self.roles["symbol"].isin(symbols)].drop(columns="person_id")
+        changed = roles_from_profiles(profiles[profiles["symbol"].isin(symbols)])
+        self.roles = pd.concat(
+            [frame for frame in (kept, changed) if not frame.empty] or [changed],
+            ignore_index=True,
+        )
+        self._assign_ids(self.roles["key"].value_counts())
+        self._build()
+
+    def person_id(self, name):
+        """Returns the id of the person with this name, or None when the name is unknown"""
+        return self.ids.get(person_name_key(name))
+
+    def roles_of(self, person) -> list:
+        """Roles held by a person, given by id or by name, sorted by symbol"""
+        person_id = person if person in self._roles_by_person else self.person_id(person)
+        return [
+            {column: record[column] for column in ("symbol", "role", "position", "name", "share_percentage")}
+            for record in self._roles_by_person.get(person_id, [])
+        ]
+
+    def companies_of(self, person) -> list:
+        return sorted({role["symbol"] for role in self.roles_of(person)})
+
+    def stats(self) -> dict:
+        return {
+            "persons": len(self._roles_by_person),
+            "roles": len(self.roles),
+            "name_keys": len(self.ids),
+            "persons_in_several_companies": int(
+                (self.roles.groupby("person_id")["symbol"].nunique() > 1).sum()
+            ),
+        }
+
+
+def save_index(index: PersonIndex, path=DEFAULT_INDEX_PATH):
+    """Writes the ids and roles atomically"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    roles = index.roles.drop(columns="person_id")
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as temp_file:
+            json.dump(
+                {
+                    "ids": index.ids,
+                    "roles": roles.astype(object).where(roles.notna(), None).to_dict("records"),
+                },
+                temp_file,
+                sort_keys=True,
+            )
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def load_index(path=DEFAULT_INDEX_PATH):
+    """Returns the persisted index, or None when there is none or it can't be read"""
+    try:
+        with open(path) as index_file:
+            data = json.load(index_file)
+        roles = pd.DataFrame(data["roles"], columns=ROLE_FRAME_COLUMNS)
+        return PersonIndex(roles, data["ids"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the person index written by main.py --person-index.")
+    parser.add_argument("names", nargs="*", help="Names or person ids to look up.")
+    parser.add_argument("--path", default=DEFAULT_INDEX_PATH, help="Index file (default: data/person_index.json).")
+    args = parser.parse_args()
+
+    index = load_index(args.path)
+    if index is None:
+        raise SystemExit(f"No person index at {args.path}")
+    output = {"stats": index.stats()}
+    for name in args.names:
+        person_id = name if name in index.names else index.person_id(name)
+        output[name] = {
+            "person_id": person_id,
+            "name": index.names.get(person_id),
+            "roles": index.roles_of(person_id) if person_id else [],
+        }
+    print(json.dumps(output, indent=2))
@@ -0,0 +1,141 @@
+import logging
+import queue
+import threading
+
+from run_report import get_report
+
+
+_DONE = object()
+
+
+class Stage:
+    def __init__(self, name: str, func, workers=1, batch_size=None, batch_timeout=2.0):
+        """One stage of a Pipeline.
+
+        Args:
+            name (str): stage name, used in logs and report counters.
+            func (callable): called with one item (or a list of items when batched), returns the
+                item passed to the next stage or None to drop it.
+            workers (int, optional): number of threads running the stage. Defaults to 1.
+            batch_size (int, optional): call func with lists of up to this many items. Defaults to None (no batching).
+            batch_timeout (float, optional): flush a partial batch after waiting this long for the next item. Defaults to 2.
+        """
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+
+
+class Pipeline:
+    def __init__(self, stages: list, maxsize=32):
+        """Threads connected by bounded queues, so slow stages overlap instead of running one after another.
+
+        A full queue blocks the stage feeding it, which keeps memory bounded when a
+        downstream stage (e.g. the DB) is slower than the upstream one. An exception
+        raised by a stage drops that item and is logged, the other items go on.
+
+        Args:
+            stages (list): Stage objects in processing order.
+            maxsize (int, optional): capacity of each queue between two stages. Defaults to 32.
+        """
+        self.stages = stages
+        self.maxsize = maxsize
+
+    def run(self, items) -> list:
+        """Feeds the items through every stage and returns the outputs of the last stage"""
+        queues = [queue.Queue(self.maxsize) for _ in self.stages]
+        results = []
+        results_lock = threading.Lock()
+        threads = []
+
+        for index, stage in enumerate(self.stages):
+            inbox = queues[index]
+            outbox = queues[index + 1] if index + 1 < len(self.stages) else None
+            downstream_workers = (
+                self.stages[index + 1].workers if outbox is not None else 0
+            )
+            remaining = [stage.workers]
+            remaining_lock = threading.Lock()
+
+            def emit(output, outbox=outbox):
+                if output is None:
+                    return
+                if outbox is None:
+                    with results_lock:
+                        results.append(output)
+                else:
+                    outbox.put(output)
+
+            def finish(
+                outbox=outbox,
+                downstream_workers=downstream_workers,
+                remaining=remaining,
+                remaining_lock=remaining_lock,
+            ):
+                # The last worker of a stage closes the next one
+                with remaining_lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last and outbox is not None:
+                    for _ in range(downstream_workers):
+                        outbox.put(_DONE)
+
+            for worker in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._work,
+                    args=(stage, inbox, emit, finish),
+                    name=f"pipeline-{stage.name}-{worker}",
+                    daemon=True,
+                )
+                thread.start()
+                threads.append(thread)
+
+        for item in items:
+            queues[0].put(item)
+        for _ in range(self.stages[0].workers):
+            queues[0].put(_DONE)
+
+        for thread in threads:
+            thread.join()
+        return results
+
+    def _call(self, stage: Stage, payload):
+        try:
+            return stage.func(payload)
+        except Exception as e:
+            logging.exception(f"Pipeline stage {stage.name} failed: {e}")
+            get_report().increment(f"pipeline_{stage.name}_errors")
+            return None
+
+    def _work(self, stage: Stage, inbox: queue.Queue, emit, finish):
+        batch = []
+        try:
+            while True:
+                if stage.batch_size:
+                    try:
+                        item = inbox.get(timeout=stage.batch_timeout if batch else None)
+                    except queue.Empty:
+                        # Upstream is slow, don't hold back a partial batch
+                        emit(self._call(stage, batch))
+                        batch = []
+                        continue
+                else:
+                    item = inbox.get()
+
+                if item is _DONE:
+                    break
+                get_report().increment(f"pipeline_{stage.name}_items")
+
+                if not stage.batch_size:
+                    emit(self._call(stage, item))
+                    continue
+                batch.append(item)
+                if len(batch) >= stage.batch_size:
+                    emit(self._call(stage, batch))
+                    batch = []
+
+            if batch:
+                emit(self._call(stage, batch))
+        finally:
+            finish()
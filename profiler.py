@@ -0,0 +1,151 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+
+# Stage calls whose allocations are diffed with tracemalloc snapshots, snapshots are slow
+SNAPSHOTS_PER_STAGE = 2
+TOP_ALLOCATIONS = 25
+TRACEMALLOC_FRAMES = 10
+
+
+class StageProfiler:
+    def __init__(self, run_dir: str):
+        """Profiles the run report stages with cProfile and tracemalloc.
+
+        Time is attributed to the innermost running stage: entering a nested stage
+        pauses the profile of its parent, so each stage's profile shows its own
+        work and the profiles of one run add up to the whole run. Every thread
+        keeps its own profilers, they are merged when written.
+
+        Args:
+            run_dir (str): directory the profiles are written to.
+        """
+        self.run_dir = run_dir
+        self._profiles = {}
+        self._memory = {}
+        self._snapshots_taken = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+
+    def _stack(self) -> list:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _profile(self, name: str) -> cProfile.Profile:
+        key = (name, threading.get_ident())
+        with self._lock:
+            if key not in self._profiles:
+                self._profiles[key] = cProfile.Profile()
+            return self._profiles[key]
+
+    @staticmethod
+    def _enable(profile):
+        try:
+            profile.enable()
+            return True
+        except ValueError:
+            # Python 3.12+ allows a single active profiler per process, another
+            # thread's stage is being profiled
+            return False
+
+    @contextmanager
+    def stage(self, name: str):
+        stack = self._stack()
+        if stack and stack[-1][1]:
+            stack[-1][0].disable()
+
+        with self._lock:
+            take_snapshot = self._snapshots_taken.get(name, 0) < SNAPSHOTS_PER_STAGE
+            if take_snapshot:
+                self._snapshots_taken[name] = self._snapshots_taken.get(name, 0) + 1
+        before = tracemalloc.take_snapshot() if take_snapshot else None
+        current_before = tracemalloc.get_traced_memory()[0]
+
+        profile = self._profile(name)
+        stack.append([profile, self._enable(profile)])
+        try:
+            yield
+        finally:
+            profile, enabled = stack.pop()
+            if enabled:
+                profile.disable()
+            self._record_memory(name, current_before, before)
+            if stack:
+                stack[-1][1] = self._enable(stack[-1][0])
+
+    def _record_memory(self, name, current_before, before):
+        delta = tracemalloc.get_traced_memory()[0] - current_before
+        top = None
+        if before is not None:
+            stats = tracemalloc.take_snapshot().compare_to(before, "lineno")
+            top = [str(stat) for stat in stats[:TOP_ALLOCATIONS]]
+        with self._lock:
+            memory = self._memory.setdefault(
+                name, {"calls": 0, "retained_bytes": 0, "top_allocations": []}
+            )
+            memory["calls"] += 1
+            memory["retained_bytes"] += delta
+            if top:
+                memory["top_allocations"].append(top)
+
+    def write(self) -> str:
+        """Writes <stage>.prof, <stage>.txt and memory.json to the run directory and returns it"""
+        os.makedirs(self.run_dir, exist_ok=True)
+        with self._lock:
+            by_stage = {}
+            for (name, _), profile in self._profiles.items():
+                by_stage.setdefault(name, []).append(profile)
+            memory = {name: dict(values) for name, values in self._memory.items()}
+
+        for name, profiles in by_stage.items():
+            stats = None
+            for profile in profiles:
+                try:
+                    if stats is None:
+                        stats = pstats.Stats(profile)
+                    else:
+                        stats.add(profile)
+                except TypeError:
+                    # The profile never ran (e.g. enable was refused)
+                    continue
+            if stats is None:
+                continue
+            file_name = _file_name(name)
+            stats.dump_stats(os.path.join(self.run_dir, f"{file_name}.prof"))
+            text = io.StringIO()
+            stats.stream = text
+            stats.sort_stats("cumulative").print_stats(40)
+            with open(os.path.join(self.run_dir, f"{file_name}.txt"), "w") as text_file:
+                text_file.write(text.getvalue())
+
+        snapshot = tracemalloc.take_snapshot()
+        memory["_run"] = {
+            "traced_bytes": tracemalloc.get_traced_memory()[0],
+            "peak_traced_bytes": tracemalloc.get_traced_memory()[1],
+            "top_allocations": [
+                [str(stat) for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]]
+            ],
+        }
+        with open(os.path.join(self.run_dir, "memory.json"), "w") as memory_file:
+            json.dump(memory, memory_file, indent=2)
+        return self.run_dir
+
+
+def _file_name(name: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in name)
+
+
+def profile_run_dir(base_dir: str, name: str) -> str:
+    """Returns a fresh run directory <base_dir>/<name>-<UTC timestamp>-<pid>"""
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    return os.path.join(base_dir, f"{name}-{timestamp}-{os.getpid()}")
@@ -0,0 +1,182 @@
+import hashlib
+import os
+import re
+import threading
+import time
+import urllib.request
+from collections import deque
+
+from rate_limiter import IDX_CALLS, IDX_PERIOD, AdaptiveRateController, SharedTokenBucket
+
+
+# Point it at a local stand-in server (benchmarks/stand_in_server.py) for load tests
+IDX_BASE_URL = os.getenv("IDX_BASE_URL", "https://www.idx.co.id").rstrip("/")
+
+# Weight of the newest sample in the latency and error EWMAs
+EWMA_ALPHA = 0.2
+# Endpoints failing more often than this are only used when every endpoint is that bad
+MAX_ERROR_SCORE = 0.8
+
+
+def parse_proxies(proxy) -> list:
+    """Parses the proxy setting into a list of proxy urls.
+
+    Args:
+        proxy (str | list | None): a proxy url, a comma/whitespace separated list of urls or a list
+
+    Returns:
+        list: proxy urls, [None] for a direct connection
+    """
+    if not proxy:
+        return [None]
+    if isinstance(proxy, str):
+        proxy = re.split(r"[,\s]+", proxy)
+    proxies = [p.strip() for p in proxy if p and p.strip()]
+    return proxies or [None]
+
+
+class LatencyWindow:
+    def __init__(self, size=200, min_samples=20):
+        """Rolling window of the latest request latencies.
+
+        Args:
+            size (int, optional): number of latencies kept. Defaults to 200.
+            min_samples (int, optional): samples needed before percentiles are reported. Defaults to 20.
+        """
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, latency: float):
+        with self._lock:
+            self._samples.append(latency)
+
+    def percentile(self, q: float):
+        """Returns the q-th percentile (0-100) of the window, None until there are enough samples"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * q / 100))]
+
+
+class ProxyEndpoint:
+    def __init__(self, proxy=None, calls=IDX_CALLS, period=IDX_PERIOD, bucket=None, controller=None):
+        """One proxy endpoint (or the direct connection) with its own rate budget and health stats.
+
+        Args:
+            proxy (str, optional): proxy url, None for a direct connection.
+            calls (int, optional): requests allowed per period through this endpoint.
+            period (float, optional): period in seconds.
+            bucket (SharedTokenBucket, optional): bucket to use instead of the endpoint's own.
+            controller (AdaptiveRateController, optional): controller to use instead of the endpoint's own.
+        """
+        self.proxy = proxy
+        # Never put the credentials of the proxy url in bucket names or logs
+        digest = hashlib.sha1(proxy.encode()).hexdigest()[:8] if proxy else "direct"
+        self.name = f"idx-{digest}"
+        self.bucket = bucket or SharedTokenBucket(self.name, calls=calls, period=period)
+        self.controller = controller or AdaptiveRateController(self.bucket)
+
+        if proxy:
+            self.proxies = {"http": proxy, "https": proxy}
+            self.opener = urllib.request.build_opener(
+                urllib.request.ProxyHandler(self.proxies)
+            )
+        else:
+            self.proxies = None
+            self.opener = urllib.request.build_opener()
+
+        self.latency_ewma = None
+        self.error_score = 0.0
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def score(self) -> float:
+        """Lower is healthier: expected latency inflated by the error rate"""
+        latency = self.latency_ewma if self.latency_ewma is not None else 1.0
+        return latency * (1 + 10 * self.error_score)
+
+    def record_success(self, latency: float):
+        with self._lock:
+            self.requests += 1
+            self.error_score = (1 - EWMA_ALPHA) * self.error_score
+            if self.latency_ewma is None:
+                self.latency_ewma = latency
+            else:
+                self.latency_ewma = (1 - EWMA_ALPHA) * self.latency_ewma + EWMA_ALPHA * latency
+        self.controller.record_success(latency)
+
+    def record_failure(self, reason: str, throttled=True):
+        """Records a failed request, `throttled` failures also cut the endpoint's rate"""
+        with self._lock:
+            self.requests += 1
+            self.error_score = (1 - EWMA_ALPHA) * self.error_score + EWMA_ALPHA
+        if throttled:
+            self.controller.record_failure(f"{reason} via {self.name}")
+
+    def metrics(self) -> dict:
+        return {
+            "endpoint": self.name,
+            "requests": self.requests,
+            "latency_ewma": self.latency_ewma,
+            "error_score": self.error_score,
+            **self.controller.metrics(),
+        }
+
+
+class ProxyPool:
+    def __init__(self, proxies=None, calls=IDX_CALLS, period=IDX_PERIOD, endpoints=None):
+        """Pool of proxy endpoints, each with its own rate budget.
+
+        Requests are routed to the healthiest endpoint that has budget left, so total
+        throughput grows with the number of proxies and a bad endpoint is avoided
+        instead of stalling the run.
+
+        Args:
+            proxies (str | list, optional): proxy urls, see parse_proxies. Defaults to a direct connection.
+            calls (int, optional): requests allowed per period for each endpoint.
+            period (float, optional): period in seconds.
+            endpoints (list, optional): prebuilt ProxyEndpoint objects, overrides proxies.
+        """
+        self.endpoints = endpoints or [
+            ProxyEndpoint(proxy, calls, period) for proxy in parse_proxies(proxies)
+        ]
+        self.latencies = LatencyWindow()
+
+    def _candidates(self, exclude=None) -> list:
+        endpoints = [e for e in self.endpoints if e is not exclude] or self.endpoints
+        healthy = [e for e in endpoints if e.error_score <= MAX_ERROR_SCORE]
+        return sorted(healthy or endpoints, key=lambda e: e.score())
+
+    def acquire(self, exclude=None) -> ProxyEndpoint:
+        """Blocks until an endpoint has budget and returns it, healthiest first.
+
+        Args:
+            exclude (ProxyEndpoint, optional): endpoint to avoid if another one is available.
+
+        Returns:
+            ProxyEndpoint: endpoint whose token has been taken
+        """
+        while True:
+            waits = []
+            for endpoint in self._candidates(exclude):
+                wait = endpoint.bucket.try_acquire()
+                if wait == 0:
+                    return endpoint
+                waits.append(wait)
+            time.sleep(min(waits))
+
+    def metrics(self) -> list:
+        return [endpoint.metrics() for endpoint in self.endpoints]
+
+
+_idx_pools = {}
+
+
+def get_proxy_pool(proxies=None) -> ProxyPool:
+    """Returns the process-wide pool for the given proxy setting"""
+    key = tuple(parse_proxies(proxies))
+    if key not in _idx_pools:
+        _idx_pools[key] = ProxyPool(list(key))
+    return _idx_pools[key]
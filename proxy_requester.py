@@ -0,0 +1,185 @@
+import logging
+import ssl
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+
+from circuit_breaker import CLOSED, get_breaker
+from proxy_pool import get_proxy_pool
+from rate_limiter import is_throttling_status
+from run_report import get_report
+from structured_logging import log_event
+
+LOGGER = logging.getLogger(__name__)
+
+# Timeout of a single IDX request, a hung request otherwise holds the whole run
+FETCH_TIMEOUT = 60
+
+
+class ProxyRequester:
+    def __init__(self, proxy=None, pool=None, hedge=False, timeout=FETCH_TIMEOUT, concurrency=1):
+        """Initializes the ProxyRequester class with the provided proxy
+
+        Args:
+            proxy (str | list, optional): the proxy or proxies to be used, comma separated or as a list. Defaults to None. Example: 'brd-customer-xxx-zone-xxx:xxx@brd.superproxy.io:xxx'
+            pool (ProxyPool, optional): proxy pool to route requests through. Defaults to the process-wide pool of `proxy`.
+            hedge (bool, optional): send a duplicate request through another proxy when a request runs past the rolling p95 latency. Defaults to False.
+            timeout (float, optional): timeout of a single request in seconds. Defaults to FETCH_TIMEOUT.
+            concurrency (int, optional): number of threads calling fetch_url at once, sizes the hedging threads. Defaults to 1.
+        """
+        # Set up SSL context to unverified
+        ssl._create_default_https_context = ssl._create_unverified_context
+        self.user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+        self.pool = pool or get_proxy_pool(proxy)
+        self.timeout = timeout
+        self.hedge = hedge
+        self.hedge_stats = {"hedged_requests": 0, "hedge_wins": 0}
+        self._stats_lock = threading.Lock()
+        self._executor = None
+        self.set_concurrency(concurrency)
+        self._local = threading.local()
+
+    def set_concurrency(self, concurrency: int):
+        """Sizes the hedging threads for `concurrency` threads calling fetch_url.
+
+        Each fetch can have its primary and its hedge in flight, so a smaller pool
+        would queue them behind each other. Call it before the fetch threads start.
+        """
+        if not self.hedge:
+            return
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self._executor = ThreadPoolExecutor(max_workers=2 * max(1, concurrency))
+
+    def report_throttled(self, reason):
+        """Reports a throttling sign found in a response body for the endpoint that served it"""
+        endpoint = getattr(self._local, "endpoint", None)
+        if endpoint is not None:
+            endpoint.record_failure(reason)
+
+    def _attempt(self, endpoint, url):
+        """Sends one request through the endpoint and records the outcome for the endpoint.
+
+        The circuit breaker is left to the caller, which records one outcome per
+        logical request even when it was hedged.
+
+        Returns:
+            tuple: (content or False, True if IDX answered without a throttling sign)
+        """
+        req = urllib.request.Request(
+            url,
+            headers={
+                "User-Agent": self.user_agent,
+                "Referer": "https://www.idx.co.id/en-us/listed-companies/company-profiles",
+                "Accept": "application/json, text/plain, */*",
+                "Accept-Language": "en-US,en;q=0.9",
+                "Connection": "keep-alive",
+            },
+        )
+        started = time.monotonic()
+        report = get_report()
+        report.increment("idx_requests")
+        try:
+            with report.stage("idx_network"), endpoint.opener.open(
+                req, timeout=self.timeout
+            ) as response:
+                content = response.read().decode()
+                report.increment("idx_response_bytes", len(content))
+                latency = time.monotonic() - started
+                endpoint.record_success(latency)
+                self.pool.latencies.add(latency)
+                log_event(
+                    LOGGER,
+                    logging.DEBUG,
+                    "idx_response",
+                    url=url,
+                    proxy=endpoint.name,
+                    length=len(content),
+                    latency=round(latency, 3),
+                )
+                return content, True
+        except urllib.error.HTTPError as e:
+            throttled = is_throttling_status(e.code)
+            if throttled:
+                endpoint.record_failure(f"HTTP {e.code}")
+            else:
+                # The endpoint answered, it is up
+                endpoint.record_success(time.monotonic() - started)
+            report.increment("idx_errors")
+            LOGGER.warning(f"Error fetching URL {url}: {e}")
+            return False, not throttled
+        except Exception as e:
+            # Timeouts, resets and proxy errors are treated as congestion as well
+            endpoint.record_failure(type(e).__name__)
+            report.increment("idx_errors")
+            LOGGER.warning(f"Error fetching URL {url}: {e}")
+            return False, False
+
+    def _hedged_attempt(self, endpoint, url, breaker):
+        """Returns (content or False, IDX answered, endpoint that served the content)"""
+        first = self._executor.submit(self._attempt, endpoint, url)
+        p95 = self.pool.latencies.percentile(95)
+        if p95 is None:
+            return (*first.result(), endpoint)
+
+        done, _ = wait([first], timeout=p95)
+        if done:
+            return (*first.result(), endpoint)
+
+        # Only a closed circuit is hedged, a duplicate would get around the single half-open
+        # probe. With a single proxy the duplicate would load the endpoint it should avoid.
+        if breaker.state != CLOSED or len(self.pool.endpoints) < 2:
+            return (*first.result(), endpoint)
+
+        # Past the p95: send a duplicate through another proxy, charged to its budget.
+        # The slower request is left to finish in the background and ignored.
+        hedge_endpoint = self.pool.acquire(exclude=endpoint)
+        with self._stats_lock:
+            self.hedge_stats["hedged_requests"] += 1
+        get_report().increment("idx_hedged_requests")
+        LOGGER.info(f"Hedging {url} via {hedge_endpoint.name} after {p95:.1f}s")
+        second = self._executor.submit(self._attempt, hedge_endpoint, url)
+        endpoints = {first: endpoint, second: hedge_endpoint}
+
+        answered = False
+        for future in as_completed(endpoints):
+            content, up = future.result()
+            answered = answered or up
+            if content is not False:
+                if future is second:
+                    with self._stats_lock:
+                        self.hedge_stats["hedge_wins"] += 1
+                return content, True, endpoints[future]
+        return False, answered, endpoint
+
+    def fetch_url(self, url):
+        # Fail fast without waiting for the rate limiter while the endpoint is down
+        breaker = get_breaker(url)
+        if not breaker.allow_request():
+            get_report().increment("idx_circuit_open_skips")
+            log_event(
+                LOGGER,
+                logging.DEBUG,
+                "idx_circuit_open_skip",
+                url=url,
+                retry_after=round(breaker.retry_after()),
+            )
+            return False
+
+        # Route through the healthiest proxy with budget left
+        with get_report().stage("idx_rate_limit_wait"):
+            endpoint = self.pool.acquire()
+        log_event(LOGGER, logging.DEBUG, "idx_fetch", url=url, proxy=endpoint.name)
+        if self.hedge and breaker.state == CLOSED:
+            content, up, endpoint = self._hedged_attempt(endpoint, url, breaker)
+        else:
+            content, up = self._attempt(endpoint, url)
+        # One outcome per logical request, a hedged request isn't counted twice
+        if up:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+        self._local.endpoint = endpoint
+        return content
@@ -0,0 +1,285 @@
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import closing
+
+
+# IDX budget shared by every process on the host, 2 requests per 4 seconds to start with.
+# Can be raised for load tests against a local stand-in server.
+IDX_CALLS = int(os.getenv("IDX_RATE_CALLS", 2))
+IDX_PERIOD = float(os.getenv("IDX_RATE_PERIOD", 4))
+# Ceiling of the adaptive rate in requests/second. The budget above is only the
+# starting rate, healthy responses raise it by 0.02 req/s each up to this ceiling
+# and every throttling signal halves it.
+IDX_MAX_RATE = float(os.getenv("IDX_MAX_RATE", 2.0))
+DEFAULT_LIMITER_PATH = os.getenv(
+    "IDX_RATE_LIMITER_PATH", os.path.join(tempfile.gettempdir(), "idx_rate_limiter.db")
+)
+
+
+class SharedTokenBucket:
+    def __init__(
+        self, name="idx", calls=IDX_CALLS, period=IDX_PERIOD, path=DEFAULT_LIMITER_PATH
+    ):
+        """Token bucket shared across processes on one host through a SQLite file.
+
+        The bucket state (tokens left and last refill time) lives in a row of the
+        SQLite file, and every acquire refills and takes tokens inside a
+        BEGIN IMMEDIATE transaction, so all workers together never go above
+        `calls` requests per `period` seconds.
+
+        Args:
+            name (str, optional): bucket name, one per endpoint/budget. Defaults to "idx".
+            calls (int, optional): number of requests allowed per period, also the burst size.
+            period (float, optional): period in seconds.
+            path (str, optional): path of the SQLite file. Defaults to a file in the temp directory.
+        """
+        self.name = name
+        self.path = path
+        self.capacity = float(calls)
+
+        # closing: the connection's own context manager only commits
+        with closing(self._connect()) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS buckets (
+                    name TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    rate REAL NOT NULL,
+                    capacity REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    last_decrease REAL NOT NULL DEFAULT 0
+                )
+                """
+            )
+            # Files created before the decrease cooldown was shared
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(buckets)")]
+            if "last_decrease" not in columns:
+                conn.execute(
+                    "ALTER TABLE buckets ADD COLUMN last_decrease REAL NOT NULL DEFAULT 0"
+                )
+            # Keep the rate of an existing bucket, it may have been tuned by
+            # the adaptive controller of another process
+            conn.execute(
+                """
+                INSERT INTO buckets (name, tokens, rate, capacity, updated_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET capacity = excluded.capacity
+                """,
+                (self.name, self.capacity, calls / period, self.capacity, time.time()),
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=60, isolation_level=None)
+
+    def set_rate(self, rate: float):
+        """Sets the refill rate (requests per second) seen by every process"""
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE buckets SET rate = ? WHERE name = ?", (rate, self.name)
+            )
+        finally:
+            conn.close()
+
+    def adjust_rate(self, add=0.0, multiply=1.0, min_rate=None, max_rate=None) -> float:
+        """Atomically changes the rate to (rate * multiply + add), clamped to [min_rate, max_rate].
+
+        Returns:
+            float: the new rate
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            rate = conn.execute(
+                "SELECT rate FROM buckets WHERE name = ?", (self.name,)
+            ).fetchone()[0]
+            rate = rate * multiply + add
+            if min_rate is not None:
+                rate = max(min_rate, rate)
+            if max_rate is not None:
+                rate = min(max_rate, rate)
+            conn.execute(
+                "UPDATE buckets SET rate = ? WHERE name = ?", (rate, self.name)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return rate
+
+    def decrease_rate(self, multiply, cooldown, min_rate=None, max_rate=None):
+        """Atomically multiplies the rate unless any process already cut it in the last `cooldown` seconds.
+
+        Returns:
+            float: the new rate, or None when the cut was skipped
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            rate, last_decrease = conn.execute(
+                "SELECT rate, last_decrease FROM buckets WHERE name = ?", (self.name,)
+            ).fetchone()
+            now = time.time()
+            if now - last_decrease < cooldown:
+                conn.execute("COMMIT")
+                return None
+            rate = rate * multiply
+            if min_rate is not None:
+                rate = max(min_rate, rate)
+            if max_rate is not None:
+                rate = min(max_rate, rate)
+            conn.execute(
+                "UPDATE buckets SET rate = ?, last_decrease = ? WHERE name = ?",
+                (rate, now, self.name),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return rate
+
+    @property
+    def rate(self) -> float:
+        """Current refill rate in requests per second"""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT rate FROM buckets WHERE name = ?", (self.name,)
+            ).fetchone()
+        finally:
+            conn.close()
+        return row[0]
+
+    def try_acquire(self, tokens=1) -> float:
+        """Takes tokens if available.
+
+        Args:
+            tokens (int, optional): number of tokens to take. Defaults to 1.
+
+        Returns:
+            float: 0 if the tokens were taken, otherwise the seconds to wait before trying again
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            current, rate, capacity, updated_at = conn.execute(
+                "SELECT tokens, rate, capacity, updated_at FROM buckets WHERE name = ?",
+                (self.name,),
+            ).fetchone()
+            now = time.time()
+            current = min(capacity, current + max(0.0, now - updated_at) * rate)
+
+            wait = 0.0
+            if current >= tokens:
+                current -= tokens
+            else:
+                wait = (tokens - current) / rate
+
+            conn.execute(
+                "UPDATE buckets SET tokens = ?, updated_at = ? WHERE name = ?",
+                (current, now, self.name),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return wait
+
+    def acquire(self, tokens=1) -> float:
+        """Blocks until the tokens are taken.
+
+        Returns:
+            float: seconds spent waiting
+        """
+        started = time.monotonic()
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0:
+                return time.monotonic() - started
+            time.sleep(wait)
+
+
+class AdaptiveRateController:
+    def __init__(
+        self,
+        bucket: SharedTokenBucket,
+        min_rate=0.1,
+        max_rate=IDX_MAX_RATE,
+        increase=0.02,
+        decrease=0.5,
+        slow_latency=10.0,
+        cooldown=10.0,
+    ):
+        """AIMD controller for the rate of a shared token bucket.
+
+        Every healthy response raises the rate by `increase` requests/second, every
+        throttling signal (403/429/5xx, timeout, empty profile) multiplies it by
+        `decrease`. The rate is stored in the bucket so every process follows it.
+
+        Args:
+            bucket (SharedTokenBucket): bucket whose rate is controlled.
+            min_rate (float, optional): lowest rate in requests/second. Defaults to 0.1.
+            max_rate (float, optional): highest rate in requests/second. Defaults to IDX_MAX_RATE (2.0).
+            increase (float, optional): additive increase per healthy response. Defaults to 0.02.
+            decrease (float, optional): multiplicative decrease factor. Defaults to 0.5.
+            slow_latency (float, optional): responses slower than this (seconds) don't raise the rate. Defaults to 10.
+            cooldown (float, optional): minimum seconds between two decreases, so one burst of failures only cuts once.
+                Kept in the bucket, so it holds across the processes sharing it. Defaults to 10.
+        """
+        self.bucket = bucket
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.slow_latency = slow_latency
+        self.cooldown = cooldown
+
+        self.current_rate = bucket.rate
+        self.successes = 0
+        self.failures = 0
+        self.decreases = 0
+
+    def record_success(self, latency: float):
+        """Records a healthy response and raises the rate additively"""
+        self.successes += 1
+        if latency > self.slow_latency:
+            return
+        self.current_rate = self.bucket.adjust_rate(
+            add=self.increase, min_rate=self.min_rate, max_rate=self.max_rate
+        )
+
+    def record_failure(self, reason: str):
+        """Records a throttling signal and cuts the rate multiplicatively"""
+        self.failures += 1
+        rate = self.bucket.decrease_rate(
+            self.decrease, self.cooldown, min_rate=self.min_rate, max_rate=self.max_rate
+        )
+        if rate is None:
+            return
+        self.decreases += 1
+        self.current_rate = rate
+        logging.info(
+            f"IDX rate cut to {self.current_rate:.3f} req/s after {reason}"
+        )
+
+    def metrics(self) -> dict:
+        """Returns the current rate and the response counters"""
+        return {
+            "idx_request_rate": self.current_rate,
+            "idx_healthy_responses": self.successes,
+            "idx_throttled_responses": self.failures,
+            "idx_rate_decreases": self.decreases,
+        }
+
+
+def is_throttling_status(status_code) -> bool:
+    """True for HTTP statuses that mean IDX (or the proxy) wants us to slow down"""
+    return status_code in (403, 429) or (status_code is not None and status_code >= 500)
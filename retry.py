@@ -0,0 +1,45 @@
+import random
+
+
+# Backoff of the n-th retry is drawn from [d/2, d] with d = BASE_DELAY * 2^(n-1), capped at MAX_DELAY
+BASE_DELAY = 5.0
+MAX_DELAY = 300.0
+
+
+class PermanentError(Exception):
+    """Failure that retrying won't fix, e.g. IDX answering ResultCount == 0 for a symbol"""
+
+
+class TransientError(Exception):
+    """Failure that may succeed later, e.g. a throttled or empty response"""
+
+
+def is_permanent(error: Exception) -> bool:
+    """Classifies an error raised while scraping a symbol.
+
+    Args:
+        error (Exception): the raised error
+
+    Returns:
+        bool: True if the symbol should not be retried
+    """
+    if isinstance(error, PermanentError):
+        return True
+    response = getattr(error, "response", None)
+    status_code = getattr(error, "code", None) or getattr(response, "status_code", None)
+    return status_code == 404
+
+
+def backoff_delay(attempt: int, base=BASE_DELAY, cap=MAX_DELAY) -> float:
+    """Returns the delay before the given retry, exponential with jitter.
+
+    Args:
+        attempt (int): the attempt that just failed, starting at 1
+        base (float, optional): delay of the first retry. Defaults to BASE_DELAY.
+        cap (float, optional): maximum delay. Defaults to MAX_DELAY.
+
+    Returns:
+        float: delay in seconds
+    """
+    delay = min(cap, base * 2 ** (attempt - 1))
+    return random.uniform(delay / 2, delay)
@@ -0,0 +1,172 @@
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+
+from profiler import StageProfiler, profile_run_dir
+
+
+class RunReport:
+    def __init__(self, name="run"):
+        """Collects stage timings, counters and gauges of one run.
+
+        Stages accumulate wall and CPU time over every call, counters hold request
+        counts, bytes, retries and cache hits/misses. The report is written as JSON
+        and optionally as a Prometheus textfile (node_exporter textfile collector).
+
+        Args:
+            name (str, optional): name of the job, used as a label and prefix. Defaults to "run".
+        """
+        self.name = name
+        self.started_at = datetime.now(timezone.utc)
+        self._started = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+        self.gauges = {}
+        self.profiler = None
+        self._lock = threading.Lock()
+
+    def enable_profiling(self, base_dir="profiles") -> StageProfiler:
+        """Profiles every stage from now on, see profiler.StageProfiler.
+
+        Args:
+            base_dir (str, optional): directory the run directory is created in. Defaults to "profiles".
+
+        Returns:
+            StageProfiler: the profiler, call write() at the end of the run
+        """
+        self.profiler = StageProfiler(profile_run_dir(base_dir, self.name))
+        return self.profiler
+
+    @contextmanager
+    def stage(self, name: str):
+        """Context manager timing a pipeline stage, nested stages are timed separately"""
+        profiled = self.profiler.stage(name) if self.profiler else nullcontext()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            with profiled:
+                yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            with self._lock:
+                stage = self.stages.setdefault(
+                    name, {"calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0}
+                )
+                stage["calls"] += 1
+                stage["wall_seconds"] += wall
+                stage["cpu_seconds"] += cpu
+
+    def increment(self, counter: str, value=1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def set_gauge(self, gauge: str, value):
+        with self._lock:
+            self.gauges[gauge] = value
+
+    def set_gauges(self, gauges: dict, prefix=""):
+        """Sets several gauges at once, e.g. the metrics of a proxy endpoint"""
+        for gauge, value in gauges.items():
+            self.set_gauge(f"{prefix}{gauge}", value)
+
+    def merge(self, other: dict):
+        """Adds the stages and counters of another report's to_dict(), e.g. from a worker process"""
+        with self._lock:
+            for name, other_stage in other.get("stages", {}).items():
+                stage = self.stages.setdefault(
+                    name, {"calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0}
+                )
+                for key in stage:
+                    stage[key] += other_stage.get(key, 0)
+            for counter, value in other.get("counters", {}).items():
+                self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def hit_rate(self, cache: str):
+        """Returns hits / (hits + misses) of a cache counted as <cache>_hits and <cache>_misses"""
+        hits = self.counters.get(f"{cache}_hits", 0)
+        misses = self.counters.get(f"{cache}_misses", 0)
+        return hits / (hits + misses) if hits + misses else None
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            caches = {
+                counter[: -len("_hits")]
+                for counter in self.counters
+                if counter.endswith("_hits")
+            }
+            report = {
+                "name": self.name,
+                "started_at": self.started_at.isoformat(),
+                "wall_seconds": time.perf_counter() - self._started,
+                "stages": {name: dict(stage) for name, stage in self.stages.items()},
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+            }
+        report["cache_hit_rates"] = {cache: self.hit_rate(cache) for cache in caches}
+        return report
+
+    def write_json(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as report_file:
+            json.dump(self.to_dict(), report_file, indent=2, default=str)
+
+    def write_prometheus(self, path: str):
+        """Writes the report in the Prometheus text exposition format"""
+        report = self.to_dict()
+        prefix = "idx_" + _metric_name(self.name)
+        lines = [
+            f"# TYPE {prefix}_wall_seconds gauge",
+            f"{prefix}_wall_seconds {report['wall_seconds']:.6f}",
+            f"# TYPE {prefix}_stage_wall_seconds gauge",
+        ]
+        for stage, values in report["stages"].items():
+            lines.append(
+                f'{prefix}_stage_wall_seconds{{stage="{stage}"}} {values["wall_seconds"]:.6f}'
+            )
+        lines.append(f"# TYPE {prefix}_stage_cpu_seconds gauge")
+        for stage, values in report["stages"].items():
+            lines.append(
+                f'{prefix}_stage_cpu_seconds{{stage="{stage}"}} {values["cpu_seconds"]:.6f}'
+            )
+        lines.append(f"# TYPE {prefix}_stage_calls gauge")
+        for stage, values in report["stages"].items():
+            lines.append(f'{prefix}_stage_calls{{stage="{stage}"}} {values["calls"]}')
+        for counter, value in report["counters"].items():
+            metric = f"{prefix}_{_metric_name(counter)}_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        for gauge, value in report["gauges"].items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                metric = f"{prefix}_{_metric_name(gauge)}"
+                lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+
+        # Write then rename so the collector never reads a half written file
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as prom_file:
+            prom_file.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+
+def _metric_name(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name).lower()
+
+
+_report = RunReport()
+
+
+def get_report() -> RunReport:
+    """Returns the process-wide run report"""
+    return _report
+
+
+def start_report(name: str) -> RunReport:
+    """Starts a new process-wide run report for the given job"""
+    global _report
+    _report = RunReport(name)
+    return _report
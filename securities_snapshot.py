@@ -0,0 +1,166 @@
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from proxy_pool import IDX_BASE_URL
+from run_report import get_report
+
+
+DEFAULT_SNAPSHOT_PATH = os.getenv(
+    "IDX_SNAPSHOT_PATH", os.path.join(os.getcwd(), "data", "securities_snapshot.json")
+)
+# One download a day serves every job
+DEFAULT_SNAPSHOT_TTL = float(os.getenv("IDX_SNAPSHOT_TTL", 24 * 60 * 60))
+# Fewer active securities means IDX is blocking us or the API changed, such a
+# download must not replace the snapshot (every missing symbol would look delisted)
+MIN_ACTIVE_SECURITIES = int(os.getenv("IDX_MIN_ACTIVE_SECURITIES", 800))
+
+SECURITIES_URL = f"{IDX_BASE_URL}/primary/StockData/GetSecuritiesStock?start=0&length=9999&code=&sector=&board=&language=en-us"
+
+
+def diff_securities(old: dict, new: dict) -> dict:
+    """Compares two {symbol: name} maps.
+
+    Args:
+        old (dict): securities of the previous snapshot
+        new (dict): securities of the current snapshot
+
+    Returns:
+        dict: sorted "added" and "removed" symbols and "renamed" as {symbol: [old name, new name]}
+    """
+    old_symbols, new_symbols = set(old), set(new)
+    return {
+        "added": sorted(new_symbols - old_symbols),
+        "removed": sorted(old_symbols - new_symbols),
+        "renamed": {
+            symbol: [old[symbol], new[symbol]]
+            for symbol in sorted(old_symbols & new_symbols)
+            if old[symbol] != new[symbol]
+        },
+    }
+
+
+class SecuritiesSnapshot:
+    def __init__(self, securities: dict, fetched_at: float, diff=None, previous_fetched_at=None):
+        """Active IDX securities as downloaded from GetSecuritiesStock at one point in time.
+
+        Args:
+            securities (dict): {symbol with .JK suffix: company name}
+            fetched_at (float): unix time of the download
+            diff (dict, optional): diff_securities against the previous snapshot. Defaults to None (first snapshot).
+            previous_fetched_at (float, optional): unix time of the previous snapshot. Defaults to None.
+        """
+        self.securities = securities
+        self.fetched_at = fetched_at
+        self.diff = diff or {"added": [], "removed": [], "renamed": {}}
+        self.previous_fetched_at = previous_fetched_at
+
+    @property
+    def symbols(self) -> set:
+        return set(self.securities)
+
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+    def is_fresh(self, ttl=DEFAULT_SNAPSHOT_TTL) -> bool:
+        return self.age() < ttl
+
+    def to_dict(self) -> dict:
+        return {
+            "fetched_at": self.fetched_at,
+            "fetched_at_iso": datetime.fromtimestamp(self.fetched_at, timezone.utc).isoformat(),
+            "previous_fetched_at": self.previous_fetched_at,
+            "diff": self.diff,
+            "securities": self.securities,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SecuritiesSnapshot":
+        return cls(
+            data["securities"],
+            data["fetched_at"],
+            data.get("diff"),
+            data.get("previous_fetched_at"),
+        )
+
+
+def load_snapshot(path=DEFAULT_SNAPSHOT_PATH):
+    """Returns the persisted snapshot, or None when there is none or it can't be read"""
+    try:
+        with open(path) as snapshot_file:
+            return SecuritiesSnapshot.from_dict(json.load(snapshot_file))
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def save_snapshot(snapshot: SecuritiesSnapshot, path=DEFAULT_SNAPSHOT_PATH):
+    """Writes the snapshot atomically, a job reading it never sees a partial file"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as temp_file:
+            json.dump(snapshot.to_dict(), temp_file, indent=2, sort_keys=True)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def fetch_securities(requester) -> dict:
+    """Downloads the active securities as {symbol with .JK suffix: company name}
+
+    Args:
+        requester (ProxyRequester): requester used for the IDX call
+
+    Returns:
+        dict: active securities
+    """
+    response = requester.fetch_url(SECURITIES_URL)
+    if response == False:
+        raise Exception("Error retrieving active symbols from IDX json.")
+    data = json.loads(response)["data"]
+    return {index["Code"] + ".JK": index["Name"] for index in data}
+
+
+def get_securities_snapshot(
+    requester, path=DEFAULT_SNAPSHOT_PATH, ttl=DEFAULT_SNAPSHOT_TTL, refresh=False
+) -> SecuritiesSnapshot:
+    """Returns the persisted snapshot while it is younger than `ttl`, otherwise downloads a new one.
+
+    A new snapshot stores its diff against the one it replaces, so every job
+    reading it during the day sees the same added, removed and renamed symbols.
+
+    Args:
+        requester (ProxyRequester): requester used when a download is needed
+        path (str, optional): snapshot file. Defaults to data/securities_snapshot.json (IDX_SNAPSHOT_PATH).
+        ttl (float, optional): maximum age in seconds of a reused snapshot. Defaults to one day (IDX_SNAPSHOT_TTL).
+        refresh (bool, optional): download even if the persisted snapshot is fresh. Defaults to False.
+
+    Returns:
+        SecuritiesSnapshot: the current snapshot
+    """
+    report = get_report()
+    previous = load_snapshot(path)
+    if previous is not None and not refresh and previous.is_fresh(ttl):
+        report.increment("securities_snapshot_hits")
+        return previous
+
+    report.increment("securities_snapshot_misses")
+    with report.stage("retrieve_active_symbols"):
+        securities = fetch_securities(requester)
+    if len(securities) < MIN_ACTIVE_SECURITIES:
+        raise Exception(
+            f"Suspicously low number of active symbols retrieved ({len(securities)}). IDX might be blocking us or API changed. Keeping the previous snapshot."
+        )
+
+    snapshot = SecuritiesSnapshot(
+        securities,
+        time.time(),
+        diff_securities(previous.securities, securities) if previous else None,
+        previous.fetched_at if previous else None,
+    )
+    save_snapshot(snapshot, path)
+    return snapshot
@@ -1,9 +1,19 @@
 from dotenv     import load_dotenv
 from supabase   import create_client
 from fuzzywuzzy import process
-from importlib  import reload
 from random     import choice
-
+from circuit_breaker import CircuitOpenError, get_breaker
+from retry import PermanentError, TransientError, backoff_delay, is_permanent
+from proxy_pool import IDX_BASE_URL, get_proxy_pool
+from proxy_requester import ProxyRequester
+from securities_snapshot import get_securities_snapshot
+from rate_limiter import is_throttling_status
+from run_report import get_report, start_report
+from structured_logging import log_event, setup_logging, stop_logging
+from work_queue import WorkQueue, DEFAULT_QUEUE_PATH, DEFAULT_LEASE_SECONDS, default_worker_id
+
+import argparse
+import multiprocessing
 import urllib.request
 import os
 import time
@@ -43,11 +53,6 @@ PROXY_URL = os.getenv("proxy")
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY') 
 
-PROXIES = {
-    'http': PROXY_URL,
-    'https': PROXY_URL,
-}
-
 TRUTH_DICT = {False:'No', True:'Yes'}
 SHAREHOLDERS_RENAMING = {
             'Nama':'name',
@@ -60,21 +65,25 @@ SHAREHOLDERS_RENAMING = {
         }
 
 MAX_ATTEMPT = 3
-SLEEP = 1.5
+FETCH_TIMEOUT = 60
+# Stop the run once the IDX circuit has opened this many times, the queue keeps the remaining work
+MAX_CIRCUIT_TRIPS = 2
+PROFILE_URL = f"{IDX_BASE_URL}/primary/ListedCompany/GetCompanyProfilesDetail"
 CWD = os.getcwd()
 DATA_DIR = os.path.join(CWD, "data")
+LOG_FILENAME = 'scrapper.log'
+LOGGER = logging.getLogger(__name__)
 
 
 def initiate_logging(LOG_FILENAME):
-    reload(logging)
-
-    formatLOG = '%(asctime)s - %(levelname)s: %(message)s'
-    logging.basicConfig(filename=LOG_FILENAME,level=logging.INFO, format=formatLOG)
+    # Leveled, json by default and written by a background thread, see structured_logging.py
+    setup_logging(LOG_FILENAME)
     logging.info('The shareholders data scraper program started')
 
 
 def get_management_data(supabase,symbol):
-    id_data = supabase.table("idx_active_company_profile").select("symbol",'directors','comissioners').eq("symbol", symbol).execute()
+    with get_report().stage("db_read_management"):
+      id_data = supabase.table("idx_active_company_profile").select("symbol",'directors','comissioners').eq("symbol", symbol).execute()
     id_data = pd.DataFrame(id_data.data)
 
     # Handling for further stringified json
@@ -86,17 +95,44 @@ def get_management_data(supabase,symbol):
 
 
 def fetch_url_proxy(url):
-  response = requests.get(url, proxies=PROXIES, verify=False)   
+  # Raises CircuitOpenError right away while the endpoint is down
+  breaker = get_breaker(url)
+  breaker.before_request()
+
+  report = get_report()
+  # PROXY_URL may hold several comma separated proxies, each with its own budget
+  with report.stage("idx_rate_limit_wait"):
+    endpoint = get_proxy_pool(PROXY_URL).acquire()
+  report.increment("idx_requests")
+  try:
+    with report.stage("idx_network"):
+      response = requests.get(url, proxies=endpoint.proxies, verify=False, timeout=FETCH_TIMEOUT)
+  except requests.exceptions.RequestException as e:
+    endpoint.record_failure(type(e).__name__)
+    breaker.record_failure()
+    report.increment("idx_errors")
+    raise
+  report.increment("idx_response_bytes", len(response.content))
   status_code = response.status_code
   if (status_code == 200):
+    endpoint.record_success(response.elapsed.total_seconds())
+    breaker.record_success()
     data = response.json()
     return data
   else:
-    print(f"Failed to fetch from {url}. Get status code : {status_code}")
+    if is_throttling_status(status_code):
+      endpoint.record_failure(f"HTTP {status_code}")
+      breaker.record_failure()
+    else:
+      endpoint.record_success(response.elapsed.total_seconds())
+      breaker.record_success()
+    report.increment("idx_errors")
+    logging.warning(f"Failed to fetch from {url}. Get status code : {status_code}")
     return None
 
 
 def fetch_url(url):
+  get_proxy_pool().acquire()
   req = urllib.request.Request(url, headers=HEADERS)
   resp = urllib.request.urlopen(req)
   status_code = resp.getcode()
@@ -105,7 +141,7 @@ def fetch_url(url):
     json_data = json.loads(data)
     return json_data
   else:
-    print(f"Failed to fetch from {url}. Get status code : {status_code}")
+    logging.warning(f"Failed to fetch from {url}. Get status code : {status_code}")
     return None
 
 
@@ -195,325 +231,326 @@ def clean_company_name(company_name: str) -> str:
 def get_new_shareholders_data(symbol, supabase, 
                               ticker_map_standardized: dict, 
                               ticker_map_original: dict):    
-    url = f"https://www.idx.co.id/primary/ListedCompany/GetCompanyProfilesDetail?KodeEmiten={symbol}&language=en-us"
+    url = f"{PROFILE_URL}?KodeEmiten={symbol}&language=en-us"
     # data = fetch_url(url)
     data = fetch_url_proxy(url)
-    
+
+    if (data is None):
+      raise TransientError(f"No response from IDX for {symbol}")
+
     if (data['ResultCount'] == 0):
-      # Case: ResultCount == 0
-      return None, None, None
+      # Case: ResultCount == 0, IDX has no profile for this symbol, retrying won't help
+      raise PermanentError(f"ResultCount == 0 for {symbol}")
     
-    else:
-      # Shareholders Data
-      shareholders_data = data['PemegangSaham']
-      processed_shareholders = []
-
-      company_name_choices = list(ticker_map_original.keys())
-
-      for shareholder_data in shareholders_data:
-        record = {}
-        # Loop dict and check for standardize format
-        for key, value in shareholder_data.items():
-          if key == 'Pengendali':
-            continue 
-          if isinstance(value, str):
-            if key == "Nama" :
-                if "pt" in value.strip().lower():
-                  record[key] = clean_company_name(value.strip())  
-                else:
-                  record[key] = value.strip().title()
+    management_df = get_management_data(supabase, f"{symbol}.JK")
+    return process_shareholders_payload(
+      symbol, data, management_df, ticker_map_standardized, ticker_map_original
+    )
+
+
+def process_shareholders_payload(symbol, data: dict, management_df: pd.DataFrame,
+                                 ticker_map_standardized: dict,
+                                 ticker_map_original: dict):
+  """
+  Cleans the shareholders, directors and commissioners of a GetCompanyProfilesDetail response.
+  Doesn't send any request, so it can be run offline on recorded payloads.
+
+  Args:
+      symbol (str): IDX code without the .JK suffix
+      data (dict): parsed GetCompanyProfilesDetail response with ResultCount > 0
+      management_df (pd.DataFrame): name/position rows of the company's management
+      ticker_map_standardized (dict): standardized company name to symbol map
+      ticker_map_original (dict): original company name to symbol map
+
+  Returns:
+      tuple: (shareholders_df, directors_df, commissioners_df, share_amount_need_fix, share_percentage_need_fix)
+  """
+  # Shareholders Data
+  shareholders_data = data['PemegangSaham']
+  processed_shareholders = []
+
+  company_name_choices = list(ticker_map_original.keys())
+
+  for shareholder_data in shareholders_data:
+    record = {}
+    # Loop dict and check for standardize format
+    for key, value in shareholder_data.items():
+      if key == 'Pengendali':
+        continue 
+      if isinstance(value, str):
+        if key == "Nama" :
+            if "pt" in value.strip().lower():
+              record[key] = clean_company_name(value.strip())  
             else:
-                record[key] = value.strip().title()
-          else:
-              record[key] = value
+              record[key] = value.strip().title()
+        else:
+            record[key] = value.strip().title()
+      else:
+          record[key] = value
 
-        # Get the shareholder's name for the lookup
-        shareholder_name = record.get('Nama', '')
+    # Get the shareholder's name for the lookup
+    shareholder_name = record.get('Nama', '')
 
-        # Check matching ticker
-        cleaned_shareholder_key = standardize_name_for_matching(shareholder_name)
-        found_ticker = ticker_map_standardized.get(cleaned_shareholder_key, None)
-        print(f"found symbol: {found_ticker}")
+    # Check matching ticker
+    cleaned_shareholder_key = standardize_name_for_matching(shareholder_name)
+    found_ticker = ticker_map_standardized.get(cleaned_shareholder_key, None)
+    log_event(LOGGER, logging.DEBUG, "ticker_match", name=shareholder_name, key=cleaned_shareholder_key, ticker=found_ticker)
 
-        if found_ticker:
-           record['symbol'] = found_ticker
-        
-        # Check ticker with fuzzy
-        if not found_ticker and 'tbk' in shareholder_name.lower():
-          best_match = process.extractOne(shareholder_name, company_name_choices)
-          print(f"best match fuzzy: {best_match}")
-          if best_match and best_match[1] >= 90:
-              matched_name = best_match[0]
-              found_ticker = ticker_map_original[matched_name]
-              record['symbol'] = found_ticker
-           
-        processed_shareholders.append(record)
-      
-      shareholders = _clean_dict(processed_shareholders)
-      shareholders_df = pd.DataFrame(shareholders)
-
-      name_mapping = {'Saham Treasury'        : 'Treasury Stock',
-                      'Pengendali Saham'      : 'Controlling Shareholder',
-                      'Non Pengendali Saham'  : 'Non Controlling Shareholder',
-                      'Masyarakat Lainnya (Lx International ( Spore) Pte, Ltd' : "Public (Foreign)",
-                      'Masyarakat Pemodal Asing'    : "Public (Foreign)",
-                      'Masyarakat Pemodal Nasional' : "Public",
-                      'Masyarakat Warkat'           : 'Public',
-                      'Masyarakat Non Warkat'       : 'Public',
-                      'Masyarakat Umum'             : 'Public',
-                      'Masyarakat Dengan Kepemilikan Masing-Masing Kurang Dari 5 Persen' : "Public",
-                      "Masyarakat (Masing-Masing)"  : "Public",
-                      "Masyarakat (Publik)"         : "Public",
-                      "Masyarakat Dibawah 5 %"      : "Public",
-                      'Masyarakat': 'Public',
-                      'MASYARAKAT': 'Public',
-                      'Publik': 'Public',
-                      'PUBLIK': 'Public',
-                      'Masyarakat Lainnya': 'Other Public',
-                      'Negara Republik Indonesia': 'Republic of Indonesia',
-                      'NEGARA REPUBLIK INDONESIA': 'Republic of Indonesia',
-                      'Pemerintah Negara Republik Indonesia' : 'Republic of Indonesia',
-                      'Pemerintah Ri' : 'Republic of Indonesia',
-                      'Kejaksaan Agung': 'Attorney General',
-                      'KEJAKSAAN AGUNG': 'Attorney General',
-                      'Biro klasifikasi indonesia, pt.': 'Pt Biro Klasifikasi Indonesia',
-                      'Pt Biro Klasifikasi Indonesia Persero Tbk': 'Pt Biro Klasifikasi Indonesia',
-                      'Direksi': 'Director',
-                      'AFILIASI PENGENDALI':'Controlling Affiliate',
-                      'Pihak Afiliasi ':'Affiliate Parties',
-                      'Pihak Afilasi':'Affiliate Parties',
-                      'Pt. Asabri (Persero)':'Pt Asabri (Persero)',
-                      'Asabri (Persero),Pt':'Pt Asabri (Persero)',
-                      'Pt Asabri (Persero) Dapen Polri':'Pt Asabri (Persero)',
-                      'Pt Asabri':'Pt Asabri (Persero)',
-                      'Pt Asabri - Dapen':'Pt Asabri (Persero)',
-                      'Pt Asabri (Persero) - Dapen Tni':'Pt Asabri (Persero)',
-                      'Pt Danantara Asset Management (Persero)':'Pt Danantara Asset Management',
-                      'Pt Danantara Aset Manajemen (Persero)':'Pt Danantara Asset Management',
-                      '0': np.nan,
-                      '-': np.nan,
-                      '': np.nan}
-      shareholders_df = shareholders_df.replace({'name': name_mapping})
-
-      shareholders_df["share_amount"] = shareholders_df["share_amount"].apply(lambda x: int(float(x)))
-      shareholders_df["share_percentage"] = shareholders_df["share_percentage"].astype('float')
-
-      share_amount_need_fix = False 
-      share_percentage_need_fix = False 
-
-      valid_references = shareholders_df[(shareholders_df['share_amount'] > 0) & (shareholders_df['share_percentage'] > 0)]
-
-      if not valid_references.empty:
-        reference_row = shareholders_df.loc[shareholders_df['share_percentage'].idxmax()]
-        if reference_row['share_percentage'] > 0:
-          total_company_shares = reference_row['share_amount'] / (reference_row['share_percentage'] / 100)
-
-          # Fixing rows with 0 share_amount but have share_percentage > 0
-          rows_to_fix_amount = shareholders_df[
-            (shareholders_df['share_amount'] == 0) & 
-            (shareholders_df['share_percentage'] > 0)
-          ]
-          if not rows_to_fix_amount.empty:
-            logging.info(f"Fixing {len(rows_to_fix_amount)} row(s) with missing share amount for {symbol}")
-
-            share_amount_need_fix = True 
-            for index, row in rows_to_fix_amount.iterrows():
-              calculated_amount = total_company_shares * (row['share_percentage'] / 100)
-              shareholders_df.loc[index, 'share_amount'] = calculated_amount
-
-          # Fixing rows with share_amount > 0 but have 0 share_percentage
-          rows_to_fix_percentage = shareholders_df[
-              (shareholders_df['share_amount'] > 0) & 
-              (shareholders_df['share_percentage'] == 0)
-          ]
-          if not rows_to_fix_percentage.empty: 
-            logging.info(f"Fixing {len(rows_to_fix_percentage)} row(s) with missing share percentage for {symbol}")
-
-            share_percentage_need_fix = True  
-            for index, row in rows_to_fix_percentage.iterrows():
-              calculated_percentage = (row['share_amount'] / total_company_shares) * 100
-              shareholders_df.loc[index, 'share_percentage'] = calculated_percentage
-      
-      # Filter out rows with 0 share_amount and 0 share_percentage
-      shareholders_df = shareholders_df[
-         (shareholders_df.share_amount > 0) & 
-         (shareholders_df.share_percentage > 0)
+    if found_ticker:
+       record['symbol'] = found_ticker
+    
+    # Check ticker with fuzzy
+    if not found_ticker and 'tbk' in shareholder_name.lower():
+      best_match = process.extractOne(shareholder_name, company_name_choices)
+      log_event(LOGGER, logging.DEBUG, "ticker_fuzzy_match", name=shareholder_name, best_match=best_match)
+      if best_match and best_match[1] >= 90:
+          matched_name = best_match[0]
+          found_ticker = ticker_map_original[matched_name]
+          record['symbol'] = found_ticker
+       
+    processed_shareholders.append(record)
+  
+  shareholders = _clean_dict(processed_shareholders)
+  shareholders_df = pd.DataFrame(shareholders)
+
+  name_mapping = {'Saham Treasury'        : 'Treasury Stock',
+                  'Pengendali Saham'      : 'Controlling Shareholder',
+                  'Non Pengendali Saham'  : 'Non Controlling Shareholder',
+                  'Masyarakat Lainnya (Lx International ( Spore) Pte, Ltd' : "Public (Foreign)",
+                  'Masyarakat Pemodal Asing'    : "Public (Foreign)",
+                  'Masyarakat Pemodal Nasional' : "Public",
+                  'Masyarakat Warkat'           : 'Public',
+                  'Masyarakat Non Warkat'       : 'Public',
+                  'Masyarakat Umum'             : 'Public',
+                  'Masyarakat Dengan Kepemilikan Masing-Masing Kurang Dari 5 Persen' : "Public",
+                  "Masyarakat (Masing-Masing)"  : "Public",
+                  "Masyarakat (Publik)"         : "Public",
+                  "Masyarakat Dibawah 5 %"      : "Public",
+                  'Masyarakat': 'Public',
+                  'MASYARAKAT': 'Public',
+                  'Publik': 'Public',
+                  'PUBLIK': 'Public',
+                  'Masyarakat Lainnya': 'Other Public',
+                  'Negara Republik Indonesia': 'Republic of Indonesia',
+                  'NEGARA REPUBLIK INDONESIA': 'Republic of Indonesia',
+                  'Pemerintah Negara Republik Indonesia' : 'Republic of Indonesia',
+                  'Pemerintah Ri' : 'Republic of Indonesia',
+                  'Kejaksaan Agung': 'Attorney General',
+                  'KEJAKSAAN AGUNG': 'Attorney General',
+                  'Biro klasifikasi indonesia, pt.': 'Pt Biro Klasifikasi Indonesia',
+                  'Pt Biro Klasifikasi Indonesia Persero Tbk': 'Pt Biro Klasifikasi Indonesia',
+                  'Direksi': 'Director',
+                  'AFILIASI PENGENDALI':'Controlling Affiliate',
+                  'Pihak Afiliasi ':'Affiliate Parties',
+                  'Pihak Afilasi':'Affiliate Parties',
+                  'Pt. Asabri (Persero)':'Pt Asabri (Persero)',
+                  'Asabri (Persero),Pt':'Pt Asabri (Persero)',
+                  'Pt Asabri (Persero) Dapen Polri':'Pt Asabri (Persero)',
+                  'Pt Asabri':'Pt Asabri (Persero)',
+                  'Pt Asabri - Dapen':'Pt Asabri (Persero)',
+                  'Pt Asabri (Persero) - Dapen Tni':'Pt Asabri (Persero)',
+                  'Pt Danantara Asset Management (Persero)':'Pt Danantara Asset Management',
+                  'Pt Danantara Aset Manajemen (Persero)':'Pt Danantara Asset Management',
+                  '0': np.nan,
+                  '-': np.nan,
+                  '': np.nan}
+  shareholders_df = shareholders_df.replace({'name': name_mapping})
+
+  shareholders_df["share_amount"] = shareholders_df["share_amount"].apply(lambda x: int(float(x)))
+  shareholders_df["share_percentage"] = shareholders_df["share_percentage"].astype('float')
+
+  share_amount_need_fix = False 
+  share_percentage_need_fix = False 
+
+  valid_references = shareholders_df[(shareholders_df['share_amount'] > 0) & (shareholders_df['share_percentage'] > 0)]
+
+  if not valid_references.empty:
+    reference_row = shareholders_df.loc[shareholders_df['share_percentage'].idxmax()]
+    if reference_row['share_percentage'] > 0:
+      total_company_shares = reference_row['share_amount'] / (reference_row['share_percentage'] / 100)
+
+      # Fixing rows with 0 share_amount but have share_percentage > 0
+      rows_to_fix_amount = shareholders_df[
+        (shareholders_df['share_amount'] == 0) & 
+        (shareholders_df['share_percentage'] > 0)
       ]
-
-      # Filter out small percentage 10-5
-      shareholders_df = shareholders_df[
-        shareholders_df.share_percentage > 0.001
+      if not rows_to_fix_amount.empty:
+        logging.info(f"Fixing {len(rows_to_fix_amount)} row(s) with missing share amount for {symbol}")
+
+        share_amount_need_fix = True 
+        for index, row in rows_to_fix_amount.iterrows():
+          calculated_amount = total_company_shares * (row['share_percentage'] / 100)
+          shareholders_df.loc[index, 'share_amount'] = calculated_amount
+
+      # Fixing rows with share_amount > 0 but have 0 share_percentage
+      rows_to_fix_percentage = shareholders_df[
+          (shareholders_df['share_amount'] > 0) & 
+          (shareholders_df['share_percentage'] == 0)
       ]
+      if not rows_to_fix_percentage.empty: 
+        logging.info(f"Fixing {len(rows_to_fix_percentage)} row(s) with missing share percentage for {symbol}")
 
-      df = get_management_data(supabase,f"{symbol}.JK")
-      
-      if df.shape[0] != 0 :
-          shareholders_df = shareholders_df.merge(df,on="name",how="left")
-
-          shareholders_df["position"] = shareholders_df.apply(lambda x: "More Than 5%" if pd.isna(x['position']) and x["share_percentage"] >= 0.05 else x['position'],axis=1)
-          shareholders_df["position"] = shareholders_df.apply(lambda x: "Scripless Public Share" if x["name"] == "Public (Scripless)"	else (
-                                                              "Scrip Public Share" if x["name"] == "Public (Scrip)" else x['position']),axis=1)
-          
-          # shareholders_df = shareholders_df[["name","position","share_amount","share_percentage"]]
-          columns_to_keep = ["name", "position", "share_amount", "share_percentage"]
-          if 'symbol' in shareholders_df.columns:
-              columns_to_keep.append('symbol')
-          shareholders_df = shareholders_df[columns_to_keep]
-
-          shareholders_df.rename(columns={"position":"type"},inplace=True)
+        share_percentage_need_fix = True  
+        for index, row in rows_to_fix_percentage.iterrows():
+          calculated_percentage = (row['share_amount'] / total_company_shares) * 100
+          shareholders_df.loc[index, 'share_percentage'] = calculated_percentage
+  
+  # Filter out rows with 0 share_amount and 0 share_percentage
+  shareholders_df = shareholders_df[
+     (shareholders_df.share_amount > 0) & 
+     (shareholders_df.share_percentage > 0)
+  ]
+
+  # Filter out small percentage 10-5
+  shareholders_df = shareholders_df[
+    shareholders_df.share_percentage > 0.001
+  ]
+
+  df = management_df
+  
+  if df.shape[0] != 0 :
+      shareholders_df = shareholders_df.merge(df,on="name",how="left")
 
-      else:
-          shareholders_df["type"] = shareholders_df.apply(lambda x: "Scripless Public Share" if x["name"] == "Public (Scripless)"	else (
-                                                              "Scrip Public Share" if x["name"] == "Public (Scrip)" else x['type']),axis=1)
-          # shareholders_df = shareholders_df[["name","type","share_amount","share_percentage"]]
-          columns_to_keep = ["name", "type", "share_amount", "share_percentage"]
-          if 'symbol' in shareholders_df.columns:
-              columns_to_keep.append('symbol')
-          shareholders_df = shareholders_df[columns_to_keep]
+      shareholders_df["position"] = shareholders_df.apply(lambda x: "More Than 5%" if pd.isna(x['position']) and x["share_percentage"] >= 0.05 else x['position'],axis=1)
+      shareholders_df["position"] = shareholders_df.apply(lambda x: "Scripless Public Share" if x["name"] == "Public (Scripless)"	else (
+                                                          "Scrip Public Share" if x["name"] == "Public (Scrip)" else x['position']),axis=1)
       
-      if round(shareholders_df['share_percentage'].sum(),0) > 100:
-        shareholders_df['share_percentage'] = (shareholders_df['share_amount']/sum(shareholders_df['share_amount']))*100
-
-      shareholders_df = shareholders_df.sort_values("name")
+      # shareholders_df = shareholders_df[["name","position","share_amount","share_percentage"]]
+      columns_to_keep = ["name", "position", "share_amount", "share_percentage"]
+      if 'symbol' in shareholders_df.columns:
+          columns_to_keep.append('symbol')
+      shareholders_df = shareholders_df[columns_to_keep]
 
-      # shareholders_df = shareholders_df.groupby("name").sum().reset_index(drop=False)
-      agg_rules = {
-          'share_amount': 'sum',
-          'share_percentage': 'sum',
-          'type': 'first' # Take the first value for the 'type' column
-      }
+      shareholders_df.rename(columns={"position":"type"},inplace=True)
 
-      # Dynamically add the 'ticker' rule only if the column exists
+  else:
+      shareholders_df["type"] = shareholders_df.apply(lambda x: "Scripless Public Share" if x["name"] == "Public (Scripless)"	else (
+                                                          "Scrip Public Share" if x["name"] == "Public (Scrip)" else x['type']),axis=1)
+      # shareholders_df = shareholders_df[["name","type","share_amount","share_percentage"]]
+      columns_to_keep = ["name", "type", "share_amount", "share_percentage"]
       if 'symbol' in shareholders_df.columns:
-          agg_rules['symbol'] = 'first' # Take the first value for the 'ticker' column
-
-      shareholders_df = shareholders_df.groupby('name').agg(agg_rules).reset_index()
-
-      # Directors Data
-      try:
-        directors_data = data['Direktur']
-        directors_processed_data = []
-        for i in range(len(directors_data)):
-          temp_data = {}
-          temp_data['name'] = directors_data[i]['Nama'].title()
-          temp_data['position'] = directors_data[i]['Jabatan'].title()
-          if ("Vice Presiden" in temp_data['position']):
-            temp_data['position'] = temp_data['position'].replace("Vice Presiden", "Vice President")
-          temp_data['affiliation'] = directors_data[i]['Afiliasi']
-          directors_processed_data.append(temp_data)
-        directors_df = pd.DataFrame(directors_processed_data)
-      except Exception as e: 
-        print(f"Failed to get Directors data. Returning None: {e}")
-        directors_df = None
-          
-      # Commissioners Data
-      try:
-        commissioners_data = data['Komisaris']
-        commissioners_processed_data = []
-        for i in range(len(commissioners_data)):
-          temp_data = {}
-          temp_data['name'] = commissioners_data[i]['Nama'].title()
-          temp_data['position'] = commissioners_data[i]['Jabatan'].title()
-          if ("Vice Presiden" in temp_data['position']):
-            temp_data['position'] = temp_data['position'].replace("Vice Presiden", "Vice President")
-          if ("Commisioner" in temp_data['position']):
-            temp_data['position'] = temp_data['position'].replace("Commisioner", "Commissioner")
-          temp_data['independent'] = commissioners_data[i]['Independen']
-          commissioners_processed_data.append(temp_data)
-        commissioners_df = pd.DataFrame(commissioners_processed_data)
-      except:
-        print(f"Failed to get Commissioners data. Returning None: {e}")
-        commissioners_df = None
-        
-      return shareholders_df, directors_df, commissioners_df, share_amount_need_fix, share_percentage_need_fix
+          columns_to_keep.append('symbol')
+      shareholders_df = shareholders_df[columns_to_keep]
+  
+  if round(shareholders_df['share_percentage'].sum(),0) > 100:
+    shareholders_df['share_percentage'] = (shareholders_df['share_amount']/sum(shareholders_df['share_amount']))*100
 
+  shareholders_df = shareholders_df.sort_values("name")
 
-def get_shareholder_data(symbol_list: list, supabase, 
-                         ticker_map_standardize: dict, ticker_map_original: dict, 
-                         is_failure_handling = False):
-  retry = 0 
-  i = 0 
-  total_amount_fixed = 0
-  total_percentage_fixed = 0
-  failed_list = []
-  data = pd.DataFrame(columns=['symbol', 'shareholders'])
+  # shareholders_df = shareholders_df.groupby("name").sum().reset_index(drop=False)
+  agg_rules = {
+      'share_amount': 'sum',
+      'share_percentage': 'sum',
+      'type': 'first' # Take the first value for the 'type' column
+  }
 
-  while len(symbol_list) > 0:
-    ticker = symbol_list[0]
-    try:
-      print(f"Trying to get data from {ticker}")
-      # This function includes search for directors and commissioners
-      shareholders_df, directors_df, commissioners_df, is_shareamount_fixed, is_percentage_fixed = get_new_shareholders_data(
-          ticker,
-          supabase,
-          ticker_map_standardize,
-          ticker_map_original,
-      )
+  # Dynamically add the 'ticker' rule only if the column exists
+  if 'symbol' in shareholders_df.columns:
+      agg_rules['symbol'] = 'first' # Take the first value for the 'ticker' column
 
-      # Check total share amount need to be fixed
-      if is_shareamount_fixed:
-         total_amount_fixed += 1
-
-      if is_percentage_fixed:
-         total_percentage_fixed += 1
-
-      # Check for shareholders
-      if (shareholders_df is not None):
-        shareholders_records = shareholders_df.to_dict(orient='records')
-        final_shareholders_list = []
-        for record in shareholders_records:
-          if 'symbol' in record and pd.isna(record['symbol']):
-                record.pop('symbol')
-          final_shareholders_list.append(record)
-        shareholders_records = json.dumps(final_shareholders_list)
-
-        # Check for directors
-        directors_records = directors_df.to_json(orient="records") if directors_df is not None else None
-        if (directors_records is None): print(f"[NONE VALUE] None value detected for Directors data from {ticker}")
-        # Check for commisioners
-        commissioners_records = commissioners_df.to_json(orient="records") if commissioners_df is not None else None
-        if (commissioners_records is None): print(f"[NONE VALUE]None value detected for Commissioners data from {ticker}")
-
-
-        data = pd.concat([data ,pd.DataFrame(data={'symbol':f"{ticker}.JK", 'shareholders':[shareholders_records], 'directors' : [directors_records], 'commissioners' : [commissioners_records]})])
-        print(f"Successfully get data from {ticker}")
-      else:
-        print(f"[NONE VALUE] None value detected for Shareholders data from {ticker}")
-        failed_list.append({
-            "ticker" : ticker,
-            "reason" : "None value detected"
-            })
-      symbol_list.remove(ticker)
-      i += 1
-      print(f"Finished getting data from {ticker} and Removed {ticker}, this is ticker number {i}")
-      print("-------------------------------------------------------------------------------")
-      
-    except Exception as e :
-      print(f"Failed to get the data: {e}")
-      retry += 1
-      if retry == MAX_ATTEMPT:
-          failed_list.append({
-            "ticker" : ticker,
-            "reason" : "Failed after maximum attempts"
-            })
-          symbol_list.remove(ticker)
-          retry = 0 
-          print(f"Failed to get data from {ticker} after {MAX_ATTEMPT} attempts")
-          print("-------------------------------------------------------------------------------")
-      else:
-          print(f"Failed to get data from {ticker} on attempt {retry}. Retrying after {SLEEP} seconds...")
-          print("-------------------------------------------------------------------------------")
+  shareholders_df = shareholders_df.groupby('name').agg(agg_rules).reset_index()
 
-    time.sleep(SLEEP)
-  
-  logging.info(f"Total symbols with share_amount fixed: {total_amount_fixed}")
-  logging.info(f"Total symbols with share_percentage fixed: {total_percentage_fixed}")
+  # Directors Data
+  try:
+    directors_data = data['Direktur']
+    directors_processed_data = []
+    for i in range(len(directors_data)):
+      temp_data = {}
+      temp_data['name'] = directors_data[i]['Nama'].title()
+      temp_data['position'] = directors_data[i]['Jabatan'].title()
+      if ("Vice Presiden" in temp_data['position']):
+        temp_data['position'] = temp_data['position'].replace("Vice Presiden", "Vice President")
+      temp_data['affiliation'] = directors_data[i]['Afiliasi']
+      directors_processed_data.append(temp_data)
+    directors_df = pd.DataFrame(directors_processed_data)
+  except Exception as e: 
+    print(f"Failed to get Directors data. Returning None: {e}")
+    directors_df = None
+      
+  # Commissioners Data
+  try:
+    commissioners_data = data['Komisaris']
+    commissioners_processed_data = []
+    for i in range(len(commissioners_data)):
+      temp_data = {}
+      temp_data['name'] = commissioners_data[i]['Nama'].title()
+      temp_data['position'] = commissioners_data[i]['Jabatan'].title()
+      if ("Vice Presiden" in temp_data['position']):
+        temp_data['position'] = temp_data['position'].replace("Vice Presiden", "Vice President")
+      if ("Commisioner" in temp_data['position']):
+        temp_data['position'] = temp_data['position'].replace("Commisioner", "Commissioner")
+      temp_data['independent'] = commissioners_data[i]['Independen']
+      commissioners_processed_data.append(temp_data)
+    commissioners_df = pd.DataFrame(commissioners_processed_data)
+  except:
+    print(f"Failed to get Commissioners data. Returning None: {e}")
+    commissioners_df = None
+    
+  return shareholders_df, directors_df, commissioners_df, share_amount_need_fix, share_percentage_need_fix
+
+
+def scrape_symbol(ticker: str, supabase,
+                  ticker_map_standardize: dict, ticker_map_original: dict):
+  """
+  Scrapes and formats the shareholders, directors and commissioners of one symbol
+
+  Args:
+      ticker (str): IDX code without the .JK suffix
+      supabase (Client): Supabase client object
+      ticker_map_standardize (dict): standardized company name to symbol map
+      ticker_map_original (dict): original company name to symbol map
+
+  Returns:
+      tuple: (row dict or None if no shareholders data, is_shareamount_fixed, is_percentage_fixed)
+  """
+  # This function includes search for directors and commissioners
+  shareholders_df, directors_df, commissioners_df, is_shareamount_fixed, is_percentage_fixed = get_new_shareholders_data(
+      ticker,
+      supabase,
+      ticker_map_standardize,
+      ticker_map_original,
+  )
+
+  if (shareholders_df is None):
+    logging.warning(f"[NONE VALUE] None value detected for Shareholders data from {ticker}")
+    return None, is_shareamount_fixed, is_percentage_fixed
+
+  shareholders_records = shareholders_df.to_dict(orient='records')
+  final_shareholders_list = []
+  for record in shareholders_records:
+    if 'symbol' in record and pd.isna(record['symbol']):
+          record.pop('symbol')
+    final_shareholders_list.append(record)
+  shareholders_records = json.dumps(final_shareholders_list)
+
+  # Check for directors
+  directors_records = directors_df.to_json(orient="records") if directors_df is not None else None
+  if (directors_records is None): logging.warning(f"[NONE VALUE] None value detected for Directors data from {ticker}")
+  # Check for commisioners
+  commissioners_records = commissioners_df.to_json(orient="records") if commissioners_df is not None else None
+  if (commissioners_records is None): logging.warning(f"[NONE VALUE] None value detected for Commissioners data from {ticker}")
+
+  row = {
+    'symbol': f"{ticker}.JK",
+    'shareholders': shareholders_records,
+    'directors': directors_records,
+    'commissioners': commissioners_records,
+  }
+  return row, is_shareamount_fixed, is_percentage_fixed
+
+
+def save_shareholder_data(rows: list, failed_list: list):
+  """
+  Stores the scraped rows to the shareholders csv and the failed symbols to failed_data.json
+
+  Args:
+      rows (list): list of row dicts returned by scrape_symbol
+      failed_list (list): list of {"ticker", "reason"} dicts
+  """
+  data = pd.DataFrame(rows, columns=['symbol', 'shareholders', 'directors', 'commissioners'])
 
   # Save the data
-  if (not is_failure_handling):
-    filename = os.path.join(DATA_DIR, f"shareholders_data.csv")
-  else:
-    filename = os.path.join(DATA_DIR, f"additional_shareholders_data.csv")
+  filename = os.path.join(DATA_DIR, f"shareholders_data.csv")
   data.to_csv(filename, index=False)
 
   # Store failed data
@@ -522,6 +559,163 @@ def get_shareholder_data(symbol_list: list, supabase,
     json.dump(failed_list, final, indent=2)
 
 
+def run_queue_worker(queue: WorkQueue, supabase,
+                     ticker_map_standardize: dict, ticker_map_original: dict,
+                     max_items = None, worker_id = None) -> dict:
+  """
+  Claims symbols from the work queue until it is empty or max_items symbols are finished
+
+  A symbol failing with a transient error is released back to the queue with an
+  exponential backoff, so the other symbols keep flowing while it waits. Permanent
+  errors (e.g. ResultCount == 0) and symbols out of attempts are marked as failed.
+  Once nothing is claimable, or once max_items symbols are finished, the worker
+  waits for the symbols it deferred, so retries finish within the same run.
+
+  Args:
+      queue (WorkQueue): the shared work queue
+      supabase (Client): Supabase client object
+      ticker_map_standardize (dict): standardized company name to symbol map
+      ticker_map_original (dict): original company name to symbol map
+      max_items (int, optional): number of finished symbols after which the worker stops taking new ones,
+          the retries it deferred still run. Defaults to no limit.
+      worker_id (str, optional): id used for the leases. Defaults to host-pid based id.
+
+  Returns:
+      dict: {"rows", "failed", "amount_fixed", "percentage_fixed", "retries"}
+  """
+  worker_id = worker_id or default_worker_id()
+  result = {"rows": [], "failed": [], "amount_fixed": 0, "percentage_fixed": 0, "retries": 0}
+  finished = 0
+  # Symbols this worker released with a backoff, retried before it returns
+  deferred = set()
+
+  while True:
+    # Past the budget, only the symbols deferred by this worker are claimed
+    budget_left = max_items is None or finished < max_items
+    if not budget_left and not deferred:
+      break
+    only = None if budget_left else deferred
+    claimed = queue.claim(worker_id, symbols=only)
+    if not claimed:
+      # Wait for symbols deferred by a backoff, stop when nothing is pending anymore
+      available_at = queue.next_available_at(symbols=only)
+      if available_at is None:
+        break
+      time.sleep(max(0.0, available_at - time.time()))
+      continue
+    ticker = claimed[0]
+    deferred.discard(ticker)
+
+    try:
+      log_event(LOGGER, logging.DEBUG, "scrape_start", worker=worker_id, ticker=ticker)
+      with get_report().stage("scrape_symbol"):
+        row, is_shareamount_fixed, is_percentage_fixed = scrape_symbol(
+            ticker, supabase, ticker_map_standardize, ticker_map_original
+        )
+    except CircuitOpenError as e:
+      # IDX is down: hand the symbol back without spending an attempt and either
+      # wait for the half-open probe or stop the run, the queue keeps the rest
+      breaker = get_breaker(PROFILE_URL)
+      queue.release(ticker, worker_id, delay=breaker.retry_after(), error=str(e))
+      queue.refund_attempt(ticker)
+      deferred.add(ticker)
+      if breaker.trips >= MAX_CIRCUIT_TRIPS:
+        logging.warning(f"Worker {worker_id} stopped: IDX circuit opened {breaker.trips} times ({e}), remaining symbols stay in the queue")
+        break
+      logging.warning(f"[{worker_id}] {e}. Waiting for the half-open probe")
+      time.sleep(breaker.retry_after())
+      continue
+    except Exception as e:
+      attempt = queue.attempts(ticker)
+      if is_permanent(e):
+        logging.error(f"[{worker_id}] Permanent failure for {ticker}: {e}")
+        result["failed"].append({"ticker": ticker, "reason": f"Permanent failure: {e}"})
+        queue.fail(ticker, worker_id, str(e))
+        finished += 1
+      elif attempt >= MAX_ATTEMPT:
+        logging.error(f"[{worker_id}] Failed to get data from {ticker} after {MAX_ATTEMPT} attempts: {e}")
+        result["failed"].append({"ticker": ticker, "reason": "Failed after maximum attempts"})
+        queue.fail(ticker, worker_id, str(e))
+        finished += 1
+      else:
+        delay = backoff_delay(attempt)
+        logging.warning(f"[{worker_id}] Failed to get data from {ticker} on attempt {attempt}: {e}. Retrying in {delay:.1f}s")
+        result["retries"] += 1
+        get_report().increment("retries")
+        queue.release(ticker, worker_id, delay=delay, error=str(e))
+        deferred.add(ticker)
+      continue
+
+    finished += 1
+    result["amount_fixed"] += int(bool(is_shareamount_fixed))
+    result["percentage_fixed"] += int(bool(is_percentage_fixed))
+    if row is not None:
+      result["rows"].append(row)
+      queue.complete(ticker, worker_id)
+      log_event(LOGGER, logging.DEBUG, "scrape_success", worker=worker_id, ticker=ticker)
+    else:
+      result["failed"].append({"ticker": ticker, "reason": "None value detected"})
+      queue.fail(ticker, worker_id, "None value detected")
+
+  return result
+
+
+def _queue_worker_process(queue_path: str, lease_seconds: int, max_items, profile_dir = None):
+  # A forked worker inherits the parent's log queue but not its writer thread
+  setup_logging(LOG_FILENAME)
+  # A forked worker inherits the parent's report, start a fresh one so nothing is merged twice
+  report = start_report("shareholders_worker")
+  if profile_dir:
+    report.enable_profiling(profile_dir)
+  # Each worker process builds its own clients, they can't be shared across forks
+  supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+  standardized_name_map, reverse_ticker_map = get_ticker_map(get_company(supabase))
+  queue = WorkQueue(queue_path, lease_seconds=lease_seconds)
+  result = run_queue_worker(queue, supabase, standardized_name_map, reverse_ticker_map, max_items)
+  # Stage timings and counters of the worker are merged into the parent's report
+  result["report"] = report.to_dict()
+  if report.profiler:
+    report.profiler.write()
+  # Pool workers exit without running atexit, write the queued records now
+  stop_logging()
+  return result
+
+
+def run_queue_workers(queue: WorkQueue, workers: int, max_items = None, profile_dir = None) -> dict:
+  """
+  Runs `workers` worker processes against the queue and merges their results
+
+  Args:
+      queue (WorkQueue): the shared work queue
+      workers (int): number of worker processes
+      max_items (int, optional): total number of symbols to process in this run. Defaults to no limit.
+      profile_dir (str, optional): profile each worker into its own run directory in this directory. Defaults to None.
+
+  Returns:
+      dict: merged result of run_queue_worker
+  """
+  if max_items is None:
+    budgets = [None] * workers
+  else:
+    budgets = [max_items // workers + (1 if n < max_items % workers else 0) for n in range(workers)]
+
+  with multiprocessing.Pool(workers) as pool:
+    results = pool.starmap(
+        _queue_worker_process,
+        [(queue.path, queue.lease_seconds, budget, profile_dir) for budget in budgets],
+    )
+
+  merged = {"rows": [], "failed": [], "amount_fixed": 0, "percentage_fixed": 0, "retries": 0}
+  for result in results:
+    merged["rows"].extend(result["rows"])
+    merged["failed"].extend(result["failed"])
+    merged["amount_fixed"] += result["amount_fixed"]
+    merged["percentage_fixed"] += result["percentage_fixed"]
+    merged["retries"] += result["retries"]
+    get_report().merge(result["report"])
+  return merged
+
+
 def is_same_dict(dict1: dict, dict2: dict) -> bool :
   for key, val in dict1.items():
     if (key in dict2 and val == dict2[key]):
@@ -586,6 +780,26 @@ def get_ticker_map(company_lists: list[str]):
   return standardized_name_map, reverse_ticker_map
 
 if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument(
+      "batch",
+      nargs="?",
+      default=None,
+      help="Deprecated quarter argument (e.g. 0-1). Only its size is used: the run processes a quarter of the symbols taken from the work queue.",
+  )
+  parser.add_argument("--workers", type=int, default=1, help="Number of worker processes claiming symbols from the queue.")
+  parser.add_argument("--max-items", dest="max_items", type=int, default=None, help="Maximum number of symbols processed in this run. Defaults to every pending symbol.")
+  parser.add_argument("--queue-path", dest="queue_path", default=DEFAULT_QUEUE_PATH, help="Path of the SQLite work queue file.")
+  parser.add_argument("--lease-seconds", dest="lease_seconds", type=int, default=DEFAULT_LEASE_SECONDS, help="Lease duration of a claimed symbol.")
+  parser.add_argument("--ownership-history", dest="ownership_history_path", nargs="?", const=True, default=None, help="Append the changed holders to the ownership history at this path (default: data/shareholders_history.db), query it with ownership_history.py.")
+  parser.add_argument("--report", dest="report", default="shareholders_run_report.json", help="Path of the JSON run report.")
+  parser.add_argument("--prometheus", dest="prometheus", default=None, help="Also write the run report as a Prometheus textfile to this path.")
+  parser.add_argument("--profile", dest="profile", nargs="?", const="profiles", default=None, help="Profile every stage (cProfile + tracemalloc) and write the profiles to a run directory in this directory (default: profiles).")
+  args = parser.parse_args()
+  report = start_report("shareholders_scraper")
+  if args.profile:
+    report.enable_profiling(args.profile)
+
   url_supabase = os.getenv("SUPABASE_URL")
   key = os.getenv("SUPABASE_KEY")
   supabase = create_client(url_supabase, key)
@@ -597,51 +811,50 @@ if __name__ == "__main__":
   # Get ticker map for shareholder maping ticker field
   standardized_name_map, reverse_ticker_map = get_ticker_map(company_lists)
 
-  # Preparing to scrape
-  symbol = supabase.table("idx_active_company_profile").select("symbol").execute()
-  symbol = pd.DataFrame(symbol.data).symbol.str.split(".",expand=True)
-  symbol.columns = ["symbol","exchange"]
-  symbol = list(symbol.symbol)
+  # Preparing to scrape: active symbols from the snapshot shared with main.py,
+  # the active profiles in the db if IDX can't be reached
+  try:
+    snapshot = get_securities_snapshot(ProxyRequester(PROXY_URL))
+    symbol = sorted(ticker.removesuffix(".JK") for ticker in snapshot.securities)
+    print(f"{len(symbol)} active symbols from the securities snapshot, added {snapshot.diff['added']}, removed {snapshot.diff['removed']}")
+  except Exception as error:
+    print(f"Securities snapshot unavailable ({error}), using idx_active_company_profile")
+    symbol = supabase.table("idx_active_company_profile").select("symbol").execute()
+    symbol = pd.DataFrame(symbol.data).symbol.str.split(".",expand=True)
+    symbol.columns = ["symbol","exchange"]
+    symbol = list(symbol.symbol)
 
-  LOG_FILENAME = 'scrapper.log'
   initiate_logging(LOG_FILENAME)
 
   # Start time
   start = time.time()
 
-  # Check the argument, by default get the first quarter
-  # Split the argument to 4 batches
-  # First quarter => arg = 0-1
-  # Second quarter => arg = 1-2
-  # Third quarter => arg = 2-3
-  # Fourth quarter => arg = 3-4
-  arg = None
-  if (len(sys.argv) == 1):
-     arg = "0-1"
-  else:
-     arg = sys.argv[1]
-
   try:
-    args = arg.split("-")
-    lower_bound = int(args[0])
-    upper_bound = int(args[1])
-    quarter_length = (len(symbol)// 4) + 1
-
-    start_idx = lower_bound * quarter_length
-    end_idx = min(len(symbol), upper_bound * quarter_length)
-    print(f"[FETCHING DATA] Scraping batch {upper_bound} from index {start_idx} to index {end_idx}")
-    logging.info(f"Scraping batch {upper_bound} from index {start_idx} to index {end_idx}")
-
-    symbol_debug = symbol[start_idx:end_idx]
-    logging.info(
-        f"Symbols to be processed for batch {upper_bound} "
-        f"(total {len(symbol_debug)}) "
-        f"{symbol_debug}"
-    )
+    max_items = args.max_items
+    if args.batch is not None and max_items is None:
+      # Backward compatibility with the old 4 batches workflow (0-1, 1-2, 2-3, 3-4)
+      lower_bound, upper_bound = (int(bound) for bound in args.batch.split("-"))
+      max_items = (upper_bound - lower_bound) * ((len(symbol) // 4) + 1)
+
+    # Sync the queue with the active symbols, a new cycle starts once everything is processed
+    queue = WorkQueue(args.queue_path, lease_seconds=args.lease_seconds)
+    added = queue.enqueue(symbol)
+    if queue.is_drained():
+      queue.reset()
+    print(f"[FETCHING DATA] Queue status {queue.stats()} ({added} new symbols), processing up to {max_items or 'all'} symbols with {args.workers} workers")
+    logging.info(f"Queue status {queue.stats()}, processing up to {max_items or 'all'} symbols with {args.workers} workers")
+
+    with report.stage("scrape"):
+      if args.workers > 1:
+        result = run_queue_workers(queue, args.workers, max_items, args.profile)
+      else:
+        result = run_queue_worker(queue, supabase, standardized_name_map, reverse_ticker_map, max_items)
 
-    get_shareholder_data(symbol_list=symbol[start_idx:end_idx], 
-                         supabase=supabase, ticker_map_standardize=standardized_name_map, 
-                         ticker_map_original=reverse_ticker_map) 
+    logging.info(f"Total symbols with share_amount fixed: {result['amount_fixed']}")
+    logging.info(f"Total symbols with share_percentage fixed: {result['percentage_fixed']}")
+    logging.info(f"Processed {len(result['rows'])} symbols, {len(result['failed'])} failed, {result['retries']} retries. Queue status {queue.stats()}")
+    logging.info(f"IDX proxy pool: {get_proxy_pool(PROXY_URL).metrics()}")
+    save_shareholder_data(result["rows"], result["failed"])
 
     # Checkpoint
     checkpoint = time.time()
@@ -653,12 +866,14 @@ if __name__ == "__main__":
     # Update db
     try:
       for record in records:
-        supabase.table("idx_company_profile").update(
-            {"shareholders": record['shareholders'], 
-             "directors": record['directors'], 
-             "commissioners": record['commissioners']}
-        ).eq("symbol", record['symbol']).execute()
-        print(f"Successfully updated shareholders data {record['symbol']}")
+        with report.stage("db_update"):
+          supabase.table("idx_company_profile").update(
+              {"shareholders": record['shareholders'], 
+               "directors": record['directors'], 
+               "commissioners": record['commissioners']}
+          ).eq("symbol", record['symbol']).execute()
+        report.increment("db_rows_updated")
+        log_event(LOGGER, logging.DEBUG, "db_row_updated", symbol=record['symbol'])
 
 
       print(
@@ -666,6 +881,16 @@ if __name__ == "__main__":
       )
     except Exception as e:
       raise Exception(f"Error upserting to database: {e}")
+
+    # Only the holders that changed since the last run are stored
+    if args.ownership_history_path:
+      # Only imported when the history is recorded
+      from ownership_history import OwnershipHistory, SCRAPER_HISTORY_PATH
+
+      history_path = SCRAPER_HISTORY_PATH if args.ownership_history_path is True else args.ownership_history_path
+      with report.stage("ownership_history"):
+        versions = OwnershipHistory(history_path).record(records, columns=("shareholders", "directors", "commissioners"))
+      print(f"Recorded {versions} ownership changes to {history_path}")
     
     # End
     end = time.time()
@@ -675,6 +900,18 @@ if __name__ == "__main__":
 
     logging.info(f"{datetime.datetime.now().strftime('%Y-%m-%d')} the shareholders data has been scrapped. Execution time: {time.strftime('%H:%M:%S', time.gmtime(end-start))}")
 
+    for endpoint_metrics in get_proxy_pool(PROXY_URL).metrics():
+      report.set_gauges(endpoint_metrics, prefix=f"{endpoint_metrics['endpoint']}_")
+    report.set_gauges({f"queue_{status}": count for status, count in queue.stats().items()})
+    report.set_gauge("symbols_scraped", len(result["rows"]))
+    report.set_gauge("symbols_failed", len(result["failed"]))
+    report.write_json(args.report)
+    if args.prometheus:
+      report.write_prometheus(args.prometheus)
+
   except Exception as e:
-    print(f"[ERROR] Invalid inputted argument : {e}")
+    print(f"[ERROR] Failed to scrape shareholders data : {e}")
 
+  finally:
+    if report.profiler:
+      print(f"Profiles written to {report.profiler.write()}")
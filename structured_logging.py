@@ -0,0 +1,167 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+
+
+# Production runs only log INFO and above, IDX_LOG_LEVEL=DEBUG shows the per-row events
+LOG_LEVEL = os.getenv("IDX_LOG_LEVEL", "INFO").upper()
+# json (one object per line) or text
+LOG_FORMAT = os.getenv("IDX_LOG_FORMAT", "json")
+# DEBUG events are kept once every this many records of the same event, all
+# of them in CI (CI is set by GitHub Actions) where the logs are read after a failure
+DEBUG_SAMPLE_EVERY = int(os.getenv("IDX_LOG_SAMPLE_EVERY", 1 if os.getenv("CI") else 100))
+# A DEBUG event with one of these fields or an exception is always kept
+UNSAMPLED_FIELDS = ("error",)
+
+TEXT_FORMAT = "%(asctime)s - %(levelname)s: %(message)s"
+# HTTP client libraries log every request and header at DEBUG, IDX_LOG_LEVEL=DEBUG is meant for our events
+QUIET_LOGGERS = ("httpx", "httpcore", "hpack", "urllib3", "postgrest")
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def log_event(logger, level, event: str, **fields):
+    """Logs a structured event, e.g. log_event(LOGGER, logging.DEBUG, "ticker_match", name=name)
+
+    Nothing is built when the level is disabled, so events can sit in hot loops.
+
+    Args:
+        logger (logging.Logger): logger of the calling module
+        level (int): logging level
+        event (str): event name, also the sampling key of DEBUG events
+        **fields: values written with the event
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"event": event, "fields": fields})
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, event and its fields"""
+
+    def format(self, record) -> str:
+        payload = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        if getattr(record, "event", None):
+            payload["event"] = record.event
+            payload.update(getattr(record, "fields", {}))
+        if getattr(record, "sampled_every", None):
+            payload["sampled_every"] = record.sampled_every
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The usual text lines, event fields appended as key=value"""
+
+    def format(self, record) -> str:
+        text = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            text += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return text
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, every=DEBUG_SAMPLE_EVERY):
+        """Keeps the first and then one out of `every` DEBUG events of each name, the other records all pass
+
+        Records above DEBUG, with an exception or with an error field are never dropped.
+        """
+        super().__init__()
+        self.every = max(1, every)
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record) -> bool:
+        event = getattr(record, "event", None)
+        if event is None or record.levelno > logging.DEBUG or self.every == 1:
+            return True
+        fields = getattr(record, "fields", None) or {}
+        if record.exc_info or any(fields.get(name) is not None for name in UNSAMPLED_FIELDS):
+            return True
+        with self._lock:
+            count = self._counts.get(event, 0)
+            self._counts[event] = count + 1
+        if count % self.every:
+            return False
+        record.sampled_every = self.every
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Formatting is left to the listener thread, the caller only enqueues
+        return record
+
+
+def setup_logging(log_filename: str, level=LOG_LEVEL, log_format=LOG_FORMAT, sample_every=DEBUG_SAMPLE_EVERY):
+    """Sends every record of the process through a queue to a background thread writing the log file.
+
+    Logging calls from the fetch and clean threads only append to the queue.
+    Warnings and errors are also written to stderr. Calling it again (e.g. in
+    a forked worker process, which has no listener thread) replaces the setup.
+
+    Args:
+        log_filename (str): log file, appended to.
+        level (str, optional): minimum level. Defaults to IDX_LOG_LEVEL or INFO.
+        log_format (str, optional): "json" or "text". Defaults to IDX_LOG_FORMAT or json.
+        sample_every (int, optional): keep one out of this many DEBUG records per event. Defaults to IDX_LOG_SAMPLE_EVERY or 100.
+
+    Returns:
+        logging.handlers.QueueListener: the running listener
+    """
+    global _listener
+    formatter = JsonFormatter() if log_format == "json" else TextFormatter(TEXT_FORMAT)
+    file_handler = logging.FileHandler(log_filename)
+    file_handler.setFormatter(formatter)
+    console_handler = logging.StreamHandler(sys.stderr)
+    console_handler.setLevel(logging.WARNING)
+    console_handler.setFormatter(TextFormatter(TEXT_FORMAT))
+
+    records = queue.SimpleQueue()
+    queue_handler = _QueueHandler(records)
+    queue_handler.addFilter(SamplingFilter(sample_every))
+
+    with _listener_lock:
+        if _listener is not None:
+            stop_logging()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+            handler.close()
+        root.addHandler(queue_handler)
+        root.setLevel(level)
+        for name in QUIET_LOGGERS:
+            logging.getLogger(name).setLevel(logging.WARNING)
+        _listener = logging.handlers.QueueListener(
+            records, file_handler, console_handler, respect_handler_level=True
+        )
+        _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Writes the queued records and stops the listener thread"""
+    global _listener
+    if _listener is not None:
+        listener, _listener = _listener, None
+        # In a forked process the thread was the parent's, join returns at once
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+atexit.register(stop_logging)
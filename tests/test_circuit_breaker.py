@@ -0,0 +1,111 @@
+import threading
+
+import pytest
+
+import circuit_breaker
+from circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+    endpoint_family,
+    get_breaker,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock)
+    return clock
+
+
+def test_opens_after_the_threshold(clock):
+    breaker = CircuitBreaker("GetCompanyProfilesDetail", failure_threshold=3, reset_timeout=15)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+
+    assert breaker.state == OPEN
+    assert breaker.trips == 1
+    assert not breaker.allow_request()
+    assert breaker.retry_after() == pytest.approx(15)
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+
+def test_a_success_resets_the_consecutive_failures(clock):
+    breaker = CircuitBreaker("x", failure_threshold=3)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+
+def test_half_open_lets_one_probe_through_and_closes_on_success(clock):
+    breaker = CircuitBreaker("x", failure_threshold=1, reset_timeout=15)
+    breaker.record_failure()
+
+    clock.now += 15
+    assert breaker.allow_request()
+    assert breaker.state == HALF_OPEN
+    # Only the first caller probes
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow_request()
+    assert breaker.retry_after() == 0
+
+
+def test_failed_probes_double_the_timeout_up_to_the_max(clock):
+    breaker = CircuitBreaker("x", failure_threshold=1, reset_timeout=15, max_reset_timeout=50)
+    breaker.record_failure()
+
+    for expected in (30, 50, 50):
+        clock.now += 1000
+        assert breaker.allow_request()
+        breaker.record_failure()
+        assert breaker.state == OPEN
+        assert breaker.retry_after() == pytest.approx(expected)
+
+    # A successful probe goes back to the initial timeout
+    clock.now += 1000
+    assert breaker.allow_request()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.retry_after() == pytest.approx(15)
+    assert breaker.trips == 5
+
+
+def test_endpoint_family():
+    assert endpoint_family("https://www.idx.co.id/primary/ListedCompany/GetCompanyProfilesDetail?KodeEmiten=BBCA") == "GetCompanyProfilesDetail"
+    assert endpoint_family("https://example.com/other?x=1") == "https://example.com/other"
+
+
+def test_one_breaker_per_family_across_threads(monkeypatch):
+    monkeypatch.setattr(circuit_breaker, "_breakers", {})
+    barrier = threading.Barrier(8)
+    breakers = []
+
+    def lookup(symbol):
+        barrier.wait()
+        breakers.append(get_breaker(f"https://www.idx.co.id/primary/ListedCompany/GetCompanyProfilesDetail?KodeEmiten={symbol}"))
+
+    threads = [threading.Thread(target=lookup, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(breaker) for breaker in breakers}) == 1
@@ -0,0 +1,100 @@
+import pandas as pd
+import pytest
+
+from ownership_graph import OwnershipGraph, edges_from_profiles, load_graph, save_graph
+
+
+def _profiles(holders: dict) -> pd.DataFrame:
+    """{company: {listed shareholder: fraction}} as cleaned profile rows"""
+    return pd.DataFrame(
+        {
+            "symbol": list(holders),
+            "shareholders": [
+                [{"name": owner, "symbol": owner, "share_percentage": share} for owner, share in owners.items()]
+                for owners in holders.values()
+            ],
+            "subsidiaries": [[] for _ in holders],
+        }
+    )
+
+
+CROSS_HOLDING = {
+    # XXXX holds AAAA, which holds BBBB, which holds AAAA back
+    "AAAA.JK": {"XXXX.JK": 0.6, "BBBB.JK": 0.3},
+    "BBBB.JK": {"AAAA.JK": 0.5},
+}
+
+
+def test_ultimate_owners_stop_before_closing_a_cycle():
+    graph = OwnershipGraph(edges_from_profiles(_profiles(CROSS_HOLDING)))
+
+    assert graph.cycles() == [["AAAA.JK", "BBBB.JK"]]
+    assert graph.ultimate_owners("BBBB.JK") == {"XXXX.JK": 0.3}
+    assert graph.ultimate_owners("AAAA.JK") == {"XXXX.JK": 0.6, "BBBB.JK": 0.3}
+    assert graph.ultimate_owners("XXXX.JK") == {}
+    assert graph.ultimate_owners("ZZZZ.JK") == {}
+
+
+def test_subsidiary_links_are_edges_from_the_parent():
+    profiles = pd.DataFrame(
+        {
+            "symbol": ["PPPP.JK"],
+            "shareholders": [[]],
+            "subsidiaries": [[{"name": "Q", "symbol": "QQQQ.JK", "percentage": 75.0}]],
+        }
+    )
+    graph = OwnershipGraph(edges_from_profiles(profiles))
+    assert graph.holdings("PPPP.JK") == {"QQQQ.JK": 0.75}
+    assert graph.owners("QQQQ.JK") == {"PPPP.JK": 0.75}
+
+
+def test_groups_need_a_holding_of_at_least_the_threshold():
+    graph = OwnershipGraph(
+        edges_from_profiles(
+            _profiles(
+                {
+                    "QQQQ.JK": {"PPPP.JK": 0.2},
+                    "SSSS.JK": {"RRRR.JK": 0.19},
+                    "TTTT.JK": {"QQQQ.JK": 0.5},
+                }
+            )
+        )
+    )
+
+    assert graph.groups() == [["PPPP.JK", "QQQQ.JK", "TTTT.JK"]]
+    assert graph.group("SSSS.JK") == ["SSSS.JK"]
+    assert graph.group("RRRR.JK") == ["RRRR.JK"]
+    assert graph.stats() == {"companies": 5, "edges": 3, "groups": 1, "cycles": 0}
+
+    strict = OwnershipGraph(graph.edges, group_min_share=0.25)
+    assert strict.groups() == [["QQQQ.JK", "TTTT.JK"]]
+
+
+def test_update_matches_a_graph_built_from_scratch():
+    graph = OwnershipGraph(edges_from_profiles(_profiles(CROSS_HOLDING)))
+    # AAAA.JK's filing no longer lists BBBB.JK, the cycle is gone
+    changed = dict(CROSS_HOLDING, **{"AAAA.JK": {"XXXX.JK": 0.6}})
+    graph.update(_profiles(changed), symbols=["AAAA.JK"])
+
+    rebuilt = OwnershipGraph(edges_from_profiles(_profiles(changed)))
+    assert graph.cycles() == rebuilt.cycles() == []
+    assert graph.stats() == rebuilt.stats()
+    assert graph.ultimate_owners("BBBB.JK") == rebuilt.ultimate_owners("BBBB.JK") == {"XXXX.JK": 0.3}
+
+
+def test_graph_round_trips_through_npz(tmp_path):
+    path = str(tmp_path / "graph.npz")
+    graph = OwnershipGraph(edges_from_profiles(_profiles(CROSS_HOLDING)))
+    save_graph(graph, path)
+
+    loaded = load_graph(path)
+    pd.testing.assert_frame_equal(loaded.edges, graph.edges, check_dtype=False)
+    assert loaded.stats() == graph.stats()
+    assert loaded.cycles() == graph.cycles()
+    for symbol in ["AAAA.JK", "BBBB.JK", "XXXX.JK"]:
+        assert loaded.owners(symbol) == graph.owners(symbol)
+        assert loaded.ultimate_owners(symbol) == pytest.approx(graph.ultimate_owners(symbol))
+
+
+def test_missing_graph_file_loads_as_none(tmp_path):
+    assert load_graph(str(tmp_path / "missing.npz")) is None
@@ -0,0 +1,65 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from ownership_history import OwnershipHistory, _timestamp
+
+
+@pytest.fixture
+def history(tmp_path):
+    return OwnershipHistory(str(tmp_path / "history.db"), snapshot_interval=3)
+
+
+def _profile(symbol="AAAA.JK", **columns):
+    return dict(symbol=symbol, **columns)
+
+
+def test_both_writers_entries_are_the_same_version(history):
+    # main.py: 8 digits, its own type mapping and the resolved ticker
+    main_entries = [
+        {"name": "PT Induk", "type": "Lebih dari 5%", "share_amount": 600.0, "share_percentage": 0.60000001, "symbol": "INDK.JK"},
+        {"name": "Masyarakat", "type": "Masyarakat Warkat", "share_amount": 400.0, "share_percentage": 0.39999999},
+    ]
+    # shareholders_scraper.py: 5 digits, strings from the DB, another type
+    scraper_entries = [
+        {"name": "PT Induk", "type": "More than 5%", "share_amount": "600", "share_percentage": 0.6},
+        {"name": "Masyarakat", "type": "Scrip Public Share", "share_amount": 400, "share_percentage": "0.4"},
+    ]
+
+    assert history.record([_profile(shareholders=main_entries)], recorded_at=1000) == 1
+    assert history.record([_profile(shareholders=scraper_entries)], recorded_at=2000) == 0
+    assert history.as_of("AAAA.JK") == [
+        {"name": "PT Induk", "share_amount": 600.0, "share_percentage": 0.6},
+        {"name": "Masyarakat", "share_amount": 400.0, "share_percentage": 0.4},
+    ]
+
+
+def test_changes_and_lookups_across_snapshots(history):
+    versions = [
+        [{"name": "A", "share_percentage": 1.0}],
+        [{"name": "A", "share_percentage": 0.7}, {"name": "B", "share_percentage": 0.3}],
+        [{"name": "B", "share_percentage": 1.0}],
+        [{"name": "B", "share_percentage": 0.5}, {"name": "C", "share_percentage": 0.5}],
+    ]
+    for day, entries in enumerate(versions, start=1):
+        history.record([_profile(shareholders=entries)], recorded_at=day * 86400)
+
+    for day, entries in enumerate(versions, start=1):
+        assert history.as_of("AAAA.JK", when=day * 86400 + 1) == entries
+    assert history.as_of("AAAA.JK", when=0) == []
+
+    changes = history.changes(start=2 * 86400, end=3 * 86400)
+    assert [(change["version"], change["removed"]) for change in changes] == [
+        (1, []),
+        (2, ['["A"]']),
+    ]
+    assert changes[0]["changed"] == {'["A"]': {"share_percentage": [1.0, 0.7]}}
+
+
+@pytest.mark.parametrize(
+    "value",
+    ["2025-01-31T00:00:00Z", "2025-01-31T00:00:00+00:00", "2025-01-31T07:00:00+07:00", "2025-01-31"],
+)
+def test_iso_timestamps_with_or_without_zone(value):
+    expected = datetime(2025, 1, 31, tzinfo=timezone.utc).timestamp()
+    assert _timestamp(value) == expected
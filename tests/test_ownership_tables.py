@@ -0,0 +1,67 @@
+import pandas as pd
+
+from ownership_tables import OwnershipTables
+
+
+class FakeTable:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self.call = None
+
+    def upsert(self, records, **kwargs):
+        self.call = ("upsert", self.name, [(r["symbol"], r["entry"]) for r in records])
+        return self
+
+    def delete(self):
+        self.call = ("delete", self.name)
+        return self
+
+    def in_(self, column, values):
+        self.call += (sorted(values),)
+        return self
+
+    def gte(self, column, value):
+        self.call += (value,)
+        return self
+
+    def execute(self):
+        self.client.calls.append(self.call)
+
+
+class FakeClient:
+    def __init__(self):
+        self.calls = []
+
+    def table(self, name):
+        return FakeTable(self, name)
+
+
+def test_entries_are_upserted_before_the_stale_rows_are_deleted():
+    tables = OwnershipTables()
+    shareholders = pd.DataFrame(
+        {
+            "symbol": ["AAAA.JK", "AAAA.JK", "BBBB.JK", "CCCC.JK"],
+            "name": ["Masyarakat", "PT Induk", "Masyarakat", "Masyarakat"],
+            "share_percentage": [0.4, 0.6, 1.0, 1.0],
+        }
+    )
+    tables.add({"shareholders": [shareholders]}, ["AAAA.JK", "BBBB.JK", "CCCC.JK", "DDDD.JK"])
+
+    client = FakeClient()
+    tables.upsert_to_db(client)
+
+    calls = [call for call in client.calls if call[1] == "idx_company_shareholders"]
+    assert calls == [
+        (
+            "upsert",
+            "idx_company_shareholders",
+            [("AAAA.JK", 0), ("AAAA.JK", 1), ("BBBB.JK", 0), ("CCCC.JK", 0)],
+        ),
+        # DDDD.JK has no shareholder left, its rows all go
+        ("delete", "idx_company_shareholders", ["DDDD.JK"], 0),
+        ("delete", "idx_company_shareholders", ["BBBB.JK", "CCCC.JK"], 1),
+        ("delete", "idx_company_shareholders", ["AAAA.JK"], 2),
+    ]
+    # Tables without entries only delete
+    assert ("delete", "idx_company_directors", ["AAAA.JK", "BBBB.JK", "CCCC.JK", "DDDD.JK"], 0) in client.calls
@@ -0,0 +1,110 @@
+import pandas as pd
+
+from person_index import PersonIndex, _person_id, load_index, person_name_key, roles_from_profiles, save_index
+
+
+def _profiles(directors: dict) -> pd.DataFrame:
+    """{company: [director names]} as cleaned profile rows"""
+    return pd.DataFrame(
+        {
+            "symbol": list(directors),
+            "directors": [
+                [{"name": name, "position": "Direktur"} for name in names]
+                for names in directors.values()
+            ],
+        }
+    )
+
+
+def test_name_key_drops_titles_initials_and_aliases():
+    assert person_name_key("Dr. Ir. H. Budi  Santoso, MBA") == "budi santoso"
+    assert person_name_key("Prof. Dr. Dr. Waldensius Girsang, Sp.M") == "girsang waldensius"
+    assert person_name_key("Santoso, Budi S.E., M.M.") == "budi santoso"
+    assert person_name_key("Lim Hock (Ahok)") == "hock lim"
+    assert person_name_key("PT Budi Santoso Investama") == ""
+    assert person_name_key(None) == ""
+
+
+def test_typo_joins_the_person_only_with_the_same_initials():
+    index = PersonIndex(
+        roles_from_profiles(
+            _profiles(
+                {
+                    "AAAA.JK": ["Hendra Gunawan Santoso"],
+                    "BBBB.JK": ["Hendra Gunawan Santosa"],
+                    "CCCC.JK": ["I Nyoman Sidia"],
+                    "DDDD.JK": ["I Nyoman Widia"],
+                }
+            )
+        )
+    )
+
+    assert index.person_id("Hendra Gunawan Santosa") == index.person_id("Hendra Gunawan Santoso")
+    assert index.companies_of("Hendra Gunawan Santoso") == ["AAAA.JK", "BBBB.JK"]
+    assert index.person_id("I Nyoman Sidia") != index.person_id("I Nyoman Widia")
+
+
+def test_the_usual_spelling_names_the_person_even_when_a_typo_sorts_first():
+    index = PersonIndex(
+        roles_from_profiles(
+            _profiles(
+                {
+                    "AAAA.JK": ["Hendra Gunawan Santosa"],
+                    "BBBB.JK": ["Hendra Gunawan Santoso"],
+                    "CCCC.JK": ["Hendra Gunawan Santoso"],
+                }
+            )
+        )
+    )
+
+    person_id = index.person_id("Hendra Gunawan Santosa")
+    assert person_id == _person_id(person_name_key("Hendra Gunawan Santoso"))
+    assert index.names[person_id] == "Hendra Gunawan Santoso"
+
+
+def test_common_words_still_find_the_person():
+    # Every word of the typo is shared by many keys, no rare word to block on
+    names = {f"S{number:03d}.JK": [f"Muhammad Yusuf {chr(97 + number % 26)}{number}"] for number in range(300)}
+    names["AAAA.JK"] = ["Muhammad Yusuf Abdullah"]
+    names["BBBB.JK"] = ["Muhammad Yusuf Abdulah"]
+    index = PersonIndex(roles_from_profiles(_profiles(names)))
+
+    assert index.person_id("Muhammad Yusuf Abdulah") == index.person_id("Muhammad Yusuf Abdullah")
+
+
+def test_ids_are_kept_across_updates_and_saves(tmp_path):
+    profiles = _profiles(
+        {
+            "AAAA.JK": ["Hendra Gunawan Santoso", "Budi Hartono"],
+            "BBBB.JK": ["Budi Hartono"],
+        }
+    )
+    index = PersonIndex(roles_from_profiles(profiles))
+    ids = dict(index.ids)
+
+    # A new spelling and a company that no longer lists anyone
+    changed = _profiles({"AAAA.JK": ["Hendra Gunawan Santosa", "Budi Hartono"], "BBBB.JK": []})
+    index.update(changed)
+    assert {key: index.ids[key] for key in ids} == ids
+    assert index.person_id("Hendra Gunawan Santosa") == ids["gunawan hendra santoso"]
+    assert index.companies_of("Budi Hartono") == ["AAAA.JK"]
+
+    path = str(tmp_path / "persons.json")
+    save_index(index, path)
+    loaded = load_index(path)
+    assert loaded.ids == index.ids
+    assert loaded.stats() == index.stats()
+    assert loaded.roles_of("Budi Hartono") == index.roles_of("Budi Hartono")
+
+
+def test_ids_dont_depend_on_the_order_of_the_profiles():
+    roles = roles_from_profiles(
+        _profiles(
+            {
+                "AAAA.JK": ["Hendra Gunawan Santosa", "Budi Hartono"],
+                "BBBB.JK": ["Hendra Gunawan Santoso", "Budi Hartanto"],
+                "CCCC.JK": ["Budi Hartono"],
+            }
+        )
+    )
+    assert PersonIndex(roles.iloc[::-1]).ids == PersonIndex(roles).ids
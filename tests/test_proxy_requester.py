@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+import circuit_breaker
+from circuit_breaker import get_breaker
+from proxy_pool import ProxyEndpoint, ProxyPool
+from proxy_requester import ProxyRequester
+from rate_limiter import SharedTokenBucket
+
+URL = "https://www.idx.co.id/primary/ListedCompany/GetCompanyProfilesDetail?KodeEmiten=BBCA"
+
+
+@pytest.fixture(autouse=True)
+def breakers(monkeypatch):
+    monkeypatch.setattr(circuit_breaker, "_breakers", {})
+
+
+def _requester(tmp_path, proxies, responses):
+    # responses: {proxy: (delay, content, answered)} played by _attempt instead of the network
+    endpoints = [
+        ProxyEndpoint(proxy, bucket=SharedTokenBucket(f"test-{proxy}", 100, 1, str(tmp_path / "limiter.db")))
+        for proxy in proxies
+    ]
+    pool = ProxyPool(endpoints=endpoints)
+    for _ in range(50):
+        pool.latencies.add(0.01)
+    requester = ProxyRequester(pool=pool, hedge=True, concurrency=2)
+    calls = []
+
+    def attempt(endpoint, url):
+        calls.append(endpoint.proxy)
+        delay, content, answered = responses[endpoint.proxy]
+        time.sleep(delay)
+        return content, answered
+
+    requester._attempt = attempt
+    return requester, calls
+
+
+def test_hedge_serves_a_slow_request_and_counts_one_outcome(tmp_path):
+    requester, calls = _requester(
+        tmp_path,
+        ["http://a:1", "http://b:1"],
+        {"http://a:1": (0.3, False, False), "http://b:1": (0.0, "{}", True)},
+    )
+    # The healthiest endpoint gets the primary request
+    requester.pool.endpoints[1].error_score = 0.5
+
+    assert requester.fetch_url(URL) == "{}"
+    assert calls == ["http://a:1", "http://b:1"]
+    assert requester.hedge_stats == {"hedged_requests": 1, "hedge_wins": 1}
+    assert get_breaker(URL).failures == 0
+
+
+def test_a_failed_hedged_request_is_one_breaker_failure(tmp_path):
+    requester, calls = _requester(
+        tmp_path,
+        ["http://a:1", "http://b:1"],
+        {"http://a:1": (0.1, False, False), "http://b:1": (0.0, False, False)},
+    )
+
+    assert requester.fetch_url(URL) is False
+    assert len(calls) == 2
+    assert get_breaker(URL).failures == 1
+
+
+def test_no_hedge_with_a_single_endpoint(tmp_path):
+    requester, calls = _requester(tmp_path, ["http://a:1"], {"http://a:1": (0.1, "{}", True)})
+
+    assert requester.fetch_url(URL) == "{}"
+    assert calls == ["http://a:1"]
+    assert requester.hedge_stats["hedged_requests"] == 0
+
+
+def test_no_hedge_past_a_closed_circuit(tmp_path):
+    requester, calls = _requester(
+        tmp_path,
+        ["http://a:1", "http://b:1"],
+        {"http://a:1": (0.1, "{}", True), "http://b:1": (0.1, "{}", True)},
+    )
+    breaker = get_breaker(URL)
+    breaker.reset_timeout = breaker._timeout = 0.0
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    # The half-open probe goes out alone
+    assert requester.fetch_url(URL) == "{}"
+    assert len(calls) == 1
+    assert breaker.state == circuit_breaker.CLOSED
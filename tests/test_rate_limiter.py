@@ -0,0 +1,72 @@
+import pytest
+
+from rate_limiter import AdaptiveRateController, SharedTokenBucket, is_throttling_status
+
+
+@pytest.fixture
+def bucket_path(tmp_path):
+    return str(tmp_path / "limiter.db")
+
+
+def test_healthy_responses_raise_the_rate_up_to_the_ceiling(bucket_path):
+    bucket = SharedTokenBucket("idx", calls=2, period=4, path=bucket_path)
+    controller = AdaptiveRateController(bucket, max_rate=2.0, increase=0.02)
+    assert controller.current_rate == pytest.approx(0.5)
+
+    for _ in range(10):
+        controller.record_success(latency=0.3)
+    assert bucket.rate == pytest.approx(0.7)
+
+    for _ in range(200):
+        controller.record_success(latency=0.3)
+    assert bucket.rate == pytest.approx(2.0)
+
+
+def test_slow_responses_dont_raise_the_rate(bucket_path):
+    bucket = SharedTokenBucket("idx", calls=2, period=4, path=bucket_path)
+    controller = AdaptiveRateController(bucket, slow_latency=10.0)
+    controller.record_success(latency=12.0)
+    assert bucket.rate == pytest.approx(0.5)
+    assert controller.successes == 1
+
+
+def test_a_429_halves_the_rate_once_across_processes(bucket_path):
+    # Two controllers on one file stand for two worker processes
+    first = AdaptiveRateController(SharedTokenBucket("idx", 2, 4, bucket_path), cooldown=10.0)
+    second = AdaptiveRateController(SharedTokenBucket("idx", 2, 4, bucket_path), cooldown=10.0)
+    for _ in range(50):
+        first.record_success(latency=0.3)
+    assert first.bucket.rate == pytest.approx(1.5)
+
+    first.record_failure("HTTP 429")
+    second.record_failure("HTTP 429")
+    first.record_failure("HTTP 429")
+
+    assert second.bucket.rate == pytest.approx(0.75)
+    assert first.decreases + second.decreases == 1
+    assert first.failures + second.failures == 3
+
+
+def test_the_cut_happens_again_after_the_cooldown(bucket_path):
+    bucket = SharedTokenBucket("idx", 2, 4, bucket_path)
+    controller = AdaptiveRateController(bucket, cooldown=0.0, min_rate=0.1)
+    for _ in range(4):
+        controller.record_failure("timeout")
+    assert bucket.rate == pytest.approx(0.1)
+    assert controller.decreases == 4
+
+
+def test_buckets_share_their_tokens(bucket_path):
+    first = SharedTokenBucket("idx", calls=2, period=4, path=bucket_path)
+    second = SharedTokenBucket("idx", calls=2, period=4, path=bucket_path)
+    assert first.try_acquire() == 0
+    assert second.try_acquire() == 0
+    assert first.try_acquire() > 0
+
+
+def test_throttling_statuses():
+    assert is_throttling_status(429)
+    assert is_throttling_status(403)
+    assert is_throttling_status(503)
+    assert not is_throttling_status(404)
+    assert not is_throttling_status(None)
@@ -0,0 +1,73 @@
+import urllib.error
+
+import pytest
+
+import shareholders_scraper
+from retry import PermanentError, TransientError, backoff_delay, is_permanent
+from work_queue import DONE, FAILED, PENDING, WorkQueue
+
+
+def test_is_permanent():
+    assert is_permanent(PermanentError("ResultCount == 0"))
+    assert is_permanent(urllib.error.HTTPError("url", 404, "Not Found", {}, None))
+    assert not is_permanent(urllib.error.HTTPError("url", 429, "Too Many Requests", {}, None))
+    assert not is_permanent(TransientError("empty profile"))
+    assert not is_permanent(TimeoutError())
+
+
+@pytest.mark.parametrize("attempt, low, high", [(1, 2.5, 5), (2, 5, 10), (3, 10, 20), (20, 150, 300)])
+def test_backoff_delay_doubles_with_jitter_and_is_capped(attempt, low, high):
+    delays = [backoff_delay(attempt) for _ in range(50)]
+    assert all(low <= delay <= high for delay in delays)
+    assert len(set(delays)) > 1
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(shareholders_scraper, "backoff_delay", lambda attempt: 0.05)
+    queue = WorkQueue(str(tmp_path / "queue.db"))
+    queue.enqueue(["AAAA", "BBBB", "CCCC", "DDDD"])
+    return queue
+
+
+def _scraper(monkeypatch, errors):
+    # errors: {symbol: list of errors raised by its first attempts}
+    def scrape_symbol(ticker, *args):
+        if errors.get(ticker):
+            raise errors[ticker].pop(0)
+        return {"symbol": f"{ticker}.JK"}, False, False
+
+    monkeypatch.setattr(shareholders_scraper, "scrape_symbol", scrape_symbol)
+
+
+def test_transient_failure_is_retried_in_the_same_run(queue, monkeypatch):
+    _scraper(monkeypatch, {"AAAA": [TransientError("empty profile")]})
+    result = shareholders_scraper.run_queue_worker(queue, None, {}, {}, worker_id="w1")
+
+    assert sorted(row["symbol"] for row in result["rows"]) == ["AAAA.JK", "BBBB.JK", "CCCC.JK", "DDDD.JK"]
+    assert result["retries"] == 1
+    assert queue.stats()[DONE] == 4
+
+
+def test_deferred_symbols_are_retried_past_max_items(queue, monkeypatch):
+    _scraper(monkeypatch, {"AAAA": [TransientError("empty profile")]})
+    result = shareholders_scraper.run_queue_worker(queue, None, {}, {}, max_items=2, worker_id="w1")
+
+    # AAAA is retried on top of the two symbols of the budget, DDDD is left for the next run
+    assert sorted(row["symbol"] for row in result["rows"]) == ["AAAA.JK", "BBBB.JK", "CCCC.JK"]
+    assert queue.stats()[PENDING] == 1
+
+
+def test_permanent_and_exhausted_failures_are_not_retried(queue, monkeypatch):
+    _scraper(
+        monkeypatch,
+        {
+            "AAAA": [PermanentError("ResultCount == 0")],
+            "BBBB": [TransientError("timeout")] * shareholders_scraper.MAX_ATTEMPT,
+        },
+    )
+    result = shareholders_scraper.run_queue_worker(queue, None, {}, {}, worker_id="w1")
+
+    assert {failure["ticker"] for failure in result["failed"]} == {"AAAA", "BBBB"}
+    assert result["retries"] == shareholders_scraper.MAX_ATTEMPT - 1
+    assert queue.stats()[FAILED] == 2
@@ -0,0 +1,187 @@
+import json
+import time
+
+import pandas as pd
+import pytest
+from fuzzywuzzy import fuzz
+
+import securities_snapshot
+from main import IdxProfileUpdater
+from run_report import start_report
+from securities_snapshot import (
+    SecuritiesSnapshot,
+    diff_securities,
+    get_securities_snapshot,
+    load_snapshot,
+    save_snapshot,
+)
+
+
+class FakeRequester:
+    """Answers GetSecuritiesStock with the given securities"""
+
+    def __init__(self, securities):
+        self.securities = securities
+        self.calls = 0
+
+    def fetch_url(self, url):
+        self.calls += 1
+        if self.securities is None:
+            return False
+        return json.dumps(
+            {
+                "data": [
+                    {"Code": symbol[: -len(".JK")], "Name": name}
+                    for symbol, name in self.securities.items()
+                ]
+            }
+        )
+
+
+def _securities(count, **names):
+    securities = {f"S{number:03d}.JK": f"Company {number} Tbk" for number in range(count)}
+    securities.update(names)
+    return securities
+
+
+@pytest.fixture
+def snapshot_path(tmp_path):
+    return str(tmp_path / "snapshot.json")
+
+
+@pytest.fixture(autouse=True)
+def report():
+    return start_report("test")
+
+
+def test_diff_securities_lists_added_removed_and_renamed_symbols():
+    old = {"AAAA.JK": "Alpha Tbk", "BBBB.JK": "Beta Tbk", "CCCC.JK": "Gamma Tbk"}
+    new = {"BBBB.JK": "Beta Baru Tbk", "CCCC.JK": "Gamma Tbk", "DDDD.JK": "Delta Tbk", "AAAB.JK": "Alpha B Tbk"}
+
+    assert diff_securities(old, new) == {
+        "added": ["AAAB.JK", "DDDD.JK"],
+        "removed": ["AAAA.JK"],
+        "renamed": {"BBBB.JK": ["Beta Tbk", "Beta Baru Tbk"]},
+    }
+    assert diff_securities(old, old) == {"added": [], "removed": [], "renamed": {}}
+
+
+def test_snapshot_round_trips_through_its_file(snapshot_path):
+    snapshot = SecuritiesSnapshot(
+        {"AAAA.JK": "Alpha Tbk"}, 1700000000.0, {"added": ["AAAA.JK"], "removed": [], "renamed": {}}, 1690000000.0
+    )
+    save_snapshot(snapshot, snapshot_path)
+
+    loaded = load_snapshot(snapshot_path)
+    assert loaded.to_dict() == snapshot.to_dict()
+
+
+def test_unreadable_snapshot_is_ignored(snapshot_path):
+    with open(snapshot_path, "w") as snapshot_file:
+        snapshot_file.write("{not json")
+    assert load_snapshot(snapshot_path) is None
+
+
+def test_fresh_snapshot_is_reused_until_the_ttl(snapshot_path, report):
+    requester = FakeRequester(_securities(900))
+    first = get_securities_snapshot(requester, path=snapshot_path, ttl=60)
+    second = get_securities_snapshot(requester, path=snapshot_path, ttl=60)
+
+    assert requester.calls == 1
+    assert second.securities == first.securities
+    assert report.counters["securities_snapshot_misses"] == 1
+    assert report.counters["securities_snapshot_hits"] == 1
+
+    get_securities_snapshot(requester, path=snapshot_path, ttl=60, refresh=True)
+    assert requester.calls == 2
+
+
+def test_expired_snapshot_is_replaced_with_its_diff(snapshot_path):
+    old = _securities(900, **{"AAAA.JK": "Alpha Tbk", "BBBB.JK": "Beta Tbk"})
+    save_snapshot(SecuritiesSnapshot(old, time.time() - 3600), snapshot_path)
+
+    new = dict(old)
+    del new["AAAA.JK"]
+    new["BBBB.JK"] = "Beta Baru Tbk"
+    new["CCCC.JK"] = "Gamma Tbk"
+    snapshot = get_securities_snapshot(FakeRequester(new), path=snapshot_path, ttl=60)
+
+    assert snapshot.diff == {
+        "added": ["CCCC.JK"],
+        "removed": ["AAAA.JK"],
+        "renamed": {"BBBB.JK": ["Beta Tbk", "Beta Baru Tbk"]},
+    }
+    assert load_snapshot(snapshot_path).diff == snapshot.diff
+
+
+def test_suspiciously_small_download_keeps_the_previous_snapshot(snapshot_path, monkeypatch):
+    monkeypatch.setattr(securities_snapshot, "MIN_ACTIVE_SECURITIES", 800)
+    previous = SecuritiesSnapshot(_securities(900), time.time() - 3600)
+    save_snapshot(previous, snapshot_path)
+
+    with pytest.raises(Exception, match="Suspicously low number"):
+        get_securities_snapshot(FakeRequester(_securities(799)), path=snapshot_path, ttl=60)
+    assert load_snapshot(snapshot_path).to_dict() == previous.to_dict()
+
+    # 800 is enough
+    snapshot = get_securities_snapshot(FakeRequester(_securities(800)), path=snapshot_path, ttl=60)
+    assert len(snapshot.securities) == 800
+
+
+def test_failed_download_raises(snapshot_path):
+    with pytest.raises(Exception, match="Error retrieving active symbols"):
+        get_securities_snapshot(FakeRequester(None), path=snapshot_path)
+
+
+def _baseline_name_changes(company_profile_data, active_company, bypass_symbols):
+    """The row by row fuzz loop main.py used before the prefilter"""
+    changed = []
+    for _, row in company_profile_data.reset_index().iterrows():
+        if row["symbol"] in bypass_symbols:
+            continue
+        try:
+            similarity = fuzz.ratio(
+                row["company_name"][0:30].lower(),
+                active_company[row["symbol"]].lower(),
+            )
+            if similarity <= 70:
+                changed.append(row["symbol"])
+        except Exception:
+            pass
+    return changed
+
+
+def test_name_change_prefilter_matches_the_baseline_loop():
+    stored = {
+        "SAME.JK": "Alpha Sejahtera Tbk",
+        "CASE.JK": "ALPHA SEJAHTERA TBK",
+        "RENM.JK": "Beta Makmur Tbk",
+        "TYPO.JK": "Gamma Abadi Tbk",
+        "LONG.JK": "Delta Perkasa Internasional Indonesia Tbk",
+        "TRNC.JK": "Epsilon Nusantara Sentosa Jaya Tbk",
+        "NONE.JK": None,
+        "GONE.JK": "Zeta Tbk",
+        "BYPS.JK": "Eta Tbk",
+    }
+    active_company = {
+        "SAME.JK": "Alpha Sejahtera Tbk",
+        "CASE.JK": "Alpha Sejahtera Tbk",
+        "RENM.JK": "Omega Digital Tbk",
+        "TYPO.JK": "Gama Abadi Tbk",
+        "LONG.JK": "Delta Perkasa Internasional Indonesia Tbk",
+        "TRNC.JK": "Epsilon Nusantara Sentosa J",
+        "NONE.JK": "Theta Tbk",
+        "BYPS.JK": "Iota Global Tbk",
+        "NEWW.JK": "Kappa Tbk",
+    }
+    company_profile_data = pd.DataFrame(
+        {"company_name": list(stored.values())},
+        index=pd.Index(list(stored), name="symbol"),
+    )
+    bypass_symbols = {"BYPS.JK"}
+
+    detected = IdxProfileUpdater()._detect_company_name_changes(
+        company_profile_data, active_company, bypass_symbols
+    )
+    assert detected == _baseline_name_changes(company_profile_data, active_company, bypass_symbols)
+    assert "RENM.JK" in detected and "BYPS.JK" not in detected
@@ -0,0 +1,158 @@
+import pandas as pd
+import pytest
+
+from main import IdxProfileUpdater, all_columns
+from pipeline import Pipeline, Stage
+from run_report import start_report
+
+
+def _row(symbol):
+    row = dict.fromkeys(all_columns)
+    row.update(
+        symbol=symbol,
+        company_name=f"{symbol} Tbk",
+        shareholders=[{"Nama": "Masyarakat", "Jumlah": "100", "Persentase": "100"}],
+    )
+    return row
+
+
+def _updater(tmp_path, symbols, **kwargs):
+    """Updater whose current_data holds the stored rows of `symbols`"""
+    path = tmp_path / "current.csv"
+    stored = pd.DataFrame([_row(symbol) for symbol in symbols], columns=all_columns)
+    stored["company_name"] = [f"{symbol} Stored Tbk" for symbol in symbols]
+    stored["website"] = "www.stored.co.id"
+    stored["shareholders"] = None
+    stored.to_csv(path, index=False)
+    return IdxProfileUpdater(company_profile_csv_path=str(path), **kwargs)
+
+
+def test_batch_failing_to_clean_is_not_upserted(tmp_path, monkeypatch):
+    # The uncleaned rows are dumped to the working directory
+    monkeypatch.chdir(tmp_path)
+    updater = _updater(tmp_path, ["GOOD.JK", "BAD.JK"], stream_upsert=True)
+    updater.supabase_client = object()
+
+    upserted = []
+    monkeypatch.setattr(updater, "_upsert_rows", lambda df: upserted.append(list(df["symbol"])))
+
+    def clean_ownership(df, columns, *args, **kwargs):
+        if "BAD.JK" in set(df["symbol"]):
+            raise ValueError("unexpected payload")
+        return df[["symbol"]].assign(shareholders=[[] for _ in range(len(df))])
+
+    monkeypatch.setattr(updater.ownershipcleaner, "clean_ownership", clean_ownership)
+
+    pipeline = Pipeline(
+        [
+            Stage("clean", updater._clean_profile_batch, batch_size=1),
+            Stage("upsert", updater._upsert_profile_batch),
+        ]
+    )
+    batches = pipeline.run(_row(symbol) for symbol in ["GOOD.JK", "BAD.JK"])
+
+    assert upserted == [["GOOD.JK"]]
+    assert updater.upserted_symbols == {"GOOD.JK"}
+    assert updater.failed_symbols == {"BAD.JK"}
+    assert list(pd.concat(batches)["symbol"]) == ["GOOD.JK"]
+    assert (tmp_path / "ownership_data_uncleaned.csv").exists()
+
+
+def test_batches_are_only_upserted_at_the_end_by_default(monkeypatch):
+    updater = IdxProfileUpdater()
+    updater.supabase_client = object()
+    monkeypatch.setattr(updater, "_upsert_rows", lambda df: pytest.fail("upserted while streaming is off"))
+
+    batch = pd.DataFrame([_row("GOOD.JK")])
+    assert updater._upsert_profile_batch(batch) is batch
+    assert updater.upserted_symbols == set()
+
+
+def _upserted_rows(tmp_path, monkeypatch, stream_upsert):
+    updater = _updater(tmp_path, ["AAAA.JK", "BBBB.JK"], stream_upsert=stream_upsert)
+    updater.supabase_client = object()
+    upserted = []
+    monkeypatch.setattr(updater, "_upsert_rows", lambda df: upserted.append(df.copy()))
+    monkeypatch.setattr(
+        updater.ownershipcleaner,
+        "clean_ownership",
+        lambda df, columns, *args, **kwargs: df[["symbol"]].assign(
+            shareholders=[[{"name": "Masyarakat", "share_amount": 100.0}]] * len(df)
+        ),
+    )
+
+    # The fetch found no website for AAAA.JK, the stored one has to be kept
+    rows = [_row("AAAA.JK"), _row("BBBB.JK")]
+    rows[1]["website"] = "www.bbbb.co.id"
+    updater.modified_symbols.update(["AAAA.JK", "BBBB.JK"])
+
+    pipeline = Pipeline(
+        [
+            Stage("clean", updater._clean_profile_batch, batch_size=2),
+            Stage("upsert", updater._upsert_profile_batch),
+        ]
+    )
+    batches = pipeline.run(iter(rows))
+    updater._merge_updated_rows(pd.concat(batches, ignore_index=True))
+    updater._publish_updates()
+    updater.upsert_to_db(save_current_data=False)
+
+    assert len(upserted) == 1
+    return upserted[0].set_index("symbol").sort_index()
+
+
+def test_streamed_rows_match_the_rows_upserted_at_the_end(tmp_path, monkeypatch):
+    streamed = _upserted_rows(tmp_path, monkeypatch, stream_upsert=True)
+    at_the_end = _upserted_rows(tmp_path, monkeypatch, stream_upsert=False)
+
+    pd.testing.assert_frame_equal(streamed, at_the_end, check_like=True)
+    assert streamed.loc["AAAA.JK", "website"] == "www.stored.co.id"
+    assert streamed.loc["BBBB.JK", "website"] == "www.bbbb.co.id"
+    assert streamed.loc["AAAA.JK", "company_name"] == "AAAA.JK Tbk"
+
+
+def test_saved_current_data_is_the_table_before_the_run(tmp_path, monkeypatch):
+    updater = _updater(tmp_path, ["AAAA.JK", "BBBB.JK"])
+    before = pd.read_csv(tmp_path / "current.csv")
+    updater.supabase_client = object()
+    monkeypatch.setattr(updater, "_upsert_rows", lambda df: None)
+    monkeypatch.chdir(tmp_path)
+
+    # A new listing appended during the run and an update of a stored row
+    updater.current_data = pd.concat(
+        [
+            updater.current_data,
+            pd.DataFrame(index=pd.Index(["NEWW.JK"], name="symbol"), columns=updater.current_data.columns)
+            .astype(updater.current_data.dtypes.to_dict()),
+        ]
+    )
+    updater._appended_symbols.add("NEWW.JK")
+    updated = [_row("AAAA.JK"), _row("NEWW.JK")]
+    updated[0].update(website="www.aaaa.co.id", listing_board="Utama", sub_sector_id=12)
+    updater._merge_updated_rows(pd.DataFrame(updated))
+    updater._merge_updated_rows(pd.DataFrame([dict(updated[0], website="www.again.co.id")]))
+    updater.modified_symbols.update(["AAAA.JK", "NEWW.JK"])
+    updater._publish_updates()
+    updater.upsert_to_db()
+
+    assert updater.current_data.loc["AAAA.JK", "website"] == "www.again.co.id"
+    saved = pd.read_csv(tmp_path / "idx_company_profile_current.csv")
+    pd.testing.assert_frame_equal(saved[before.columns], before)
+
+
+def test_failing_ownership_output_is_counted_and_the_others_still_run(tmp_path, monkeypatch):
+    report = start_report("test")
+    updater = _updater(tmp_path, ["AAAA.JK"], ownership_graph_path=str(tmp_path / "graph.npz"))
+    updater.person_index_path = str(tmp_path / "persons.json")
+    written = []
+
+    def broken_graph():
+        raise ValueError("could not convert string to float: 'n/a'")
+
+    monkeypatch.setattr(updater, "_update_ownership_graph", broken_graph)
+    monkeypatch.setattr(updater, "_update_person_index", lambda: written.append("person_index"))
+
+    updater.update_ownership_outputs()
+
+    assert written == ["person_index"]
+    assert report.counters["ownership_graph_failures"] == 1
@@ -0,0 +1,81 @@
+import json
+import logging
+
+import pytest
+
+from structured_logging import SamplingFilter, log_event, setup_logging, stop_logging
+
+
+LOGGER = logging.getLogger("tests.structured_logging")
+
+
+def _record(level, event, **fields):
+    return LOGGER.makeRecord(LOGGER.name, level, __file__, 0, event, (), None, extra={"event": event, "fields": fields})
+
+
+def test_debug_events_are_sampled_per_event():
+    sampling = SamplingFilter(every=10)
+    kept = [sampling.filter(_record(logging.DEBUG, "idx_fetch")) for _ in range(25)]
+    assert sum(kept) == 3
+    assert kept[0] and kept[10] and kept[20]
+    # Another event has its own count
+    assert sampling.filter(_record(logging.DEBUG, "profile_parsed"))
+
+
+def test_warnings_and_errors_are_never_sampled():
+    sampling = SamplingFilter(every=10)
+    for level in (logging.INFO, logging.WARNING, logging.ERROR, logging.CRITICAL):
+        assert all(sampling.filter(_record(level, "idx_fetch")) for _ in range(25))
+
+
+def test_debug_events_with_an_error_are_never_sampled():
+    sampling = SamplingFilter(every=10)
+    assert all(
+        sampling.filter(_record(logging.DEBUG, "share_value_unparsable", value="n/a", error=ValueError("n/a")))
+        for _ in range(25)
+    )
+    assert sampling.filter(_record(logging.DEBUG, "share_value_unparsable", value="1", error=None))
+    assert not sampling.filter(_record(logging.DEBUG, "share_value_unparsable", value="2", error=None))
+
+
+def test_ci_keeps_every_debug_event(monkeypatch):
+    import importlib
+
+    import structured_logging
+
+    monkeypatch.setenv("CI", "true")
+    monkeypatch.delenv("IDX_LOG_SAMPLE_EVERY", raising=False)
+    try:
+        assert importlib.reload(structured_logging).DEBUG_SAMPLE_EVERY == 1
+    finally:
+        monkeypatch.delenv("CI")
+        importlib.reload(structured_logging)
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    yield str(tmp_path / "run.log")
+    stop_logging()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+
+def test_warnings_reach_stderr_and_the_file_with_sampling_on(log_path, capsys):
+    setup_logging(log_path, level="DEBUG", log_format="json", sample_every=100)
+    for attempt in range(5):
+        log_event(LOGGER, logging.WARNING, "idx_retry", symbol="BBCA.JK", attempt=attempt)
+    for _ in range(5):
+        log_event(LOGGER, logging.DEBUG, "idx_fetch", url="http://idx")
+    LOGGER.error("Upsert failed for BBCA.JK")
+    stop_logging()
+
+    stderr = capsys.readouterr().err
+    assert stderr.count("idx_retry") == 5
+    assert "Upsert failed for BBCA.JK" in stderr
+    assert "idx_fetch" not in stderr
+
+    with open(log_path) as log_file:
+        events = [json.loads(line).get("event") for line in log_file]
+    assert events.count("idx_retry") == 5
+    assert events.count("idx_fetch") == 1
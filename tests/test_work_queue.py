@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+from work_queue import DONE, FAILED, LEASED, PENDING, WorkQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.db"), lease_seconds=60)
+    queue.enqueue(["AAAA", "BBBB", "CCCC"])
+    return queue
+
+
+def test_claims_are_exclusive(queue):
+    first = queue.claim("w1", limit=2)
+    second = queue.claim("w2", limit=2)
+
+    assert len(first) == 2
+    assert len(second) == 1
+    assert not set(first) & set(second)
+    assert queue.claim("w3") == []
+    assert queue.stats()[LEASED] == 3
+
+
+def test_expired_lease_is_requeued_on_the_next_claim(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.db"), lease_seconds=0)
+    queue.enqueue(["AAAA"])
+    assert queue.claim("crashed") == ["AAAA"]
+
+    time.sleep(0.01)
+    assert queue.claim("w2") == ["AAAA"]
+    assert queue.attempts("AAAA") == 2
+    # The crashed worker lost its lease
+    assert not queue.complete("AAAA", "crashed")
+    assert queue.complete("AAAA", "w2")
+
+
+def test_complete_fail_and_reset(queue):
+    for symbol in queue.claim("w1", limit=3):
+        if symbol == "BBBB":
+            queue.fail(symbol, "w1", "ResultCount == 0")
+        else:
+            queue.complete(symbol, "w1")
+
+    assert queue.stats() == {PENDING: 0, LEASED: 0, DONE: 2, FAILED: 1}
+    assert queue.failures() == [{"ticker": "BBBB", "reason": "ResultCount == 0"}]
+    assert queue.is_drained()
+
+    assert queue.reset() == 3
+    assert queue.stats()[PENDING] == 3
+    assert queue.attempts("BBBB") == 0
+
+
+def test_release_defers_the_symbol(queue):
+    symbols = queue.claim("w1", limit=3)
+    queue.release("AAAA", "w1", delay=30, error="timeout")
+    for symbol in symbols:
+        if symbol != "AAAA":
+            queue.complete(symbol, "w1")
+
+    assert queue.claim("w1") == []
+    assert queue.next_available_at() == pytest.approx(time.time() + 30, abs=5)
+    assert not queue.is_drained()
+
+    queue.release("AAAA", "w1")  # not leased anymore, nothing changes
+    assert queue.claim("w1") == []
+
+
+def test_claim_and_next_available_at_restricted_to_symbols(queue):
+    queue.claim("w1", limit=3)
+    queue.release("AAAA", "w1", delay=30)
+    queue.release("BBBB", "w1")
+
+    assert queue.claim("w1", symbols={"AAAA"}) == []
+    assert queue.next_available_at(symbols={"BBBB"}) <= time.time()
+    assert queue.claim("w1", symbols={"AAAA", "BBBB"}) == ["BBBB"]
+    assert queue.next_available_at(symbols={"CCCC"}) is None
+
+
+def test_refund_attempt(queue):
+    queue.claim("w1", symbols={"AAAA"})
+    queue.refund_attempt("AAAA")
+    assert queue.attempts("AAAA") == 0
+
+
+def test_enqueue_prunes_removed_symbols(queue):
+    assert queue.enqueue(["BBBB", "CCCC", "DDDD"]) == 1
+    assert sum(queue.stats().values()) == 3
+    assert queue.claim("w1", symbols={"AAAA"}) == []
@@ -1,21 +1,18 @@
-from main   import ProxyRequester
+from proxy_requester import ProxyRequester
+from proxy_pool import IDX_BASE_URL
+from securities_snapshot import get_securities_snapshot
+from structured_logging import setup_logging
 from dotenv import load_dotenv 
 
 import os 
 import json 
-import requests 
 import datetime
 import logging 
 from datetime import datetime
 
 
-# Setup Logging
-logging.basicConfig(
-    filename='delisting_update.log', # Set a file for save logger output 
-    level=logging.INFO, # Set the logging level
-    format='%(asctime)s [%(levelname)s] - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-    )
+# Setup Logging, level and format are set by IDX_LOG_LEVEL and IDX_LOG_FORMAT
+setup_logging('delisting_update.log')
 LOGGER = logging.getLogger(__name__)
 LOGGER.info("Init Global Variable")
 
@@ -28,7 +25,7 @@ SUPABASE_KEY = os.getenv('SUPABASE_KEY')
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 
 
-# Requester api url from main.py
+# Same requester as main.py, imported without main's pandas / translators stack
 REQUESTER = ProxyRequester(proxy=PROXY)
 
 
@@ -39,7 +36,7 @@ def process_url() -> str:
     date_str = today.strftime('%Y%m%d')
     LOGGER.info(f"Checking for delistings on date: {date_str}")
 
-    api_url = f"https://www.idx.co.id/primary/ListingActivity/GetIssuedHistory?caType=DELIST&dateFrom={date_str}&dateTo={date_str}&start=0&length=999"
+    api_url = f"{IDX_BASE_URL}/primary/ListingActivity/GetIssuedHistory?caType=DELIST&dateFrom={date_str}&dateTo={date_str}&start=0&length=999"
     return api_url
 
 
@@ -71,9 +68,6 @@ def get_delist_data():
         
         return delist_dict
     
-    except requests.exceptions.RequestException as error:
-        LOGGER.error(f"Error fetching data from IDX API: {error}")
-        return {}
     except json.JSONDecodeError:
         LOGGER.error("Error decoding JSON from IDX response.")
         return {}
@@ -93,6 +87,9 @@ def update_delisting_dates_db(delist_data: dict):
         LOGGER.info("No delist data to process.")
         return
 
+    # Most days have no delisting, requests is only loaded when there is something to update
+    import requests
+
     db_headers = {
         "apikey": SUPABASE_KEY,
         "Authorization": f"Bearer {SUPABASE_KEY}",
@@ -134,6 +131,24 @@ def update_delisting_dates_db(delist_data: dict):
     LOGGER.info(f"\nUpdate process finished. Performed {updates_to_perform} updates.")
 
 
+def log_snapshot_diff():
+    """
+    Refreshes the shared active securities snapshot (at most once a day) and logs
+    the symbols that left the active list since the previous one, so delistings
+    without an announcement today show up in the log.
+    """
+    try:
+        snapshot = get_securities_snapshot(REQUESTER)
+    except Exception as error:
+        LOGGER.error(f"Error refreshing the securities snapshot: {error}")
+        return
+    diff = snapshot.diff
+    LOGGER.info(f"Securities snapshot: {len(snapshot.securities)} active, {len(diff['added'])} added, {len(diff['removed'])} removed, {len(diff['renamed'])} renamed")
+    if diff['removed']:
+        LOGGER.info(f"No longer active since the previous snapshot: {diff['removed']}")
+
+
 if __name__ == "__main__":
     delisted_companies = get_delist_data()
-    update_delisting_dates_db(delisted_companies)
\ No newline at end of file
+    update_delisting_dates_db(delisted_companies)
+    log_snapshot_diff()
\ No newline at end of file
@@ -0,0 +1,310 @@
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+
+
+DEFAULT_QUEUE_PATH = os.path.join(os.getcwd(), "data", "shareholders_queue.db")
+DEFAULT_LEASE_SECONDS = 300
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+def default_worker_id() -> str:
+    """Returns a worker id that is unique across hosts and processes"""
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+class WorkQueue:
+    def __init__(self, path=DEFAULT_QUEUE_PATH, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Lease-based work queue stored in a SQLite file.
+
+        Workers claim symbols with an expiring lease and report completion. Leases
+        that expire (e.g. the worker crashed or the runner was cancelled) are put
+        back to pending on the next claim, so any number of workers on one or more
+        hosts sharing the file can drain the queue without fixed batches.
+
+        Args:
+            path (str, optional): path of the SQLite file. Defaults to data/shareholders_queue.db.
+            lease_seconds (int, optional): how long a claimed symbol stays reserved for a worker.
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # closing: the connection's own context manager only commits
+        with closing(self._connect()) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS work_queue (
+                    symbol TEXT PRIMARY KEY,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    lease_owner TEXT,
+                    lease_expires REAL,
+                    available_at REAL NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_work_queue_status ON work_queue (status, available_at)"
+            )
+
+    def _connect(self):
+        # isolation_level=None lets us issue BEGIN IMMEDIATE ourselves so that a
+        # claim takes the write lock before reading the pending rows.
+        conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _transaction(self, conn):
+        conn.execute("BEGIN IMMEDIATE")
+
+    @staticmethod
+    def _only(symbols):
+        # SQL condition and parameters restricting a query to the given symbols
+        if symbols is None:
+            return "", ()
+        symbols = tuple(symbols)
+        return f" AND symbol IN ({', '.join('?' * len(symbols))})", symbols
+
+    def enqueue(self, symbols: list, prune=True) -> int:
+        """Adds new symbols to the queue as pending.
+
+        Args:
+            symbols (list): symbols that should be scraped.
+            prune (bool, optional): remove symbols that are no longer in the list (e.g. delisted). Defaults to True.
+
+        Returns:
+            int: number of newly added symbols
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            self._transaction(conn)
+            before = conn.execute("SELECT COUNT(*) FROM work_queue").fetchone()[0]
+            conn.executemany(
+                "INSERT OR IGNORE INTO work_queue (symbol, status, updated_at) VALUES (?, ?, ?)",
+                [(symbol, PENDING, now) for symbol in symbols],
+            )
+            added = conn.execute("SELECT COUNT(*) FROM work_queue").fetchone()[0] - before
+
+            if prune:
+                conn.execute("CREATE TEMP TABLE current_symbols (symbol TEXT PRIMARY KEY)")
+                conn.executemany(
+                    "INSERT OR IGNORE INTO current_symbols VALUES (?)",
+                    [(symbol,) for symbol in symbols],
+                )
+                conn.execute(
+                    "DELETE FROM work_queue WHERE symbol NOT IN (SELECT symbol FROM current_symbols)"
+                )
+                conn.execute("DROP TABLE current_symbols")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return added
+
+    def requeue_expired(self, conn=None) -> int:
+        """Puts symbols whose lease has expired back to pending.
+
+        Returns:
+            int: number of requeued symbols
+        """
+        own_conn = conn is None
+        if own_conn:
+            conn = self._connect()
+        try:
+            cursor = conn.execute(
+                """
+                UPDATE work_queue
+                SET status = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ?
+                WHERE status = ? AND lease_expires < ?
+                """,
+                (PENDING, time.time(), LEASED, time.time()),
+            )
+            return cursor.rowcount
+        finally:
+            if own_conn:
+                conn.close()
+
+    def claim(self, worker_id: str, limit=1, symbols=None) -> list:
+        """Claims up to `limit` pending symbols for a worker.
+
+        Args:
+            worker_id (str): id of the claiming worker.
+            limit (int, optional): maximum number of symbols to claim. Defaults to 1.
+            symbols (iterable, optional): only claim among these symbols. Defaults to None (any symbol).
+
+        Returns:
+            list: claimed symbols, empty when nothing is available right now
+        """
+        now = time.time()
+        only, only_params = self._only(symbols)
+        conn = self._connect()
+        try:
+            self._transaction(conn)
+            self.requeue_expired(conn)
+            rows = conn.execute(
+                f"""
+                SELECT symbol FROM work_queue
+                WHERE status = ? AND available_at <= ?{only}
+                ORDER BY available_at, updated_at, symbol
+                LIMIT ?
+                """,
+                (PENDING, now, *only_params, limit),
+            ).fetchall()
+            symbols = [row["symbol"] for row in rows]
+            conn.executemany(
+                """
+                UPDATE work_queue
+                SET status = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ?
+                WHERE symbol = ?
+                """,
+                [
+                    (LEASED, worker_id, now + self.lease_seconds, now, symbol)
+                    for symbol in symbols
+                ],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return symbols
+
+    def _finish(self, symbol, worker_id, status, error=None, available_at=0):
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                """
+                UPDATE work_queue
+                SET status = ?, lease_owner = NULL, lease_expires = NULL,
+                    available_at = ?, last_error = ?, updated_at = ?
+                WHERE symbol = ? AND lease_owner = ?
+                """,
+                (status, available_at, error, time.time(), symbol, worker_id),
+            )
+            return cursor.rowcount > 0
+        finally:
+            conn.close()
+
+    def complete(self, symbol: str, worker_id: str) -> bool:
+        """Marks a leased symbol as done. Returns False if the lease was lost."""
+        return self._finish(symbol, worker_id, DONE)
+
+    def fail(self, symbol: str, worker_id: str, error=None) -> bool:
+        """Marks a leased symbol as failed for this cycle. Returns False if the lease was lost."""
+        return self._finish(symbol, worker_id, FAILED, error=error)
+
+    def release(self, symbol: str, worker_id: str, delay=0, error=None) -> bool:
+        """Gives a leased symbol back to the queue, optionally not before `delay` seconds."""
+        return self._finish(
+            symbol, worker_id, PENDING, error=error, available_at=time.time() + delay
+        )
+
+    def extend_lease(self, symbol: str, worker_id: str) -> bool:
+        """Renews the lease of a symbol that is still being worked on."""
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "UPDATE work_queue SET lease_expires = ? WHERE symbol = ? AND lease_owner = ? AND status = ?",
+                (time.time() + self.lease_seconds, symbol, worker_id, LEASED),
+            )
+            return cursor.rowcount > 0
+        finally:
+            conn.close()
+
+    def attempts(self, symbol: str) -> int:
+        """Returns how many times a symbol has been claimed in the current cycle"""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT attempts FROM work_queue WHERE symbol = ?", (symbol,)
+            ).fetchone()
+        finally:
+            conn.close()
+        return row["attempts"] if row else 0
+
+    def refund_attempt(self, symbol: str):
+        """Doesn't count the last claim as an attempt, e.g. when the request was never sent"""
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE work_queue SET attempts = MAX(0, attempts - 1) WHERE symbol = ?",
+                (symbol,),
+            )
+        finally:
+            conn.close()
+
+    def next_available_at(self, symbols=None):
+        """Returns when the earliest deferred pending symbol (among `symbols` if given) becomes claimable, None if nothing is pending"""
+        only, only_params = self._only(symbols)
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                f"SELECT MIN(available_at) AS available_at FROM work_queue WHERE status = ?{only}",
+                (PENDING, *only_params),
+            ).fetchone()
+        finally:
+            conn.close()
+        return row["available_at"]
+
+    def reset(self) -> int:
+        """Starts a new cycle by putting every done or failed symbol back to pending."""
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                """
+                UPDATE work_queue
+                SET status = ?, attempts = 0, available_at = 0, last_error = NULL, updated_at = ?
+                WHERE status IN (?, ?)
+                """,
+                (PENDING, time.time(), DONE, FAILED),
+            )
+            return cursor.rowcount
+        finally:
+            conn.close()
+
+    def stats(self) -> dict:
+        """Returns the number of symbols per status"""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT status, COUNT(*) AS total FROM work_queue GROUP BY status"
+            ).fetchall()
+        finally:
+            conn.close()
+        counts = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        counts.update({row["status"]: row["total"] for row in rows})
+        return counts
+
+    def is_drained(self) -> bool:
+        """True when nothing is pending or leased anymore"""
+        counts = self.stats()
+        return counts[PENDING] == 0 and counts[LEASED] == 0
+
+    def failures(self) -> list:
+        """Returns the failed symbols of the current cycle with their last error"""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT symbol, last_error FROM work_queue WHERE status = ? ORDER BY symbol",
+                (FAILED,),
+            ).fetchall()
+        finally:
+            conn.close()
+        return [{"ticker": row["symbol"], "reason": row["last_error"]} for row in rows]